@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_rename_accounts_act_created_67706a_idx_accounts_ac_created_91b66e_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='farmerdetails',
+            index=models.Index(fields=['price_alert', 'is_active'], name='accounts_fa_price_a_1f1c96_idx'),
+        ),
+    ]
@@ -54,6 +54,12 @@ class FarmerDetails(models.Model):
     is_active = models.BooleanField(default=True)
     deactivate_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # price alert fan-out: opted-in, active farmers
+            models.Index(fields=["price_alert", "is_active"]),
+        ]
+
     def __str__(self):
         return self.user.username
 
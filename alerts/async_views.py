@@ -0,0 +1,150 @@
+"""
+Server-sent events stream of new alerts, GET /api/alerts/stream/.
+
+Replaces polling the feed: each client holds one connection and receives
+
+    event: sync    {"latest_id", "unseen_count"}   on connect
+    event: alert   {"id", "unseen_count"}          per new SENT alert
+    event: count   {"unseen_count"}                after mark-seen elsewhere
+
+Alert events carry ``id:`` lines, so a reconnecting EventSource sends
+Last-Event-ID and receives the alerts it missed (within the cached id
+window of alerts.feed). Alerts are sent once each, in id order, above a
+per-stream cursor.
+
+Bus events only come from the stream's own process. Every
+HEARTBEAT_SECONDS a stream therefore resyncs from the cache alone: alerts
+in the cached feed above its cursor (written by the scheduler, the trend
+command or another worker) are sent, and a changed cached watermark
+(mark-seen elsewhere) updates the count; then a comment line is sent.
+The feed cache expires after FEED_CACHE_TIMEOUT, so at most one stream per
+process rebuilds it per timeout; watermarks that are not cached are left
+alone (mark-seen in another process is only seen with a shared cache).
+
+Must be served by the ASGI application: an idle stream is one suspended
+coroutine and a small queue, so one worker holds thousands of them.
+EventSource cannot send headers, so the JWT access token may be passed
+as ?token=.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from . import feed
+from .bus import get_bus
+
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 5000
+
+
+def _sse(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data, cls=JSONEncoder)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+def _snapshot(user_id, floor=None):
+    """(ids above floor, latest id, last seen id, unseen count) from the cached feed."""
+    state = feed.feed_state()
+    last_seen = feed.last_seen_id(user_id)
+    ids = state["ids"]
+    latest = ids[-1] if ids else 0
+    newer = [i for i in ids if i > floor] if floor is not None else []
+    return newer, latest, last_seen, feed.unseen_count(state, last_seen)
+
+
+async def event_stream(user_id, last_event_id=None, heartbeat=HEARTBEAT_SECONDS, bus=None):
+    """Async generator of SSE messages for one client."""
+    bus = bus or get_bus()
+    # subscribe before the snapshot so nothing published in between is lost
+    subscription = bus.subscribe()
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+
+        # The client knows every alert up to last_sent; only newer ids are sent.
+        missed, latest, last_seen, unseen = await sync_to_async(_snapshot)(user_id, last_event_id)
+        for alert_id in missed:
+            yield _sse("alert", {"id": alert_id, "unseen_count": unseen}, alert_id)
+        yield _sse("sync", {"latest_id": latest, "unseen_count": unseen})
+        last_sent = max(latest, last_event_id or 0)
+
+        while True:
+            event = await subscription.get(heartbeat)
+
+            if event is None:
+                state = await cache.aget(feed.FEED_KEY) or await sync_to_async(feed.feed_state)()
+                cached_seen = await cache.aget(feed.LAST_SEEN_KEY.format(user_id))
+                if cached_seen is not None:
+                    last_seen = cached_seen
+                current = feed.cached_unseen_count(state, last_seen)
+                current = unseen if current is None else current
+
+                missed = [i for i in state["ids"] if i > last_sent]
+                for alert_id in missed:
+                    yield _sse("alert", {"id": alert_id, "unseen_count": current}, alert_id)
+                if missed:
+                    last_sent = missed[-1]
+                elif current != unseen:
+                    yield _sse("count", {"unseen_count": current})
+                unseen = current
+                yield ": keepalive\n\n"
+
+            elif event["type"] == "alert" and event["id"] > last_sent:
+                # one read catches up a whole burst; later events of it are skipped
+                newer, _, last_seen, unseen = await sync_to_async(_snapshot)(user_id, last_sent)
+                if event["id"] not in newer:
+                    # published before the feed cache shows it
+                    newer = sorted(newer + [event["id"]])
+                    if event["id"] > last_seen:
+                        unseen += 1
+                for alert_id in newer:
+                    yield _sse("alert", {"id": alert_id, "unseen_count": unseen}, alert_id)
+                if newer:
+                    last_sent = newer[-1]
+
+            elif event["type"] == "seen" and event["user_id"] == user_id:
+                _, _, last_seen, unseen = await sync_to_async(_snapshot)(user_id)
+                yield _sse("count", {"unseen_count": unseen})
+    finally:
+        bus.unsubscribe(subscription)
+
+
+async def _authenticate(request):
+    header = request.headers.get("Authorization", "")
+    raw = request.GET.get("token") or (header[7:] if header.startswith("Bearer ") else None)
+    if raw:
+        auth = JWTAuthentication()
+        try:
+            return await sync_to_async(auth.get_user)(auth.get_validated_token(raw))
+        except (InvalidToken, AuthenticationFailed):
+            return None
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+@require_GET
+async def alert_stream(request):
+    if not hasattr(request, "scope"):
+        return JsonResponse({"error": "The alert stream requires the ASGI application"}, status=501)
+
+    user = await _authenticate(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    response = StreamingHttpResponse(event_stream(user.id, last_event_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: do not buffer the stream
+    return response
@@ -0,0 +1,150 @@
+"""
+Publish/subscribe bus for alert events, consumed by the SSE stream.
+
+Alert writes publish after commit; every open stream holds a subscription
+(a small event buffer on its event loop). ``publish`` is thread safe, so sync
+views, signals and management commands can call it.
+
+The default ``InProcessBus`` only reaches streams in the same process.
+Streams also resync from the cached feed on every heartbeat, without a
+database query, so alerts written by other processes (scheduler, trend
+command, other workers) are delivered within HEARTBEAT_SECONDS plus the
+feed cache timeout. A cross-process backend can be
+plugged in with ``settings.ALERT_BUS["BACKEND"]``; tests use
+``RecordingBus``.
+"""
+
+import asyncio
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+
+BUS_DEFAULTS = {
+    "BACKEND": "alerts.bus.InProcessBus",
+    "OPTIONS": {},
+}
+
+
+class Subscription:
+    """
+    Events for one stream. A bare deque and future rather than
+    asyncio.Queue + wait_for, which would cost an extra task per wait.
+    """
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        # a slow client loses the oldest events; the next heartbeat resync catches it up
+        self.events = deque(maxlen=maxsize)
+        self._waiter = None
+
+    async def get(self, timeout):
+        """Next event, or None after timeout seconds."""
+        if not self.events:
+            self._waiter = self.loop.create_future()
+            timer = self.loop.call_later(timeout, self._wake)
+            try:
+                await self._waiter
+            finally:
+                timer.cancel()
+                self._waiter = None
+        return self.events.popleft() if self.events else None
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _put(self, event):
+        self.events.append(event)
+        self._wake()
+
+
+class InProcessBus:
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        """Subscribe the running event loop; call from a coroutine."""
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, event)
+            except RuntimeError:  # event loop closed under us
+                self.unsubscribe(subscription)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+
+class RecordingBus(InProcessBus):
+    """InProcessBus that also keeps every published event, for tests."""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.published = []
+
+    def publish(self, event):
+        self.published.append(event)
+        super().publish(event)
+
+
+def get_bus_config():
+    config = dict(BUS_DEFAULTS)
+    config.update(getattr(settings, "ALERT_BUS", {}) or {})
+    return config
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus():
+    """The configured bus (one shared instance per process)."""
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                config = get_bus_config()
+                _bus = import_string(config["BACKEND"])(**config["OPTIONS"])
+    return _bus
+
+
+def reset_bus():
+    global _bus
+    with _bus_lock:
+        _bus = None
+
+
+def _on_setting_changed(setting, **kwargs):
+    if setting == "ALERT_BUS":
+        reset_bus()
+
+
+setting_changed.connect(_on_setting_changed)
+
+
+def publish_alerts(alert_ids):
+    bus = get_bus()
+    for alert_id in alert_ids:
+        bus.publish({"type": "alert", "id": alert_id})
+
+
+def publish_seen(user_id, last_seen):
+    get_bus().publish({"type": "seen", "user_id": user_id, "last_seen": last_seen})
@@ -0,0 +1,110 @@
+"""
+Cached state behind the alert feed (GET /api/alerts/alerts/).
+
+The frontend polls the feed constantly, so the common poll is answered
+from the cache:
+
+- ``feed_state()`` holds a version token, the ids of the most recent SENT
+  alerts and the serialized first page. It is rebuilt on the first poll
+  after ``invalidate_feed()``, which runs whenever an alert is saved or
+  deleted, and after bulk writes that bypass signals (scheduler, trend
+  alerts). FEED_CACHE_TIMEOUT bounds staleness where the cache is not
+  shared between processes.
+- ``last_seen_id(user_id)`` caches the user's watermark for the same
+  bound: without a shared CACHES backend a mark-seen in one worker is
+  only seen by the others once their copy expires.
+- The unseen count is a bisect over the cached ids, i.e. a subtraction;
+  only a watermark older than the cached window costs a COUNT.
+- ``feed_etag`` is derived from the version and watermark, so unchanged
+  feeds answer If-None-Match with 304 without a query.
+"""
+
+import hashlib
+import uuid
+from bisect import bisect_right
+
+from django.core.cache import cache
+
+from .models import Alert, UserAlertState
+
+FEED_KEY = "alerts:feed"
+LAST_SEEN_KEY = "alerts:last_seen:{}"
+FEED_CACHE_TIMEOUT = 60
+LAST_SEEN_CACHE_TIMEOUT = FEED_CACHE_TIMEOUT
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+ID_WINDOW = 1000
+
+FEED_FIELDS = ("id", "title", "message", "category", "level", "alert_type", "crop_name", "created_at", "url")
+
+
+def sent_alerts():
+    return Alert.objects.filter(status="SENT")
+
+
+def feed_page(before=None, limit=PAGE_SIZE):
+    """One page of SENT alerts, newest first, keyed on id (rows with id < before)."""
+    qs = sent_alerts()
+    if before is not None:
+        qs = qs.filter(id__lt=before)
+    return list(qs.order_by("-id").values(*FEED_FIELDS)[:limit])
+
+
+def feed_state():
+    state = cache.get(FEED_KEY)
+    if state is None:
+        ids = list(sent_alerts().order_by("-id").values_list("id", flat=True)[:ID_WINDOW])
+        ids.reverse()
+        state = {
+            "version": uuid.uuid4().hex,
+            "ids": ids,
+            "complete": len(ids) < ID_WINDOW,  # every SENT alert is in ids
+            "page": feed_page(),
+        }
+        cache.set(FEED_KEY, state, FEED_CACHE_TIMEOUT)
+    return state
+
+
+def invalidate_feed():
+    cache.delete(FEED_KEY)
+
+
+def latest_sent_id(state=None):
+    ids = (state or feed_state())["ids"]
+    return ids[-1] if ids else 0
+
+
+def cached_unseen_count(state, last_seen):
+    """The unseen count when the cached ids answer it, else None."""
+    ids = state["ids"]
+    if state["complete"] or (ids and last_seen >= ids[0]):
+        return len(ids) - bisect_right(ids, last_seen)
+    return None
+
+
+def unseen_count(state, last_seen):
+    count = cached_unseen_count(state, last_seen)
+    return count if count is not None else sent_alerts().filter(id__gt=last_seen).count()
+
+
+def last_seen_id(user_id):
+    key = LAST_SEEN_KEY.format(user_id)
+    last_seen = cache.get(key)
+    if last_seen is None:
+        last_seen = (
+            UserAlertState.objects.filter(user_id=user_id).values_list("last_seen_alert_id", flat=True).first()
+            or 0
+        )
+        cache.set(key, last_seen, LAST_SEEN_CACHE_TIMEOUT)
+    return last_seen
+
+
+def set_last_seen_id(user_id, alert_id):
+    UserAlertState.objects.update_or_create(user_id=user_id, defaults={"last_seen_alert_id": alert_id})
+    cache.set(LAST_SEEN_KEY.format(user_id), alert_id, LAST_SEEN_CACHE_TIMEOUT)
+
+
+def feed_etag(state, last_seen, before, limit):
+    raw = f"{state['version']}:{last_seen}:{before}:{limit}"
+    return '"' + hashlib.md5(raw.encode()).hexdigest() + '"'
@@ -0,0 +1,168 @@
+"""
+Per-user alert inbox.
+
+``fill_inboxes`` links alerts to their recipients at fan-out time with
+chunked bulk inserts; retries are harmless (unique (user, alert), conflicts
+ignored). Listing an inbox is one range scan of that index, newest first.
+
+Read state lives on UserAlertState as a watermark plus sorted, merged
+[low, high] alert id ranges above it, so it stays a few numbers per user:
+"mark all read" moves the watermark and clears the ranges, marking single
+alerts adds or extends a range. Only alerts in the user's inbox can be
+marked, and at most MAX_READ_RANGES ranges are kept: beyond that the
+oldest ranges are folded into the watermark, so unread_count (one
+exclusion per range) stays bounded.
+"""
+
+from bisect import bisect_right
+
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import AlertInbox, UserAlertState
+
+INBOX_BATCH_SIZE = 1000
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+MAX_READ_IDS = 500
+MAX_READ_RANGES = 50
+
+INBOX_FIELDS = ("title", "message", "category", "level", "alert_type", "crop_name", "region", "created_at", "url")
+
+
+def fill_inboxes(alert_ids, user_ids, batch_size=INBOX_BATCH_SIZE):
+    """
+    Add alerts to the inbox of every user in user_ids.
+
+    Args:
+        alert_ids: Alert ids to deliver
+        user_ids: Queryset of user ids (values_list("id", flat=True))
+        batch_size: Rows per INSERT
+
+    Returns:
+        Rows submitted (existing rows are skipped by the database)
+    """
+    if not alert_ids:
+        return 0
+
+    written = 0
+    batch = []
+    for user_id in user_ids.iterator(chunk_size=batch_size):
+        batch.extend(AlertInbox(user_id=user_id, alert_id=alert_id) for alert_id in alert_ids)
+        while len(batch) >= batch_size:
+            AlertInbox.objects.bulk_create(batch[:batch_size], ignore_conflicts=True)
+            written += batch_size
+            batch = batch[batch_size:]
+
+    if batch:
+        AlertInbox.objects.bulk_create(batch, ignore_conflicts=True)
+        written += len(batch)
+    return written
+
+
+def inbox_page(user_id, before=None, limit=PAGE_SIZE):
+    """One page of a user's inbox, newest alert first, keyed on alert id."""
+    qs = AlertInbox.objects.filter(user_id=user_id)
+    if before is not None:
+        qs = qs.filter(alert_id__lt=before)
+    rows = qs.order_by("-alert_id").values("alert_id", *(f"alert__{f}" for f in INBOX_FIELDS))[:limit]
+    return [
+        {"id": row["alert_id"], **{f: row[f"alert__{f}"] for f in INBOX_FIELDS}}
+        for row in rows
+    ]
+
+
+def read_state(user_id):
+    """(watermark, ranges) of the user's inbox read state."""
+    state = UserAlertState.objects.filter(user_id=user_id).values_list(
+        "inbox_read_upto", "inbox_read_ranges"
+    ).first()
+    return state or (0, [])
+
+
+def is_read(alert_id, upto, ranges):
+    if alert_id <= upto:
+        return True
+    i = bisect_right(ranges, [alert_id, float("inf")]) - 1
+    return i >= 0 and ranges[i][0] <= alert_id <= ranges[i][1]
+
+
+def add_read(upto, ranges, alert_ids):
+    """Return (upto, ranges) with alert_ids marked read; ranges stay sorted and merged."""
+    merged = [list(r) for r in ranges]
+    for alert_id in sorted(set(alert_ids)):
+        if alert_id <= upto:
+            continue
+        merged.append([alert_id, alert_id])
+    merged.sort()
+
+    ranges = []
+    for low, high in merged:
+        if ranges and low <= ranges[-1][1] + 1:
+            ranges[-1][1] = max(ranges[-1][1], high)
+        else:
+            ranges.append([low, high])
+
+    if ranges and ranges[0][0] == upto + 1:
+        upto = ranges.pop(0)[1]
+    if len(ranges) > MAX_READ_RANGES:
+        # older unread alerts in the folded gaps count as read
+        upto = ranges[-MAX_READ_RANGES - 1][1]
+        ranges = ranges[-MAX_READ_RANGES:]
+    return upto, ranges
+
+
+def mark_read(user_id, alert_ids):
+    """
+    Mark those of alert_ids that are in the user's inbox read. The state row
+    is locked while its ranges are merged, so concurrent calls (two tabs)
+    do not lose each other's ranges.
+    """
+    alert_ids = list(
+        AlertInbox.objects.filter(user_id=user_id, alert_id__in=alert_ids).values_list("alert_id", flat=True)
+    )
+    with transaction.atomic():
+        UserAlertState.objects.get_or_create(user_id=user_id)
+        state = UserAlertState.objects.select_for_update().get(user_id=user_id)
+        upto, ranges = add_read(state.inbox_read_upto, state.inbox_read_ranges, alert_ids)
+        state.inbox_read_upto, state.inbox_read_ranges = upto, ranges
+        state.save(update_fields=["inbox_read_upto", "inbox_read_ranges", "updated_at"])
+    return upto, ranges
+
+
+def mark_all_read(user_id):
+    """
+    Everything currently in the inbox is read: one lookup of the state with
+    the latest inbox id, one UPDATE. Returns the stored watermark.
+    """
+    latest = Subquery(
+        AlertInbox.objects.filter(user_id=OuterRef("user_id")).order_by("-alert_id").values("alert_id")[:1]
+    )
+    state = (
+        UserAlertState.objects.filter(user_id=user_id).annotate(latest=latest)
+        .values_list("inbox_read_upto", "latest").first()
+    )
+    if state is None:
+        latest = (
+            AlertInbox.objects.filter(user_id=user_id).order_by("-alert_id").values_list("alert_id", flat=True).first()
+            or 0
+        )
+        state, _ = UserAlertState.objects.get_or_create(user_id=user_id, defaults={"inbox_read_upto": latest})
+        state = (state.inbox_read_upto, latest)
+
+    upto = max(state[0], state[1] or 0)
+    UserAlertState.objects.filter(user_id=user_id).update(
+        inbox_read_upto=Greatest("inbox_read_upto", Value(upto)),
+        inbox_read_ranges=[],
+        updated_at=timezone.now(),
+    )
+    return upto
+
+
+def unread_count(user_id, upto, ranges):
+    qs = AlertInbox.objects.filter(user_id=user_id, alert_id__gt=upto)
+    for low, high in ranges:
+        qs = qs.exclude(Q(alert_id__gte=low) & Q(alert_id__lte=high))
+    return qs.count()
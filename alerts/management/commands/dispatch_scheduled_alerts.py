@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+import time
+
+from alerts.scheduler import dispatch_due_alerts, next_due_at
+
+
+class Command(BaseCommand):
+    help = (
+        "Send SCHEDULED alerts when they fall due: flip them to SENT and queue "
+        "their push in the outbox. Sleeps until the next due alert instead of polling."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Send everything due now and exit")
+        parser.add_argument("--batch", type=int, default=500, help="Alerts claimed per transaction")
+        parser.add_argument("--max-sleep", type=float, default=60.0,
+                            help="Longest sleep in seconds, so newly scheduled alerts are noticed")
+
+    def handle(self, *args, **opts):
+        total = 0
+        try:
+            while True:
+                # Drain everything that is due in bulk
+                while True:
+                    alerts = dispatch_due_alerts(batch_size=opts["batch"])
+                    if not alerts:
+                        break
+                    total += len(alerts)
+                    self.stdout.write(f"Sent {len(alerts)} scheduled alerts (ids {alerts[0].id}..{alerts[-1].id})")
+                    if len(alerts) < opts["batch"]:
+                        break
+
+                if opts["once"]:
+                    break
+
+                time.sleep(self._sleep_seconds(opts["max_sleep"]))
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Done. Scheduled alerts sent: {total}"))
+
+    def _sleep_seconds(self, max_sleep):
+        due = next_due_at()
+        if due is None:
+            return max_sleep
+        # small floor: a due alert locked by another scheduler must not make us spin
+        return min(max_sleep, max(0.5, (due - timezone.now()).total_seconds()))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0006_alert_scheduled_for'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['status', 'scheduled_for'], name='alerts_aler_status_320fa4_idx'),
+        ),
+    ]
@@ -25,6 +25,10 @@ class Alert(models.Model):
     title = models.CharField(max_length=150,default="System Alert")
     message = models.TextField()
     crop_name = models.CharField(max_length=100, blank=True, null=True)
+    # who receives the alert (notifications.audiences); "targeted" narrows
+    # verified users to farmers in region and/or with listings of crop_name
+    audience = models.CharField(max_length=20, default="verified")
+    region = models.CharField(max_length=100, blank=True, null=True)
 
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
     alert_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
@@ -37,6 +41,14 @@ class Alert(models.Model):
     # optional: where notification click should go
     url = models.CharField(max_length=255, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # dispatch_scheduled_alerts: due SCHEDULED alerts / next due time
+            models.Index(fields=["status", "scheduled_for"]),
+            # alert feed: SENT alerts paged by id
+            models.Index(fields=["status", "-id"]),
+        ]
+
     def __str__(self):
         return f"{self.title} ({self.category})"
 
@@ -46,5 +58,27 @@ class UserAlertState(models.Model):
     last_seen_alert_id = models.IntegerField(default=0)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Inbox read state: every alert id <= inbox_read_upto is read, plus the
+    # inclusive [low, high] id ranges above it (see alerts.inbox)
+    inbox_read_upto = models.BigIntegerField(default=0)
+    inbox_read_ranges = models.JSONField(default=list, blank=True)
+
+    def __str__(self):
+        return f"{self.user.username} last_seen={self.last_seen_alert_id}"
+
+
+class AlertInbox(models.Model):
+    """An alert delivered to one user's inbox, written in bulk at fan-out time."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="alert_inbox")
+    alert = models.ForeignKey(Alert, on_delete=models.CASCADE, related_name="inbox_entries")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # also the (user, alert) index: inbox pages are one range scan, newest first
+            models.UniqueConstraint(fields=["user", "alert"], name="uniq_alert_inbox"),
+        ]
+
     def __str__(self):
-        return f"{self.user.username} last_seen={self.last_seen_alert_id}"
\ No newline at end of file
+        return f"{self.user_id} <- alert {self.alert_id}"
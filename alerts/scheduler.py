@@ -0,0 +1,65 @@
+"""
+Delivery of SCHEDULED alerts.
+
+``dispatch_due_alerts`` claims alerts whose ``scheduled_for`` has passed,
+flips them to SENT and queues their push in the outbox, all in one
+transaction per batch. ``next_due_at`` tells the scheduler loop how long it
+can sleep. Both queries use the (status, scheduled_for) index.
+"""
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from notifications.models import PushOutbox
+from .bus import publish_alerts
+from .feed import invalidate_feed
+from .models import Alert
+
+
+def _due(now):
+    return Alert.objects.filter(status="SCHEDULED", scheduled_for__isnull=False, scheduled_for__lte=now)
+
+
+def dispatch_due_alerts(batch_size=500, now=None):
+    """Send one batch of due alerts. Returns the alerts flipped to SENT."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        alerts = list(
+            _due(now).select_for_update(skip_locked=True)
+            .order_by("scheduled_for", "id")[:batch_size]
+        )
+        if not alerts:
+            return []
+
+        if connection.features.has_select_for_update:
+            # rows are locked, nobody else can flip them
+            Alert.objects.filter(id__in=[a.id for a in alerts]).update(status="SENT")
+        else:
+            # no row locks (SQLite): flip one by one so concurrent schedulers never both send
+            alerts = [
+                a for a in alerts
+                if Alert.objects.filter(id=a.id, status="SCHEDULED").update(status="SENT")
+            ]
+
+        PushOutbox.objects.bulk_create([
+            PushOutbox(alert=a, title=a.title, body=a.message, url=a.url or "", audience=a.audience)
+            for a in alerts
+        ])
+        # the status flip bypasses post_save
+        transaction.on_commit(invalidate_feed)
+        sent_ids = [a.id for a in alerts]
+        transaction.on_commit(lambda: publish_alerts(sent_ids))
+
+    for alert in alerts:
+        alert.status = "SENT"
+    return alerts
+
+
+def next_due_at():
+    """scheduled_for of the earliest pending alert, or None."""
+    return (
+        Alert.objects.filter(status="SCHEDULED", scheduled_for__isnull=False)
+        .order_by("scheduled_for")
+        .values_list("scheduled_for", flat=True)
+        .first()
+    )
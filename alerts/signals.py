@@ -1,5 +1,8 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from .bus import publish_alerts
+from .feed import invalidate_feed
 from .models import Alert, UserAlertState
 from notifications.utils import send_push
 from django.contrib.auth.models import User
@@ -15,4 +18,12 @@ def alert_created_notify(sender, instance, created, **kwargs):
        # title=f"New {instance.category} Alert!",
        # body=instance.message,
        # users=users
-   # )
\ No newline at end of file
+   # )
+
+@receiver(post_save, sender=Alert)
+@receiver(post_delete, sender=Alert)
+def alert_changed_invalidate_feed(sender, instance, created=False, **kwargs):
+    # after commit, so a concurrent poll cannot cache the pre-commit feed
+    transaction.on_commit(invalidate_feed)
+    if created and instance.status == "SENT":
+        transaction.on_commit(lambda: publish_alerts([instance.id]))
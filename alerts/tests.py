@@ -1,3 +1,363 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import FarmerDetails
+from notifications.models import PushOutbox
+from notifications.transports import get_transport
+from .async_views import event_stream
+from .bus import get_bus, publish_alerts, publish_seen, reset_bus
+from .feed import LAST_SEEN_KEY, invalidate_feed, set_last_seen_id
+from .management.commands.dispatch_scheduled_alerts import Command as DispatchScheduledCommand
+from . import inbox
+from .inbox import MAX_READ_RANGES, add_read, fill_inboxes, is_read
+from .models import Alert, AlertInbox, UserAlertState
+from .scheduler import dispatch_due_alerts, next_due_at
+
+FAKE_PUSH = {"TRANSPORT": "notifications.transports.FakeTransport", "BACKOFF": 0}
+
+
+@override_settings(PUSH_NOTIFICATIONS=FAKE_PUSH)
+class SuddenAlertTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        admin = User.objects.create_user(username="admin", is_staff=True)
+        self.client.force_authenticate(user=admin)
+
+    def test_sudden_alert_is_queued_not_sent_inline(self):
+        response = self.client.post("/api/alerts/sudden/", {
+            "title": "Heavy rain", "message": "Flood risk", "category": "WEATHER", "level": "HIGH", "url": "/alerts",
+        }, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        alert = Alert.objects.get(id=response.data["alert_id"])
+        outbox = PushOutbox.objects.get(id=response.data["push_id"])
+        self.assertEqual(outbox.alert, alert)
+        self.assertEqual((outbox.status, outbox.audience, outbox.url), ("PENDING", "verified", "/alerts"))
+        self.assertEqual(get_transport().calls, [])
+
+    def test_invalid_alert_queues_nothing(self):
+        response = self.client.post("/api/alerts/sudden/", {"title": "x", "message": "y", "category": "PRICE"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PushOutbox.objects.exists())
+
+
+class ScheduledAlertDispatchTests(TestCase):
+    def _schedule(self, title, minutes):
+        return Alert.objects.create(
+            title=title, message=f"{title} body", category="WEATHER", alert_type="SCHEDULED",
+            status="SCHEDULED", scheduled_for=timezone.now() + timedelta(minutes=minutes), url="/alerts",
+        )
+
+    def test_due_alerts_are_sent_and_queued_in_batches(self):
+        due = [self._schedule(f"due {i}", -10 + i) for i in range(3)]
+        later = self._schedule("later", 30)
+
+        first = dispatch_due_alerts(batch_size=2)
+        second = dispatch_due_alerts(batch_size=2)
+
+        self.assertEqual([a.id for a in first], [due[0].id, due[1].id])
+        self.assertEqual([a.id for a in second], [due[2].id])
+        self.assertEqual(dispatch_due_alerts(batch_size=2), [])
+        self.assertEqual(Alert.objects.filter(status="SENT").count(), 3)
+        self.assertEqual(
+            set(PushOutbox.objects.values_list("alert_id", flat=True)), {a.id for a in due}
+        )
+        later.refresh_from_db()
+        self.assertEqual(later.status, "SCHEDULED")
+        self.assertEqual(next_due_at(), later.scheduled_for)
+
+    def test_command_sleeps_until_next_due_alert(self):
+        command = DispatchScheduledCommand()
+        self.assertEqual(command._sleep_seconds(60), 60)
+
+        self._schedule("soon", 0.5)
+        self.assertLessEqual(command._sleep_seconds(60), 30)
+        self._schedule("overdue", -1)
+        self.assertEqual(command._sleep_seconds(60), 0.5)
+
+    def test_once_drains_due_alerts(self):
+        for i in range(5):
+            self._schedule(f"due {i}", -1)
+        out = StringIO()
+        call_command("dispatch_scheduled_alerts", "--once", "--batch", "2", stdout=out)
+        self.assertIn("Scheduled alerts sent: 5", out.getvalue())
+        self.assertEqual(PushOutbox.objects.count(), 5)
+
+
+class AlertFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="farmer")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alerts = [self._alert(f"alert {i}") for i in range(5)]
+
+    def _alert(self, title, status="SENT"):
+        return Alert.objects.create(title=title, message="m", category="WEATHER", alert_type="SUDDEN",
+                                    status=status, url="/alerts")
+
+    def test_cursor_pagination(self):
+        first = self.client.get("/api/alerts/alerts/?limit=2").data
+        self.assertEqual([a["id"] for a in first["alerts"]], [self.alerts[4].id, self.alerts[3].id])
+        self.assertEqual(first["next_cursor"], self.alerts[3].id)
+
+        second = self.client.get(f"/api/alerts/alerts/?limit=2&before={first['next_cursor']}").data
+        third = self.client.get(f"/api/alerts/alerts/?limit=2&before={second['next_cursor']}").data
+        self.assertEqual([a["id"] for a in second["alerts"]], [self.alerts[2].id, self.alerts[1].id])
+        self.assertEqual([a["id"] for a in third["alerts"]], [self.alerts[0].id])
+        self.assertIsNone(third["next_cursor"])
+
+        self.assertEqual(self.client.get("/api/alerts/alerts/?limit=x").status_code, 400)
+
+    def test_unseen_count_and_mark_seen(self):
+        data = self.client.get("/api/alerts/alerts/").data
+        self.assertEqual(data["unseen_count"], 5)
+        self.assertFalse(any(a["seen"] for a in data["alerts"]))
+
+        self.client.post("/api/alerts/mark-seen/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self._alert("new")
+            self._alert("later", status="SCHEDULED")
+
+        data = self.client.get("/api/alerts/alerts/").data
+        self.assertEqual(data["unseen_count"], 1)
+        self.assertEqual([a["seen"] for a in data["alerts"]], [False] + [True] * 5)
+
+    def test_cached_poll_does_not_query(self):
+        self.client.get("/api/alerts/alerts/")
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/alerts/alerts/")
+        self.assertEqual(response.data["unseen_count"], 5)
+
+    def test_unchanged_feed_returns_304(self):
+        etag = self.client.get("/api/alerts/alerts/")["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/alerts/alerts/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get("/api/alerts/alerts/", HTTP_IF_NONE_MATCH=f'"stale", W/{etag}')
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get("/api/alerts/alerts/", HTTP_IF_NONE_MATCH=f'"x{etag[1:]}')
+        self.assertEqual(response.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._alert("new")
+        response = self.client.get("/api/alerts/alerts/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_scheduler_invalidates_feed(self):
+        self.client.get("/api/alerts/alerts/")
+        scheduled = Alert.objects.create(title="due", message="m", category="WEATHER", alert_type="SCHEDULED",
+                                         status="SCHEDULED", scheduled_for=timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            dispatch_due_alerts()
+        data = self.client.get("/api/alerts/alerts/").data
+        self.assertEqual(data["alerts"][0]["id"], scheduled.id)
+        self.assertEqual(data["unseen_count"], 6)
+
+
+@override_settings(ALERT_BUS={"BACKEND": "alerts.bus.RecordingBus"})
+class AlertStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="farmer")
+        self.alerts = [
+            Alert.objects.create(title=f"a{i}", message="m", category="WEATHER", alert_type="SUDDEN")
+            for i in range(2)
+        ]
+        reset_bus()
+        self.bus = get_bus()
+
+    async def _events(self, stream, count):
+        return [await anext(stream) for _ in range(count)]
+
+    async def test_connect_sends_state_then_published_alerts(self):
+        stream = event_stream(self.user.id, heartbeat=5)
+        retry, sync = await self._events(stream, 2)
+        self.assertEqual(retry, "retry: 5000\n\n")
+        self.assertIn("event: sync", sync)
+        self.assertIn(f'"latest_id": {self.alerts[1].id}, "unseen_count": 2', sync)
+
+        publish_alerts([999])
+        alert = await anext(stream)
+        self.assertEqual(alert, 'id: 999\nevent: alert\ndata: {"id": 999, "unseen_count": 3}\n\n')
+        self.assertEqual(self.bus.subscriber_count, 1)
+        await stream.aclose()
+        self.assertEqual(self.bus.subscriber_count, 0)
+
+    async def test_reconnect_replays_missed_alerts(self):
+        stream = event_stream(self.user.id, last_event_id=self.alerts[0].id, heartbeat=5)
+        _, missed, sync = await self._events(stream, 3)
+        self.assertTrue(missed.startswith(f"id: {self.alerts[1].id}\nevent: alert\n"))
+        self.assertIn("event: sync", sync)
+        await stream.aclose()
+
+    async def test_heartbeat_resyncs_from_cached_feed(self):
+        stream = event_stream(self.user.id, heartbeat=0.05)
+        await self._events(stream, 2)
+
+        # written by another process: no bus event, only the feed changes
+        other = await Alert.objects.acreate(title="other", message="m", category="WEATHER", alert_type="SUDDEN")
+        invalidate_feed()
+        caught_up, keepalive = await self._events(stream, 2)
+        self.assertIn(f'"id": {other.id}, "unseen_count": 3', caught_up)
+        self.assertEqual(keepalive, ": keepalive\n\n")
+
+        # marked seen by another process: only the cached watermark changes
+        await sync_to_async(cache.set)(LAST_SEEN_KEY.format(self.user.id), other.id)
+        count, keepalive = await self._events(stream, 2)
+        self.assertEqual(count, 'event: count\ndata: {"unseen_count": 0}\n\n')
+        self.assertEqual(await anext(stream), ": keepalive\n\n")
+
+        # a bus event after the resync is not sent again
+        publish_alerts([other.id])
+        self.assertEqual(await anext(stream), ": keepalive\n\n")
+        await stream.aclose()
+
+    async def test_bus_event_catches_up_from_feed_once(self):
+        stream = event_stream(self.user.id, heartbeat=0.05)
+        await self._events(stream, 2)
+
+        other = await Alert.objects.acreate(title="other", message="m", category="WEATHER", alert_type="SUDDEN")
+        alert = await Alert.objects.acreate(title="new", message="m", category="WEATHER", alert_type="SUDDEN")
+        invalidate_feed()
+        publish_alerts([alert.id])
+        publish_alerts([alert.id])
+        caught_up, published, keepalive = await self._events(stream, 3)
+        self.assertIn(f'"id": {other.id}, "unseen_count": 4', caught_up)
+        self.assertIn(f'"id": {alert.id}, "unseen_count": 4', published)
+        self.assertEqual(keepalive, ": keepalive\n\n")
+        await stream.aclose()
+
+    async def test_mark_seen_elsewhere_updates_count(self):
+        stream = event_stream(self.user.id, heartbeat=5)
+        await self._events(stream, 2)
+
+        await sync_to_async(set_last_seen_id)(self.user.id, self.alerts[1].id)
+        publish_seen(self.user.id, self.alerts[1].id)
+        self.assertEqual(await anext(stream), 'event: count\ndata: {"unseen_count": 0}\n\n')
+        await stream.aclose()
+
+    def test_new_alerts_are_published_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            alert = Alert.objects.create(title="new", message="m", category="WEATHER", alert_type="SUDDEN")
+            Alert.objects.create(title="later", message="m", category="WEATHER", alert_type="SCHEDULED",
+                                 status="SCHEDULED", scheduled_for=timezone.now())
+            self.assertEqual(self.bus.published, [])
+        self.assertEqual(self.bus.published, [{"type": "alert", "id": alert.id}])
+
+    async def test_endpoint_requires_authentication(self):
+        response = await self.async_client.get("/api/alerts/stream/")
+        self.assertEqual(response.status_code, 401)
+
+        token = str(AccessToken.for_user(self.user))
+        response = await self.async_client.get(f"/api/alerts/stream/?token={token}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(await anext(aiter(response.streaming_content)), b"retry: 5000\n\n")
+
+
+class InboxReadStateTests(TestCase):
+    def test_add_read_merges_ranges_and_advances_watermark(self):
+        upto, ranges = add_read(10, [], [15, 12, 13, 9])
+        self.assertEqual((upto, ranges), (10, [[12, 13], [15, 15]]))
+        upto, ranges = add_read(upto, ranges, [11, 14])
+        self.assertEqual((upto, ranges), (15, []))
+
+    def test_ranges_are_capped(self):
+        upto, ranges = add_read(0, [], range(2, 2 * MAX_READ_RANGES + 10, 2))
+        self.assertEqual(len(ranges), MAX_READ_RANGES)
+        self.assertEqual(upto, ranges[0][0] - 2)
+
+    def test_is_read(self):
+        ranges = [[12, 13], [20, 25]]
+        self.assertEqual(
+            [i for i in range(8, 28) if is_read(i, 10, ranges)],
+            [8, 9, 10, 12, 13, 20, 21, 22, 23, 24, 25],
+        )
+
+
+@override_settings(PUSH_NOTIFICATIONS=FAKE_PUSH)
+class AlertInboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="north")
+        FarmerDetails.objects.create(user=self.user, region="North")
+        self.other = User.objects.create_user(username="south")
+        FarmerDetails.objects.create(user=self.other, region="South")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.alerts = [
+            Alert.objects.create(title=f"a{i}", message="m", category="WEATHER", alert_type="SUDDEN")
+            for i in range(5)
+        ]
+        fill_inboxes([a.id for a in self.alerts], User.objects.filter(id=self.user.id).values_list("id", flat=True))
+
+    def test_fill_is_idempotent(self):
+        users = User.objects.values_list("id", flat=True)
+        fill_inboxes([self.alerts[0].id], users, batch_size=1)
+        fill_inboxes([self.alerts[0].id], users, batch_size=1)
+        self.assertEqual(AlertInbox.objects.count(), 6)
+
+    def test_list_is_paged_newest_first(self):
+        with self.assertNumQueries(3):  # read state, page, unread count
+            data = self.client.get("/api/alerts/inbox/?limit=3").data
+        self.assertEqual([a["id"] for a in data["alerts"]], [a.id for a in self.alerts[:1:-1]])
+        self.assertEqual(data["unread_count"], 5)
+
+        rest = self.client.get(f"/api/alerts/inbox/?limit=3&before={data['next_cursor']}").data
+        self.assertEqual([a["id"] for a in rest["alerts"]], [self.alerts[1].id, self.alerts[0].id])
+        self.assertIsNone(rest["next_cursor"])
+
+    def test_mark_read(self):
+        response = self.client.post("/api/alerts/inbox/read/", {"ids": [self.alerts[3].id]}, format="json")
+        self.assertEqual(response.data["read_ranges"], [[self.alerts[3].id, self.alerts[3].id]])
+        data = self.client.get("/api/alerts/inbox/").data
+        self.assertEqual(data["unread_count"], 4)
+        self.assertEqual([a["read"] for a in data["alerts"]], [False, True, False, False, False])
+
+        with self.assertNumQueries(2):  # read state with latest inbox id, update
+            self.client.post("/api/alerts/inbox/read/", {"all": True}, format="json")
+        self.assertEqual(self.client.get("/api/alerts/inbox/").data["unread_count"], 0)
+
+        self.assertEqual(self.client.post("/api/alerts/inbox/read/", {"ids": "x"}, format="json").status_code, 400)
+
+    def test_mark_read_only_accepts_own_inbox_ids(self):
+        url = "/api/alerts/inbox/read/"
+        self.assertEqual(self.client.post(url, {"ids": [True]}, format="json").status_code, 400)
+        too_many = list(range(inbox.MAX_READ_IDS + 1))
+        self.assertEqual(self.client.post(url, {"ids": too_many}, format="json").status_code, 400)
+
+        response = self.client.post(url, {"ids": [self.alerts[2].id, 10**9, -5]}, format="json")
+        self.assertEqual(response.data["read_ranges"], [[self.alerts[2].id, self.alerts[2].id]])
+
+    def test_mark_all_read_returns_stored_watermark(self):
+        UserAlertState.objects.create(user=self.user, inbox_read_upto=10**6)
+        response = self.client.post("/api/alerts/inbox/read/", {"all": True}, format="json")
+        self.assertEqual(response.data["read_upto"], 10**6)
+        self.assertEqual(UserAlertState.objects.get(user=self.user).inbox_read_upto, 10**6)
+
+        self.assertEqual(inbox.mark_all_read(self.other.id), 0)
+
+    def test_outbox_fills_inboxes_of_targeted_audience(self):
+        admin = User.objects.create_user(username="admin", is_staff=True)
+        self.client.force_authenticate(user=admin)
+        response = self.client.post("/api/alerts/sudden/", {
+            "title": "Rain", "message": "North only", "category": "WEATHER", "level": "HIGH",
+            "audience": "targeted", "region": "north",
+        }, format="json")
+        call_command("dispatch_push_outbox", "--once", stdout=StringIO())
+
+        alert_id = response.data["alert_id"]
+        self.assertEqual(list(AlertInbox.objects.filter(alert_id=alert_id).values_list("user_id", flat=True)),
+                         [self.user.id])
+        self.assertEqual(PushOutbox.objects.get().stats["inbox"], 1)
@@ -1,9 +1,13 @@
 from django.urls import path
-from .views import list_alerts, mark_all_seen, create_sudden_alert, create_scheduled_alert
+from .views import list_alerts, mark_all_seen, create_sudden_alert, create_scheduled_alert, list_inbox, mark_inbox_read
+from .async_views import alert_stream
 
 urlpatterns = [
     path("alerts/", list_alerts),
     path("mark-seen/", mark_all_seen),
     path("sudden/", create_sudden_alert),
     path("scheduled/", create_scheduled_alert),
+    path("stream/", alert_stream),
+    path("inbox/", list_inbox),
+    path("inbox/read/", mark_inbox_read),
 ]
\ No newline at end of file
@@ -1,58 +1,73 @@
 from django.shortcuts import render
 from rest_framework.decorators import api_view,  permission_classes
 from rest_framework.response import Response
-from .models import Alert, UserAlertState
+from . import feed
+from .bus import publish_seen
+from .models import Alert
 from rest_framework.permissions import IsAuthenticated,IsAdminUser
 from django.utils import timezone
+from django.db import transaction
+from django.utils.http import parse_etags
 
 from .serializers import UserAlertSerializer
-from accounts.models import FarmerDetails, BuyerDetails
-from notifications.utils import send_push
+from notifications.outbox import enqueue_push
+from . import inbox
 
-#List alerts + unseen count
-def get_verified_user_ids():
-    farmer_ids = FarmerDetails.objects.filter(is_active=True).values_list("user_id", flat=True)
-    buyer_ids = BuyerDetails.objects.filter(is_active=True).values_list("user_id", flat=True)
-    return set(farmer_ids) | set(buyer_ids)
+ALERT_AUDIENCE_CHOICES = ("verified", "targeted")
 
+#List alerts + unseen count
+# Keyset pagination: ?before=<id>&limit=<n>, follow next_cursor for older alerts.
+# Polls are served from the cached feed state (see alerts.feed); an unchanged
+# feed answers If-None-Match with 304.
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def list_alerts(request):
-    # create state if not exists
-    state, _ = UserAlertState.objects.get_or_create(user=request.user)
-
-    alerts = Alert.objects.filter(status="SENT").order_by("-id")[:50]
-    unseen_count = Alert.objects.filter(status="SENT", id__gt=state.last_seen_alert_id).count()
-
-    data = []
-    for a in alerts:
-        data.append({
-            "id": a.id,
-            "title": a.title,
-            "message": a.message,
-            "category": a.category,
-            "level": a.level,
-            "alert_type": a.alert_type,
-            "crop_name": a.crop_name,
-            "created_at": a.created_at,
-            "url": a.url,
-            "seen": a.id <= state.last_seen_alert_id
-        })
-
-    return Response({"unseen_count": unseen_count, "alerts": data})
+    try:
+        before = request.query_params.get("before")
+        before = int(before) if before else None
+        limit = min(int(request.query_params.get("limit", feed.PAGE_SIZE)), feed.MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({"error": "before and limit must be integers"}, status=400)
+    if limit < 1:
+        return Response({"error": "limit must be positive"}, status=400)
+
+    state = feed.feed_state()
+    last_seen = feed.last_seen_id(request.user.id)
+
+    etag = feed.feed_etag(state, last_seen, before, limit)
+    # weak comparison, as for GET in django.utils.cache
+    client_etags = [tag.removeprefix("W/") for tag in parse_etags(request.headers.get("If-None-Match", ""))]
+    if "*" in client_etags or etag in client_etags:
+        return Response(status=304, headers={"ETag": etag})
+
+    if before is None and limit <= len(state["page"]):
+        alerts = state["page"][:limit]
+    elif before is None and state["complete"] and len(state["page"]) < feed.PAGE_SIZE:
+        alerts = state["page"]  # fewer SENT alerts than a page
+    else:
+        alerts = feed.feed_page(before, limit)
+
+    data = [dict(a, seen=a["id"] <= last_seen) for a in alerts]
+    next_cursor = alerts[-1]["id"] if len(alerts) == limit else None
+
+    return Response(
+        {"unseen_count": feed.unseen_count(state, last_seen), "alerts": data, "next_cursor": next_cursor},
+        headers={"ETag": etag},
+    )
 
 #Mark all as seen (update last_seen_alert_id)
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def mark_all_seen(request):
-    state, _ = UserAlertState.objects.get_or_create(user=request.user)
-    latest = Alert.objects.filter(status="SENT").order_by("-id").first()
+    last_seen = feed.last_seen_id(request.user.id)
+    latest = feed.latest_sent_id()
     if latest:
-        state.last_seen_alert_id = latest.id
-        state.save()
-    return Response({"success": True, "last_seen_alert_id": state.last_seen_alert_id})
+        last_seen = latest
+        feed.set_last_seen_id(request.user.id, latest)
+        publish_seen(request.user.id, latest)
+    return Response({"success": True, "last_seen_alert_id": last_seen})
 
-#Create sudden alert (AI) — send push now
+#Create sudden alert (AI) — push is queued in the outbox
 @api_view(["POST"])
 @permission_classes([IsAdminUser])  # later you can allow AI service auth instead
 def create_sudden_alert(request):
@@ -62,32 +77,36 @@ def create_sudden_alert(request):
     crop_name = request.data.get("crop_name", None)
     url = request.data.get("url", "/alerts")
     level = request.data.get("level", None) 
+    audience = request.data.get("audience", "verified")  # verified/targeted
+    region = request.data.get("region", None)
 
     if not title or not message or not category:
         return Response({"error": "title, message, category required"}, status=400)
 
+    if audience not in ALERT_AUDIENCE_CHOICES:
+        return Response({"error": f"audience must be one of {', '.join(ALERT_AUDIENCE_CHOICES)}"}, status=400)
+
     if category in ["PRICE", "DEMAND"] and level not in ["HIGH", "LOW"]:
         return Response({"error": "level must be HIGH or LOW for PRICE/DEMAND alerts"}, status=400)
 
-    alert = Alert.objects.create(
-        title=title,
-        message=message,
-        category=category,
-        level=level,
-        crop_name=crop_name,
-        alert_type="SUDDEN",
-        status="SENT",
-        url=url
-    )
-
-    # send to verified + active users
-    verified_ids = get_verified_user_ids()
-    from django.contrib.auth.models import User
-    users = User.objects.filter(id__in=verified_ids, is_active=True, fcmdevice__token__isnull=False).distinct()
-
-    send_push(title, message, users=users, url=url)
-
-    return Response({"success": True, "alert_id": alert.id})
+    # alert + outbox row commit together; dispatch_push_outbox fills the
+    # inboxes and sends the push to the audience
+    with transaction.atomic():
+        alert = Alert.objects.create(
+            title=title,
+            message=message,
+            category=category,
+            level=level,
+            crop_name=crop_name,
+            audience=audience,
+            region=region,
+            alert_type="SUDDEN",
+            status="SENT",
+            url=url
+        )
+        outbox = enqueue_push(title, message, url=url, audience=audience, alert=alert)
+
+    return Response({"success": True, "alert_id": alert.id, "push_id": outbox.id})
 
 #Create scheduled alert (admin creates now, send later)
 @api_view(["POST"])
@@ -99,20 +118,69 @@ def create_scheduled_alert(request):
     scheduled_for = request.data.get("scheduled_for")  # ISO datetime string
     url = request.data.get("url", "/alerts")
     level = request.data.get("level", None)
+    audience = request.data.get("audience", "verified")
+    region = request.data.get("region", None)
 
     if category in ["PRICE", "DEMAND"] and level not in ["HIGH", "LOW"]:
         return Response({"error": "level must be HIGH or LOW for PRICE/DEMAND alerts"}, status=400)
     if not title or not message or not category or not scheduled_for:
         return Response({"error": "title, message, category, scheduled_for required"}, status=400)
+    if audience not in ALERT_AUDIENCE_CHOICES:
+        return Response({"error": f"audience must be one of {', '.join(ALERT_AUDIENCE_CHOICES)}"}, status=400)
 
     alert = Alert.objects.create(
         title=title,
         message=message,
         category=category,
         level=level,
+        audience=audience,
+        region=region,
         alert_type="SCHEDULED",
         status="SCHEDULED",
         scheduled_for=scheduled_for,
         url=url
     )
     return Response({"success": True, "alert_id": alert.id})
+
+
+#Per-user inbox (targeted alerts), keyset paginated like the feed
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def list_inbox(request):
+    try:
+        before = request.query_params.get("before")
+        before = int(before) if before else None
+        limit = min(int(request.query_params.get("limit", inbox.PAGE_SIZE)), inbox.MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({"error": "before and limit must be integers"}, status=400)
+    if limit < 1:
+        return Response({"error": "limit must be positive"}, status=400)
+
+    upto, ranges = inbox.read_state(request.user.id)
+    alerts = inbox.inbox_page(request.user.id, before, limit)
+    data = [dict(a, read=inbox.is_read(a["id"], upto, ranges)) for a in alerts]
+
+    return Response({
+        "unread_count": inbox.unread_count(request.user.id, upto, ranges),
+        "alerts": data,
+        "next_cursor": alerts[-1]["id"] if len(alerts) == limit else None,
+    })
+
+#Mark inbox alerts read: {"ids": [...]} (at most inbox.MAX_READ_IDS, only ids in
+# the caller's inbox) or {"all": true}. Only MAX_READ_RANGES separate read ranges
+# are kept: marking more scattered alerts than that also marks the unread gaps
+# below the newest ranges read.
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def mark_inbox_read(request):
+    if request.data.get("all"):
+        upto = inbox.mark_all_read(request.user.id)
+        return Response({"success": True, "read_upto": upto})
+
+    ids = request.data.get("ids")
+    if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return Response({"error": "ids must be a list of alert ids, or pass all=true"}, status=400)
+    if len(ids) > inbox.MAX_READ_IDS:
+        return Response({"error": f"at most {inbox.MAX_READ_IDS} ids per request"}, status=400)
+    upto, ranges = inbox.mark_read(request.user.id, ids)
+    return Response({"success": True, "read_upto": upto, "read_ranges": ranges})
@@ -0,0 +1,122 @@
+"""
+Recent community messages, served from memory.
+
+``RecentMessages`` keeps the latest RECENT_MESSAGES serialized messages in
+a ring buffer. It is filled on first use with one query down the primary
+key index (newest first) and appended to when a send commits, so listing
+the community chat does not touch the database. Messages written by other
+processes are picked up at most once every REFRESH_SECONDS by re-reading
+the newest ids from CATCH_UP_WINDOW below the newest buffered one, so a
+message committed late with a lower id is still found; rows already
+buffered are skipped.
+
+Message ids are the cursor: ``messages(since=<id>)`` returns only newer
+messages, oldest first.
+"""
+
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import CommunityMessage
+from .serializers import CommunityMessageSerializer
+
+RECENT_MESSAGES = 300
+REFRESH_SECONDS = 5
+CATCH_UP_WINDOW = 100
+
+
+def _serialize(qs):
+    return CommunityMessageSerializer(qs.select_related("sender"), many=True).data
+
+
+class RecentMessages:
+    def __init__(self, size=RECENT_MESSAGES, refresh=REFRESH_SECONDS):
+        self.size = size
+        self.refresh = refresh
+        self._messages = None  # deque once loaded
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        rows = _serialize(CommunityMessage.objects.order_by("-id")[:self.size])
+        self._messages = deque(reversed(rows), maxlen=self.size)
+        self._checked_at = time.monotonic()
+
+    def _catch_up(self):
+        newest = self._messages[-1]["id"] if self._messages else 0
+        # newest first: with a longer backlog the older rows would not fit anyway
+        rows = CommunityMessage.objects.filter(id__gt=newest - CATCH_UP_WINDOW).order_by("-id")[:self.size]
+        for row in reversed(_serialize(rows)):
+            self._insert(row)
+        self._checked_at = time.monotonic()
+
+    def _insert(self, row):
+        messages = self._messages
+        if not messages or row["id"] > messages[-1]["id"]:
+            messages.append(row)
+            return
+        # committed out of id order
+        ids = [m["id"] for m in messages]
+        i = bisect_right(ids, row["id"])
+        if (i and ids[i - 1] == row["id"]) or (i == 0 and len(messages) == self.size):
+            return
+        if len(messages) == self.size:
+            messages.popleft()
+            i -= 1
+        messages.insert(i, row)
+
+    def add(self, row):
+        with self._lock:
+            if self._messages is not None:  # otherwise the first read loads it
+                self._insert(row)
+
+    def messages(self, since=None):
+        """
+        Recent messages, oldest first; with since, only those with a larger id.
+        Returns None when since is older than the buffer (read the database).
+        """
+        with self._lock:
+            if self._messages is None:
+                self._load()
+            elif time.monotonic() - self._checked_at >= self.refresh:
+                self._catch_up()
+            messages = list(self._messages)
+
+        if since is None:
+            return messages
+        if len(messages) == self.size and since < messages[0]["id"] - 1:
+            return None
+        ids = [m["id"] for m in messages]
+        return messages[bisect_right(ids, since):]
+
+    def clear(self):
+        with self._lock:
+            self._messages = None
+
+
+recent_messages = RecentMessages()
+
+
+def community_messages(since=None):
+    """Messages newer than since (all recent ones without it), oldest first."""
+    messages = recent_messages.messages(since)
+    if messages is None:
+        messages = _serialize(CommunityMessage.objects.filter(id__gt=since).order_by("id")[:RECENT_MESSAGES])
+    return messages
+
+
+def message_added(msg):
+    """Add a new message to the buffer once its transaction commits."""
+    row = CommunityMessageSerializer(msg).data
+    transaction.on_commit(lambda: recent_messages.add(row))
+
+
+@receiver(post_delete, sender=CommunityMessage)
+def _message_deleted(sender, **kwargs):
+    transaction.on_commit(recent_messages.clear)
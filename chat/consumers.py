@@ -0,0 +1,117 @@
+"""
+WebSocket endpoint for realtime chat, ws(s)://<host>/ws/chat/?token=<JWT access token>.
+
+Routed by smartagri_backend.asgi. After the handshake the server pushes
+the events described in chat.events as JSON text frames: new messages of
+the user's conversations, read receipts, and community messages for
+farmers. Clients may send {"type": "ping"} and get {"type": "pong"}.
+
+Writes still go through the REST endpoints; this socket only replaces
+polling messages/<user_id>/ and conversations/. Delivery is best effort:
+a client that falls behind loses its oldest buffered events, and nothing
+is replayed across a disconnect, so on every (re)connect clients resync
+with messages/<user_id>/?after=<last id they have> and conversations/.
+
+With the default in-memory channel layer events only reach sockets of
+the process that handled the write, so serve the site from a single ASGI
+worker (see smartagri_backend.asgi) or configure a cross-process layer.
+"""
+
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import SyncToAsync
+from django.db import close_old_connections
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from .layers import COMMUNITY_GROUP, get_channel_layer, user_group
+from .views import is_farmer
+
+# close codes in the 4000-4999 application range
+CLOSE_UNAUTHORIZED = 4401
+
+
+class DatabaseSyncToAsync(SyncToAsync):
+    """
+    SyncToAsync that closes stale and expired connections around the call,
+    as the request cycle does for views (channels.db.database_sync_to_async).
+    """
+
+    def thread_handler(self, loop, *args, **kwargs):
+        close_old_connections()
+        try:
+            return super().thread_handler(loop, *args, **kwargs)
+        finally:
+            close_old_connections()
+
+
+database_sync_to_async = DatabaseSyncToAsync
+
+
+def _authenticate(raw_token):
+    auth = JWTAuthentication()
+    try:
+        user = auth.get_user(auth.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None, False
+    return user, is_farmer(user)
+
+
+class ChatConsumer:
+    """A plain ASGI application for the websocket scope."""
+
+    async def __call__(self, scope, receive, send):
+        message = await receive()
+        if message["type"] != "websocket.connect":
+            return
+
+        token = parse_qs(scope.get("query_string", b"").decode()).get("token", [None])[0]
+        user, is_farmer = await database_sync_to_async(_authenticate)(token) if token else (None, False)
+        if user is None:
+            await send({"type": "websocket.close", "code": CLOSE_UNAUTHORIZED})
+            return
+
+        layer = get_channel_layer()
+        channel = layer.new_channel()
+        groups = [user_group(user.id)] + ([COMMUNITY_GROUP] if is_farmer else [])
+        for group in groups:
+            layer.group_add(group, channel)
+
+        await send({"type": "websocket.accept"})
+        try:
+            await self._run(receive, send, channel)
+        finally:
+            for group in groups:
+                layer.group_discard(group, channel)
+
+    async def _run(self, receive, send, channel):
+        client = asyncio.ensure_future(receive())
+        event = asyncio.ensure_future(channel.receive())
+        try:
+            while True:
+                done, _ = await asyncio.wait({client, event}, return_when=asyncio.FIRST_COMPLETED)
+
+                if event in done:
+                    await send({"type": "websocket.send", "text": json.dumps(event.result(), cls=JSONEncoder)})
+                    event = asyncio.ensure_future(channel.receive())
+
+                if client in done:
+                    message = client.result()
+                    if message["type"] == "websocket.disconnect":
+                        return
+                    if self._is_ping(message):
+                        await send({"type": "websocket.send", "text": json.dumps({"type": "pong"})})
+                    client = asyncio.ensure_future(receive())
+        finally:
+            client.cancel()
+            event.cancel()
+
+    @staticmethod
+    def _is_ping(message):
+        try:
+            return json.loads(message.get("text") or "{}").get("type") == "ping"
+        except (ValueError, AttributeError):
+            return False
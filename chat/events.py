@@ -0,0 +1,36 @@
+"""
+Realtime chat events, sent to the channel layer after the write commits.
+
+    chat.message       {"message": <ChatSerializer>}          sender + receiver
+    chat.read          {"reader_id", "counterpart_id", "count"} both sides
+    community.message  {"message": <CommunityMessageSerializer>} community group
+"""
+
+from django.db import transaction
+
+from .layers import COMMUNITY_GROUP, get_channel_layer, user_group
+from .serializers import ChatSerializer, CommunityMessageSerializer
+
+
+def _send_on_commit(groups, event):
+    def send():
+        layer = get_channel_layer()
+        for group in groups:
+            layer.group_send(group, event)
+
+    transaction.on_commit(send)
+
+
+def message_sent(chat):
+    event = {"type": "chat.message", "message": ChatSerializer(chat).data}
+    _send_on_commit({user_group(chat.sender_id), user_group(chat.receiver_id)}, event)
+
+
+def conversation_read(reader_id, counterpart_id, count):
+    event = {"type": "chat.read", "reader_id": reader_id, "counterpart_id": counterpart_id, "count": count}
+    _send_on_commit({user_group(reader_id), user_group(counterpart_id)}, event)
+
+
+def community_message_sent(msg):
+    event = {"type": "community.message", "message": CommunityMessageSerializer(msg).data}
+    _send_on_commit([COMMUNITY_GROUP], event)
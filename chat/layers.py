@@ -0,0 +1,127 @@
+"""
+Channel layer for realtime chat delivery.
+
+A layer routes events to named groups; each open WebSocket
+(chat.consumers.ChatConsumer) subscribes to its user's group and, for
+farmers, to the community group. ``group_send`` is thread safe, so the
+sync views can publish after commit.
+
+``InMemoryChannelLayer`` serves a single process and the tests: events
+sent in one process never reach sockets held by another, so with it the
+whole site must run in one ASGI worker (see smartagri_backend.asgi). With
+several processes, configure a cross-process layer in
+``settings.CHAT_CHANNEL_LAYER["BACKEND"]`` with the same three methods.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+
+LAYER_DEFAULTS = {
+    "BACKEND": "chat.layers.InMemoryChannelLayer",
+    "OPTIONS": {},
+}
+
+COMMUNITY_GROUP = "community"
+
+
+def user_group(user_id):
+    return f"user.{user_id}"
+
+
+class Channel:
+    """The receiving end of one connection: buffered events and a waiter."""
+
+    def __init__(self, loop, capacity):
+        self.loop = loop
+        self.events = deque(maxlen=capacity)  # a stalled client loses the oldest
+        self._waiter = None
+
+    async def receive(self):
+        while not self.events:
+            self._waiter = self.loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self.events.popleft()
+
+    def _deliver(self, event):
+        self.events.append(event)
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+
+class InMemoryChannelLayer:
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self._groups = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def new_channel(self):
+        """A channel on the running event loop; call from a coroutine."""
+        return Channel(asyncio.get_running_loop(), self.capacity)
+
+    def group_add(self, group, channel):
+        with self._lock:
+            self._groups[group].add(channel)
+
+    def group_discard(self, group, channel):
+        with self._lock:
+            members = self._groups.get(group)
+            if members is not None:
+                members.discard(channel)
+                if not members:
+                    del self._groups[group]
+
+    def group_send(self, group, event):
+        with self._lock:
+            members = list(self._groups.get(group, ()))
+        for channel in members:
+            try:
+                channel.loop.call_soon_threadsafe(channel._deliver, event)
+            except RuntimeError:  # event loop closed under us
+                self.group_discard(group, channel)
+
+    def group_size(self, group):
+        with self._lock:
+            return len(self._groups.get(group, ()))
+
+
+def get_layer_config():
+    config = dict(LAYER_DEFAULTS)
+    config.update(getattr(settings, "CHAT_CHANNEL_LAYER", {}) or {})
+    return config
+
+
+_layer = None
+_layer_lock = threading.Lock()
+
+
+def get_channel_layer():
+    """The configured layer (one shared instance per process)."""
+    global _layer
+    if _layer is None:
+        with _layer_lock:
+            if _layer is None:
+                config = get_layer_config()
+                _layer = import_string(config["BACKEND"])(**config["OPTIONS"])
+    return _layer
+
+
+def reset_channel_layer():
+    global _layer
+    with _layer_lock:
+        _layer = None
+
+
+def _on_setting_changed(setting, **kwargs):
+    if setting == "CHAT_CHANNEL_LAYER":
+        reset_channel_layer()
+
+
+setting_changed.connect(_on_setting_changed)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+import time
+
+from chat.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the conversation summaries from all chat messages. Safe to re-run; "
+        "the table is replaced in one transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Summary rows per INSERT")
+
+    def handle(self, *args, **opts):
+        started = time.perf_counter()
+        written = rebuild_summaries(batch_size=opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. Conversation summaries: {written} in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+import time
+
+from chat.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = (
+        "Add every chat message to the search token index (messages sent before it "
+        "existed). Safe to re-run; a no-op with the MySQL FULLTEXT backend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Messages per batch")
+
+    def handle(self, *args, **opts):
+        started = time.perf_counter()
+        backend = get_search_backend()
+        read = backend.rebuild(batch_size=opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {type(backend).__name__}: {read} messages indexed in {time.perf_counter() - started:.2f}s"
+        ))
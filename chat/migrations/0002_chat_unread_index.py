@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(fields=['receiver', 'sender', 'is_read'], name='chat_chat_receive_170d9b_idx'),
+        ),
+    ]
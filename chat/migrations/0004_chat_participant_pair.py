@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:17
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_conversationsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='participant_high',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Greatest('sender', 'receiver'), output_field=models.IntegerField()),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='participant_low',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Least('sender', 'receiver'), output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(fields=['participant_low', 'participant_high', 'id'], name='chat_chat_partici_3b3c2c_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+FULLTEXT_INDEX = "chat_chat_content_fulltext"
+
+
+def add_fulltext_index(apps, schema_editor):
+    """MySQL only: the fulltext search backend reads Chat.content through this index."""
+    if schema_editor.connection.vendor != "mysql":
+        return
+    table = schema_editor.quote_name(apps.get_model("chat", "Chat")._meta.db_table)
+    schema_editor.execute(f"CREATE FULLTEXT INDEX {schema_editor.quote_name(FULLTEXT_INDEX)} ON {table} (content)")
+
+
+def remove_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    table = schema_editor.quote_name(apps.get_model("chat", "Chat")._meta.db_table)
+    schema_editor.execute(f"DROP INDEX {schema_editor.quote_name(FULLTEXT_INDEX)} ON {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_chat_participant_pair'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='chat.chat')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'token', 'chat'), name='uniq_chat_search_token')],
+            },
+        ),
+        migrations.RunPython(add_fulltext_index, remove_fulltext_index),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Greatest, Least
 from django.contrib.auth.models import User
 
 class Chat(models.Model):
@@ -8,6 +9,23 @@ class Chat(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    # the unordered participant pair, computed by the database, so one
+    # index range covers both directions of a conversation
+    participant_low = models.GeneratedField(
+        expression=Least("sender", "receiver"), output_field=models.IntegerField(), db_persist=True
+    )
+    participant_high = models.GeneratedField(
+        expression=Greatest("sender", "receiver"), output_field=models.IntegerField(), db_persist=True
+    )
+
+    class Meta:
+        indexes = [
+            # unread count per counterpart (conversation list, mark-read)
+            models.Index(fields=["receiver", "sender", "is_read"]),
+            # message history: keyset pages of one conversation (ids follow timestamp)
+            models.Index(fields=["participant_low", "participant_high", "id"]),
+        ]
+
     def __str__(self):
         return f"From {self.sender.username} to {self.receiver.username} at {self.timestamp}"
 
@@ -21,4 +39,50 @@ class CommunityMessage(models.Model):
         ordering = ["timestamp"]
 
     def __str__(self):
-        return f"[Community] {self.sender.username}: {self.content[:30]}"
\ No newline at end of file
+        return f"[Community] {self.sender.username}: {self.content[:30]}"
+
+class ConversationSummary(models.Model):
+    """
+    One row per (user, counterpart) with the latest message and the user's
+    unread count, kept up to date on write (chat.summaries) so the
+    conversation list never aggregates over Chat.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="conversation_summaries")
+    counterpart = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    last_message = models.ForeignKey(Chat, on_delete=models.SET_NULL, null=True, related_name="+")
+    last_content = models.TextField(blank=True, default="")
+    last_timestamp = models.DateTimeField()
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "counterpart"], name="uniq_conversation_summary"),
+        ]
+        indexes = [
+            # conversation list: one range read ordered by last activity
+            models.Index(fields=["user", "-last_timestamp"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} <-> {self.counterpart_id} ({self.unread_count} unread)"
+
+
+class ChatSearchToken(models.Model):
+    """
+    Inverted index over Chat.content for the token search backend
+    (chat.search): one row per (participant, token, message), so a search
+    is a range read of the user's own postings.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    token = models.CharField(max_length=64)
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "token", "chat"], name="uniq_chat_search_token"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.token} -> {self.chat_id}"
@@ -0,0 +1,171 @@
+"""
+Full-text search over a user's chat messages.
+
+Two backends, picked by ``settings.CHAT_SEARCH["BACKEND"]`` (None chooses
+by database):
+
+- ``FullTextSearch`` (MySQL): MATCH ... AGAINST on the FULLTEXT index of
+  chat_chat.content added by migration 0005, ranked by MySQL relevance.
+- ``TokenSearch`` (everything else): the ChatSearchToken inverted index,
+  written on send in the message's transaction. Postings are stored per
+  participant, so a search reads only the requesting user's range of the
+  (user, token, chat) index; results rank by the number of query terms
+  matched, then newest first. The last query term also matches as a
+  prefix, for search-as-you-type.
+
+Messages written before the token index existed are added with
+``manage.py rebuild_chat_search_index``.
+"""
+
+import re
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Chat, ChatSearchToken
+
+SEARCH_DEFAULTS = {
+    "BACKEND": None,
+    "OPTIONS": {},
+}
+
+MIN_TOKEN_LENGTH = 2
+MAX_TOKEN_LENGTH = 64  # ChatSearchToken.token max_length
+MAX_TOKENS_PER_MESSAGE = 100
+MAX_QUERY_TERMS = 8
+INDEX_BATCH_SIZE = 1000
+
+# whitespace and ASCII punctuation; any other script stays inside tokens
+_SEPARATORS = re.compile(r"[\s!\"#$%&'()*+,\-./:;<=>?@\[\\\]^_`{|}~]+")
+
+
+def tokenize(text):
+    """Distinct lowercase tokens of text, in order of first appearance."""
+    tokens = dict.fromkeys(
+        t[:MAX_TOKEN_LENGTH] for t in _SEPARATORS.split(text.lower()) if len(t) >= MIN_TOKEN_LENGTH
+    )
+    return list(tokens)[:MAX_TOKENS_PER_MESSAGE]
+
+
+class TokenSearch:
+    def index(self, chat):
+        ChatSearchToken.objects.bulk_create(self._postings(chat), ignore_conflicts=True)
+
+    def _postings(self, chat):
+        tokens = tokenize(chat.content)
+        participants = {chat.sender_id, chat.receiver_id}
+        return [ChatSearchToken(user_id=u, token=t, chat_id=chat.id) for u in participants for t in tokens]
+
+    def search(self, user_id, query, limit):
+        terms = tokenize(query)[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        *exact, last = terms
+        match = Q(token__startswith=last)
+        if exact:
+            match |= Q(token__in=exact)
+
+        rows = (
+            ChatSearchToken.objects.filter(match, user_id=user_id)
+            .values("chat_id")
+            .annotate(score=Count("token", distinct=True))
+            .order_by("-score", "-chat_id")
+            .values_list("chat_id", "score")[:limit]
+        )
+        return list(rows)
+
+    def rebuild(self, batch_size=INDEX_BATCH_SIZE):
+        """Index every message (existing postings are kept). Returns messages read."""
+        last_id = 0
+        read = 0
+        while True:
+            chats = list(
+                Chat.objects.filter(id__gt=last_id).order_by("id").only("id", "sender_id", "receiver_id", "content")
+                [:batch_size]
+            )
+            if not chats:
+                return read
+            ChatSearchToken.objects.bulk_create(
+                [p for chat in chats for p in self._postings(chat)], batch_size=batch_size, ignore_conflicts=True
+            )
+            read += len(chats)
+            last_id = chats[-1].id
+
+
+class FullTextSearch:
+    def index(self, chat):
+        pass  # maintained by MySQL
+
+    def search(self, user_id, query, limit):
+        terms = tokenize(query)[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        score = RawSQL(
+            f"MATCH ({connection.ops.quote_name(Chat._meta.db_table)}.content) AGAINST (%s IN NATURAL LANGUAGE MODE)",
+            (" ".join(terms),),
+        )
+        rows = (
+            Chat.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id))
+            .annotate(score=score)
+            .filter(score__gt=0)
+            .order_by("-score", "-id")
+            .values_list("id", "score")[:limit]
+        )
+        return list(rows)
+
+    def rebuild(self, batch_size=INDEX_BATCH_SIZE):
+        return 0
+
+
+def get_search_config():
+    config = dict(SEARCH_DEFAULTS)
+    config.update(getattr(settings, "CHAT_SEARCH", {}) or {})
+    return config
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """The configured backend (one shared instance per process)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = get_search_config()
+                backend = config["BACKEND"] or (
+                    "chat.search.FullTextSearch" if connection.vendor == "mysql" else "chat.search.TokenSearch"
+                )
+                _backend = import_string(backend)(**config["OPTIONS"])
+    return _backend
+
+
+def reset_search_backend():
+    global _backend
+    with _backend_lock:
+        _backend = None
+
+
+def _on_setting_changed(setting, **kwargs):
+    if setting == "CHAT_SEARCH":
+        reset_search_backend()
+
+
+setting_changed.connect(_on_setting_changed)
+
+
+def index_message(chat):
+    get_search_backend().index(chat)
+
+
+def search_messages(user_id, query, limit):
+    """The user's messages matching query, best match first, as (chat, score) pairs."""
+    ranked = get_search_backend().search(user_id, query, limit)
+    chats = Chat.objects.select_related("sender", "receiver").in_bulk([chat_id for chat_id, _ in ranked])
+    return [(chats[chat_id], score) for chat_id, score in ranked if chat_id in chats]
@@ -0,0 +1,117 @@
+"""
+Maintenance of ConversationSummary rows.
+
+Every write to Chat goes through ``record_message`` / ``mark_conversation_read``
+inside the same transaction, so the summaries always agree with the
+messages; the realtime events (chat.events) go out after commit.
+``rebuild_summaries`` recomputes them from Chat (backfill).
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Max, Q, Value, When
+
+from . import events, search
+from .models import Chat, ConversationSummary
+
+
+def _apply(user_id, counterpart_id, chat, unread_delta):
+    # a concurrent, older message must not replace the latest one
+    newer = Q(last_message_id__isnull=True) | Q(last_message_id__lt=chat.id)
+
+    def latest(value, field):
+        return Case(
+            When(newer, then=Value(value)),
+            default=F(field),
+            output_field=ConversationSummary._meta.get_field(field),
+        )
+
+    def update():
+        return ConversationSummary.objects.filter(user_id=user_id, counterpart_id=counterpart_id).update(
+            last_message_id=latest(chat.id, "last_message_id"),
+            last_content=latest(chat.content, "last_content"),
+            last_timestamp=latest(chat.timestamp, "last_timestamp"),
+            unread_count=F("unread_count") + unread_delta,
+        )
+
+    if update():
+        return
+    try:
+        with transaction.atomic():
+            ConversationSummary.objects.create(
+                user_id=user_id,
+                counterpart_id=counterpart_id,
+                last_message=chat,
+                last_content=chat.content,
+                last_timestamp=chat.timestamp,
+                unread_count=unread_delta,
+            )
+    except IntegrityError:
+        update()  # created concurrently
+
+
+def record_message(chat):
+    """Update both participants' summaries for a new message."""
+    _apply(chat.sender_id, chat.receiver_id, chat, 0)
+    if chat.receiver_id != chat.sender_id:
+        _apply(chat.receiver_id, chat.sender_id, chat, 1)
+
+
+def send_message(sender, receiver_id, content):
+    with transaction.atomic():
+        chat = Chat.objects.create(sender=sender, receiver_id=receiver_id, content=content)
+        record_message(chat)
+        search.index_message(chat)
+        events.message_sent(chat)
+    return chat
+
+
+def mark_conversation_read(user, counterpart_id):
+    with transaction.atomic():
+        updated = Chat.objects.filter(sender_id=counterpart_id, receiver=user, is_read=False).update(is_read=True)
+        ConversationSummary.objects.filter(user=user, counterpart_id=counterpart_id).update(unread_count=0)
+        if updated:
+            events.conversation_read(user.id, counterpart_id, updated)
+    return updated
+
+
+def rebuild_summaries(batch_size=1000):
+    """
+    Recompute every summary from Chat with two grouped queries plus one
+    lookup per batch of latest messages. Returns the number of rows written.
+    """
+    latest = {}
+    for sender_id, receiver_id, last_id in (
+        Chat.objects.values("sender_id", "receiver_id").annotate(last_id=Max("id"))
+        .values_list("sender_id", "receiver_id", "last_id").iterator()
+    ):
+        for key in ((sender_id, receiver_id), (receiver_id, sender_id)):
+            latest[key] = max(latest.get(key, 0), last_id)
+
+    unread = {
+        (receiver_id, sender_id): n
+        for receiver_id, sender_id, n in (
+            Chat.objects.filter(is_read=False).values("receiver_id", "sender_id").annotate(n=Count("id"))
+            .values_list("receiver_id", "sender_id", "n").iterator()
+        )
+    }
+
+    written = 0
+    keys = sorted(latest)
+    with transaction.atomic():
+        ConversationSummary.objects.all().delete()
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            messages = Chat.objects.in_bulk({latest[key] for key in batch})
+            ConversationSummary.objects.bulk_create([
+                ConversationSummary(
+                    user_id=user_id,
+                    counterpart_id=counterpart_id,
+                    last_message_id=latest[(user_id, counterpart_id)],
+                    last_content=messages[latest[(user_id, counterpart_id)]].content,
+                    last_timestamp=messages[latest[(user_id, counterpart_id)]].timestamp,
+                    unread_count=unread.get((user_id, counterpart_id), 0),
+                )
+                for user_id, counterpart_id in batch
+            ])
+            written += len(batch)
+    return written
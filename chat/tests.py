@@ -1,3 +1,365 @@
+import json
+from io import StringIO
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import BuyerDetails, FarmerDetails
+from .community import RecentMessages, recent_messages
+from .consumers import CLOSE_UNAUTHORIZED, ChatConsumer
+from .layers import COMMUNITY_GROUP, get_channel_layer, reset_channel_layer, user_group
+from .models import Chat, ChatSearchToken, CommunityMessage, ConversationSummary
+from .search import TokenSearch, reset_search_backend, tokenize
+from .summaries import record_message
+
+
+class ConversationListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="farmer")
+        FarmerDetails.objects.create(user=self.user)
+        self.buyer = User.objects.create_user(username="buyer")
+        BuyerDetails.objects.create(user=self.buyer, profile_image="https://img/buyer.png")
+        self.farmer = User.objects.create_user(username="other-farmer")
+        FarmerDetails.objects.create(user=self.farmer, profile_image="https://img/farmer.png")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _history(self, messages_per_side):
+        chats = []
+        for i in range(messages_per_side):
+            for other in (self.buyer, self.farmer):
+                chats.append(Chat(sender=other, receiver=self.user, content=f"from {other.username} {i}"))
+                chats.append(Chat(sender=self.user, receiver=other, content=f"to {other.username} {i}", is_read=True))
+        Chat.objects.bulk_create(chats)
+        call_command("backfill_conversation_summaries", stdout=StringIO())
+
+    def test_latest_message_and_unread_count_per_counterpart(self):
+        self._history(3)
+        self.client.force_authenticate(user=self.buyer)
+        self.client.post("/api/chat/send-message/", {"receiver_id": self.user.id, "content": "latest"})
+        self.client.force_authenticate(user=self.user)
+        self.client.post(f"/api/chat/messages/{self.farmer.id}/mark-read/")
+
+        data = self.client.get("/api/chat/conversations/").data
+
+        self.assertEqual(data, [
+            {"user_id": self.buyer.id, "username": "buyer", "last_message": "latest",
+             "timestamp": data[0]["timestamp"], "profile_image": "https://img/buyer.png", "unread_count": 4},
+            {"user_id": self.farmer.id, "username": "other-farmer", "last_message": "to other-farmer 2",
+             "timestamp": data[1]["timestamp"], "profile_image": "https://img/farmer.png", "unread_count": 0},
+        ])
+
+    def test_query_count_does_not_grow_with_history(self):
+        self._history(2)
+        with self.assertNumQueries(1):
+            self.client.get("/api/chat/conversations/")
+
+        self._history(50)
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/chat/conversations/")
+        self.assertEqual(len(response.data), 2)
+
+
+class ConversationSummaryTests(TestCase):
+    def setUp(self):
+        self.a = User.objects.create_user(username="a")
+        self.b = User.objects.create_user(username="b")
+        self.client = APIClient()
+
+    def _send(self, sender, receiver, content):
+        self.client.force_authenticate(user=sender)
+        return self.client.post("/api/chat/send-message/", {"receiver_id": receiver.id, "content": content})
+
+    def _summary(self, user, counterpart):
+        s = ConversationSummary.objects.get(user=user, counterpart=counterpart)
+        return s.last_content, s.unread_count
+
+    def test_send_and_mark_read_keep_both_sides_current(self):
+        self._send(self.a, self.b, "hi")
+        self._send(self.a, self.b, "there")
+        self._send(self.b, self.a, "hello")
+
+        self.assertEqual(self._summary(self.a, self.b), ("hello", 1))
+        self.assertEqual(self._summary(self.b, self.a), ("hello", 2))
+
+        self.client.force_authenticate(user=self.b)
+        self.client.post(f"/api/chat/messages/{self.a.id}/mark-read/")
+        self.assertEqual(self._summary(self.b, self.a), ("hello", 0))
+        self.assertFalse(Chat.objects.filter(receiver=self.b, is_read=False).exists())
+
+    def test_message_to_self_is_never_unread(self):
+        self._send(self.a, self.a, "note")  # form encoded: receiver_id is a string
+        self.assertEqual(self._summary(self.a, self.a), ("note", 0))
+        self.client.post("/api/chat/send-message/", {"receiver_id": self.a.id, "content": "json"}, format="json")
+        self.assertEqual(self._summary(self.a, self.a), ("json", 0))
+        response = self.client.post("/api/chat/send-message/", {"receiver_id": "abc", "content": "x"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_backfill_matches_maintained_summaries(self):
+        c = User.objects.create_user(username="c")
+        self._send(self.a, self.b, "1")
+        self._send(self.b, self.a, "2")
+        self._send(c, self.a, "3")
+        self.client.force_authenticate(user=self.a)
+        self.client.post(f"/api/chat/messages/{self.b.id}/mark-read/")
+
+        fields = ("user_id", "counterpart_id", "last_message_id", "last_content", "unread_count")
+        maintained = sorted(ConversationSummary.objects.values_list(*fields))
+        out = StringIO()
+        call_command("backfill_conversation_summaries", "--batch-size", "2", stdout=out)
+
+        self.assertIn("Conversation summaries: 4", out.getvalue())
+        self.assertEqual(sorted(ConversationSummary.objects.values_list(*fields)), maintained)
+
+    def test_older_message_does_not_replace_latest(self):
+        old = Chat.objects.create(sender=self.a, receiver=self.b, content="old")
+        new = Chat.objects.create(sender=self.a, receiver=self.b, content="new")
+        record_message(new)
+        record_message(old)
+        self.assertEqual(self._summary(self.b, self.a), ("new", 2))
+
+
+class MessageHistoryTests(TestCase):
+    def setUp(self):
+        self.a = User.objects.create_user(username="a")
+        self.b = User.objects.create_user(username="b")
+        other = User.objects.create_user(username="c")
+        chats = []
+        for i in range(7):
+            chats.append(Chat(sender=self.a if i % 2 else self.b, receiver=self.b if i % 2 else self.a, content=str(i)))
+            chats.append(Chat(sender=other, receiver=self.a, content="elsewhere"))
+        Chat.objects.bulk_create(chats)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.a)
+
+    def _get(self, query):
+        return self.client.get(f"/api/chat/messages/{self.b.id}/?{query}")
+
+    def _contents(self, response):
+        return [m["content"] for m in response.data]
+
+    def test_latest_page_then_older_pages(self):
+        with self.assertNumQueries(1):
+            first = self._get("limit=3")
+        self.assertEqual(self._contents(first), ["4", "5", "6"])
+        self.assertEqual(first.data[0]["sender_username"], "b")
+
+        second = self._get(f"limit=3&before={first['X-Next-Before']}")
+        third = self._get(f"limit=3&before={second['X-Next-Before']}")
+        self.assertEqual(self._contents(second), ["1", "2", "3"])
+        self.assertEqual(self._contents(third), ["0"])
+        self.assertFalse(third.has_header("X-Next-Before"))
+
+    def test_after_fetches_newer_messages(self):
+        ids = list(Chat.objects.filter(participant_low=self.a.id).exclude(content="elsewhere")
+                   .order_by("id").values_list("id", flat=True))
+        response = self._get(f"limit=4&after={ids[1]}")
+        self.assertEqual(self._contents(response), ["2", "3", "4", "5"])
+        self.assertEqual(response["X-Next-After"], str(ids[5]))
+        response = self._get(f"after={ids[5]}")
+        self.assertEqual(self._contents(response), ["6"])
+        self.assertFalse(response.has_header("X-Next-After"))
+
+    def test_participant_pair_is_unordered(self):
+        chat = Chat.objects.create(sender=self.b, receiver=self.a, content="x")
+        chat.refresh_from_db()
+        self.assertEqual((chat.participant_low, chat.participant_high), (self.a.id, self.b.id))
+
+
+class ChatSocketTests(TestCase):
+    def setUp(self):
+        self.farmer = User.objects.create_user(username="farmer")
+        FarmerDetails.objects.create(user=self.farmer)
+        self.buyer = User.objects.create_user(username="buyer")
+        BuyerDetails.objects.create(user=self.buyer)
+        reset_channel_layer()
+        self.layer = get_channel_layer()
+
+    async def _connect(self, user):
+        token = str(RefreshToken.for_user(user).access_token) if user else "bad"
+        socket = ApplicationCommunicator(ChatConsumer(), {
+            "type": "websocket", "path": "/ws/chat/", "query_string": f"token={token}".encode(),
+        })
+        await socket.send_input({"type": "websocket.connect"})
+        return socket, await socket.receive_output(timeout=5)
+
+    async def _event(self, socket):
+        message = await socket.receive_output(timeout=5)
+        return json.loads(message["text"])
+
+    def _post(self, user, url, data=None):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.post(url, data or {}, format="json")
+
+    async def _close(self, socket):
+        await socket.send_input({"type": "websocket.disconnect", "code": 1000})
+        await socket.wait(timeout=5)
+
+    async def test_message_and_read_receipt_reach_both_sides(self):
+        farmer, accepted = await self._connect(self.farmer)
+        buyer, _ = await self._connect(self.buyer)
+        self.assertEqual(accepted, {"type": "websocket.accept"})
+
+        await sync_to_async(self._post)(self.buyer, "/api/chat/send-message/", {"receiver_id": self.farmer.id, "content": "hi"})
+        for socket in (farmer, buyer):
+            event = await self._event(socket)
+            self.assertEqual(event["type"], "chat.message")
+            self.assertEqual(event["message"]["content"], "hi")
+
+        await sync_to_async(self._post)(self.farmer, f"/api/chat/messages/{self.buyer.id}/mark-read/")
+        self.assertEqual(await self._event(buyer), {
+            "type": "chat.read", "reader_id": self.farmer.id, "counterpart_id": self.buyer.id, "count": 1,
+        })
+
+        await self._close(farmer)
+        await self._close(buyer)
+        self.assertEqual(self.layer.group_size(user_group(self.farmer.id)), 0)
+
+    async def test_community_messages_reach_farmers_only(self):
+        farmer, _ = await self._connect(self.farmer)
+        buyer, _ = await self._connect(self.buyer)
+        self.assertEqual(self.layer.group_size(COMMUNITY_GROUP), 1)
+
+        await sync_to_async(self._post)(self.farmer, "/api/chat/community/send/", {"content": "rain today"})
+        event = await self._event(farmer)
+        self.assertEqual((event["type"], event["message"]["content"]), ("community.message", "rain today"))
+        self.assertTrue(await buyer.receive_nothing())
+
+        await self._close(farmer)
+        await self._close(buyer)
+
+    async def test_ping_gets_pong(self):
+        socket, _ = await self._connect(self.buyer)
+        await socket.send_input({"type": "websocket.receive", "text": '{"type": "ping"}'})
+        self.assertEqual(await self._event(socket), {"type": "pong"})
+        await self._close(socket)
+
+    async def test_invalid_token_is_rejected(self):
+        socket, message = await self._connect(None)
+        self.assertEqual(message, {"type": "websocket.close", "code": CLOSE_UNAUTHORIZED})
+        await socket.wait(timeout=5)
+
+
+class CommunityMessageBufferTests(TestCase):
+    def setUp(self):
+        self.farmer = User.objects.create_user(username="farmer")
+        FarmerDetails.objects.create(user=self.farmer)
+        CommunityMessage.objects.bulk_create(
+            CommunityMessage(sender=self.farmer, content=str(i)) for i in range(305)
+        )
+        self.ids = list(CommunityMessage.objects.order_by("id").values_list("id", flat=True))
+        recent_messages.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.farmer)
+
+    def test_lists_latest_messages_from_memory(self):
+        with self.assertNumQueries(1):
+            data = self.client.get("/api/chat/community/messages/").data
+        self.assertEqual(len(data), 300)
+        self.assertEqual((data[0]["content"], data[-1]["content"]), ("5", "304"))
+        self.assertEqual(data[0]["sender_username"], "farmer")
+        with self.assertNumQueries(0):
+            self.client.get("/api/chat/community/messages/")
+
+    def test_since_returns_only_new_messages(self):
+        self.client.get("/api/chat/community/messages/")
+        with self.captureOnCommitCallbacks(execute=True):
+            sent = self.client.post("/api/chat/community/send/", {"content": "new"}, format="json").data
+        with self.assertNumQueries(0):
+            data = self.client.get(f"/api/chat/community/messages/?since={self.ids[-1]}").data
+        self.assertEqual([m["id"] for m in data], [sent["id"]])
+        self.assertEqual(self.client.get(f"/api/chat/community/messages/?since={sent['id']}").data, [])
+
+    def test_cursor_older_than_buffer_reads_database(self):
+        data = self.client.get(f"/api/chat/community/messages/?since={self.ids[1]}").data
+        self.assertEqual([m["content"] for m in data[:2]], ["2", "3"])
+        self.assertEqual(self.client.get("/api/chat/community/messages/?since=x").status_code, 400)
+
+    def test_buffer_keeps_id_order_and_picks_up_other_writers(self):
+        buffer = RecentMessages(size=3, refresh=0)
+        self.assertEqual([m["content"] for m in buffer.messages()], ["302", "303", "304"])
+        buffer.add({"id": self.ids[-1], "content": "dup"})
+        buffer.add({"id": self.ids[-1] + 2, "content": "b"})
+        buffer.add({"id": self.ids[-1] + 1, "content": "a"})
+        buffer.add({"id": self.ids[0], "content": "too old"})
+        self.assertEqual([m["id"] for m in buffer._messages], [self.ids[-1], self.ids[-1] + 1, self.ids[-1] + 2])
+
+        buffer.clear()
+        buffer.messages()
+        CommunityMessage.objects.create(sender=self.farmer, content="elsewhere")
+        self.assertEqual(buffer.messages(since=self.ids[-1])[0]["content"], "elsewhere")
+
+    def test_catch_up_finds_late_commits_and_reads_whole_backlog(self):
+        buffer = RecentMessages(size=3, refresh=0)
+        buffer.messages()
+        # committed late by another process, below the newest buffered id
+        CommunityMessage.objects.filter(id=self.ids[-2]).delete()
+        buffer._messages.remove(next(m for m in buffer._messages if m["id"] == self.ids[-2]))
+        CommunityMessage.objects.create(id=self.ids[-2], sender=self.farmer, content="late")
+        self.assertEqual([m["content"] for m in buffer.messages()], ["302", "late", "304"])
+
+        CommunityMessage.objects.bulk_create(CommunityMessage(sender=self.farmer, content=f"n{i}") for i in range(5))
+        self.assertEqual([m["content"] for m in buffer.messages()], ["n2", "n3", "n4"])
+
+
+class MessageSearchTests(TestCase):
+    def setUp(self):
+        self.a = User.objects.create_user(username="a")
+        self.b = User.objects.create_user(username="b")
+        self.c = User.objects.create_user(username="c")
+        reset_search_backend()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.a)
+        for sender, receiver, content in [
+            (self.b, self.a, "Selling rice, 50 kg at Rs. 120"),
+            (self.a, self.b, "Is the rice organic?"),
+            (self.b, self.a, "Carrots available tomorrow"),
+            (self.c, self.b, "Cheap rice offer"),  # not a's conversation
+            (self.c, self.a, "rice price 120 final"),
+        ]:
+            self.client.force_authenticate(user=sender)
+            self.client.post("/api/chat/send-message/", {"receiver_id": receiver.id, "content": content}, format="json")
+        self.client.force_authenticate(user=self.a)
+
+    def _search(self, q):
+        return self.client.get("/api/chat/search/", {"q": q}).data["results"]
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Rice, rice & RICE at Rs.120 - a"), ["rice", "at", "rs", "120"])
+        self.assertEqual(tokenize("අල 50kg"), ["අල", "50kg"])
+
+    def test_ranked_results_within_own_conversations(self):
+        results = self._search("rice 120")
+        self.assertEqual([r["content"] for r in results], [
+            "rice price 120 final", "Selling rice, 50 kg at Rs. 120", "Is the rice organic?",
+        ])
+        self.assertEqual([r["score"] for r in results], [2, 2, 1])
+        self.assertEqual(results[0]["sender_username"], "c")
+
+    def test_last_term_matches_prefix(self):
+        self.assertEqual([r["content"] for r in self._search("carr")], ["Carrots available tomorrow"])
+        self.assertEqual(self._search("organicx carrotsx"), [])
+        self.assertEqual(self.client.get("/api/chat/search/").status_code, 400)
+
+    def test_search_is_a_few_queries(self):
+        with self.assertNumQueries(2):
+            self.client.get("/api/chat/search/", {"q": "rice"})
+
+    def test_rebuild_indexes_existing_messages(self):
+        Chat.objects.create(sender=self.b, receiver=self.a, content="mango harvest")
+        self.assertEqual(self._search("mango"), [])
+        before = ChatSearchToken.objects.count()
 
-# Create your tests here.
+        out = StringIO()
+        call_command("rebuild_chat_search_index", "--batch-size", "2", stdout=out)
+        self.assertIn("TokenSearch: 6 messages indexed", out.getvalue())
+        self.assertEqual(ChatSearchToken.objects.count(), before + 2 * 2)
+        self.assertEqual([r["content"] for r in self._search("mango")], ["mango harvest"])
+        self.assertEqual(TokenSearch().rebuild(), 6)
@@ -1,11 +1,20 @@
 from rest_framework.views import APIView
-from django.db.models import Q, Max
+from django.db import transaction
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import Chat, CommunityMessage
+from .models import Chat, CommunityMessage, ConversationSummary
+from .community import community_messages, message_added
+from .events import community_message_sent
+from .search import search_messages
+from .summaries import mark_conversation_read, send_message
 from .serializers import ChatSerializer, CommunityMessageSerializer
 from accounts.permissions import IsActiveUser
 
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+SEARCH_RESULTS = 20
+MAX_SEARCH_RESULTS = 50
+
 def is_farmer(user):
     return hasattr(user, "farmerdetails")
 
@@ -18,25 +27,68 @@ class SendMessageAPIView(APIView):
 
         if not receiver_id or not content:
             return Response({"error": "receiver_id and content are required"}, status=400)
-
-        chat = Chat.objects.create(
-            sender=request.user,
-            receiver_id=receiver_id,
-            content=content
-        )
+        try:
+            # form posts carry strings; record_message compares ids
+            receiver_id = int(receiver_id)
+        except (TypeError, ValueError):
+            return Response({"error": "receiver_id must be an integer"}, status=400)
+
+        # message and both conversation summaries commit together
+        chat = send_message(request.user, receiver_id, content)
         return Response(ChatSerializer(chat).data, status=201)
 
 
 class MessageListAPIView(APIView):
+    """
+    One page of a two-party conversation, oldest first within the page.
+
+    Without a cursor the latest `limit` messages are returned. ?before=<id>
+    pages back into older history, ?after=<id> fetches newer messages.
+    The body stays a list of messages; the cursors for the following page
+    are sent as X-Next-Before / X-Next-After headers, left out when there
+    is nothing more in that direction.
+    """
     permission_classes = [IsAuthenticated, IsActiveUser]
 
     def get(self, request, user_id):
+        try:
+            before = request.query_params.get("before")
+            after = request.query_params.get("after")
+            before = int(before) if before else None
+            after = int(after) if after else None
+            limit = min(int(request.query_params.get("limit", MESSAGE_PAGE_SIZE)), MAX_MESSAGE_PAGE_SIZE)
+        except ValueError:
+            return Response({"error": "before, after and limit must be integers"}, status=400)
+        if limit < 1:
+            return Response({"error": "limit must be positive"}, status=400)
+
+        # range of the (participant_low, participant_high, id) index
         chat = Chat.objects.filter(
-            sender_id__in=[request.user.id, user_id],
-            receiver_id__in=[request.user.id, user_id]
-        ).order_by("timestamp")
-
-        return Response(ChatSerializer(chat, many=True).data)
+            participant_low=min(request.user.id, user_id),
+            participant_high=max(request.user.id, user_id),
+        ).select_related("sender", "receiver")
+
+        if after is not None:
+            page = list(chat.filter(id__gt=after).order_by("id")[:limit + 1])
+            more = len(page) > limit
+            page = page[:limit]
+            next_before = None
+            next_after = page[-1].id if more else None
+        else:
+            if before is not None:
+                chat = chat.filter(id__lt=before)
+            page = list(chat.order_by("-id")[:limit + 1])
+            more = len(page) > limit
+            page = page[:limit][::-1]
+            next_before = page[0].id if more else None
+            next_after = None
+
+        response = Response(ChatSerializer(page, many=True).data)
+        if next_before is not None:
+            response["X-Next-Before"] = next_before
+        if next_after is not None:
+            response["X-Next-After"] = next_after
+        return response
 
 class ConversationListAPI(APIView):
     permission_classes = [IsAuthenticated, IsActiveUser]
@@ -44,68 +96,91 @@ class ConversationListAPI(APIView):
     def get(self, request):
         user = request.user
 
-        # Get all messages involving logged user
-        messages = Chat.objects.filter(
-            Q(sender=user) | Q(receiver=user)
+        # Indexed range read of the user's summaries (chat.summaries keeps
+        # them current), independent of how many messages were exchanged
+        conversations = (
+            ConversationSummary.objects.filter(user=user)
+            .order_by("-last_timestamp")
+            .values(
+                "counterpart_id",
+                "counterpart__username",
+                "last_content",
+                "last_timestamp",
+                "unread_count",
+                "counterpart__farmerdetails__id",
+                "counterpart__farmerdetails__profile_image",
+                "counterpart__buyerdetails__profile_image",
+            )
         )
 
-        conversations = {}
-
-        for msg in messages:
-            other_user = msg.receiver if msg.sender == user else msg.sender
-
-            unread_count = Chat.objects.filter(
-                sender=other_user,
-                receiver=user,
-                is_read=False
-            ).count()
-            
-            profile_image = None
-            try:
-                if hasattr(other_user, "farmerdetails"):
-                    profile_image = other_user.farmerdetails.profile_image
-                elif hasattr(other_user, "buyerdetails"):
-                    profile_image = other_user.buyerdetails.profile_image
-            except:
-                profile_image = None
-
-            # keep latest message only
-            if (
-                other_user.id not in conversations
-                or msg.timestamp > conversations[other_user.id]["timestamp"]
-            ):
-                conversations[other_user.id] = {
-                    "user_id": other_user.id,
-                    "username": other_user.username,
-                    "last_message": msg.content,
-                    "timestamp": msg.timestamp,
-                    "profile_image": profile_image,
-                    "unread_count": unread_count,  
-                }
-
-        return Response(conversations.values())
+        return Response([
+            {
+                "user_id": c["counterpart_id"],
+                "username": c["counterpart__username"],
+                "last_message": c["last_content"],
+                "timestamp": c["last_timestamp"],
+                "profile_image": (
+                    c["counterpart__farmerdetails__profile_image"]
+                    if c["counterpart__farmerdetails__id"] is not None
+                    else c["counterpart__buyerdetails__profile_image"]
+                ),
+                "unread_count": c["unread_count"],
+            }
+            for c in conversations
+        ])
 
 class MarkConversationReadAPIView(APIView):
     permission_classes = [IsAuthenticated, IsActiveUser]
 
     def post(self, request, user_id):
-        Chat.objects.filter(
-            sender_id=user_id,
-            receiver=request.user,
-            is_read=False
-        ).update(is_read=True)
+        mark_conversation_read(request.user, user_id)
 
         return Response({"ok": True})
 
+class MessageSearchAPIView(APIView):
+    """
+    Search the requesting user's conversations: ?q=<terms>&limit=<n>.
+    Best matches first (chat.search), each message with its score.
+    """
+    permission_classes = [IsAuthenticated, IsActiveUser]
+
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response({"error": "q is required"}, status=400)
+        try:
+            limit = min(int(request.query_params.get("limit", SEARCH_RESULTS)), MAX_SEARCH_RESULTS)
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=400)
+        if limit < 1:
+            return Response({"error": "limit must be positive"}, status=400)
+
+        return Response({
+            "results": [
+                {**ChatSerializer(chat).data, "score": score}
+                for chat, score in search_messages(request.user.id, query, limit)
+            ],
+        })
+
 class CommunityMessageListAPIView(APIView):
+    """
+    The latest community messages, oldest first, from the in-process buffer
+    (chat.community). Pass ?since=<id of the last message you have> to get
+    only newer ones.
+    """
     permission_classes = [IsAuthenticated, IsActiveUser]
 
     def get(self, request):
         if not is_farmer(request.user):
             return Response({"error": "Only farmers can access community chat"}, status=403)
 
-        msgs = CommunityMessage.objects.select_related("sender").order_by("timestamp")[:300]
-        return Response(CommunityMessageSerializer(msgs, many=True).data)
+        try:
+            since = request.query_params.get("since")
+            since = int(since) if since else None
+        except ValueError:
+            return Response({"error": "since must be an integer"}, status=400)
+
+        return Response(community_messages(since))
 
 class SendCommunityMessageAPIView(APIView):
     permission_classes = [IsAuthenticated, IsActiveUser]
@@ -118,5 +193,8 @@ class SendCommunityMessageAPIView(APIView):
         if not content:
             return Response({"error": "content is required"}, status=400)
 
-        msg = CommunityMessage.objects.create(sender=request.user, content=content)
+        with transaction.atomic():
+            msg = CommunityMessage.objects.create(sender=request.user, content=content)
+            community_message_sent(msg)
+            message_added(msg)
         return Response(CommunityMessageSerializer(msg).data, status=201)
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""
+Cache of prediction-backed chatbot answers.
+
+Price, yield and demand answers depend only on the crop, the day and the
+model, so ``ChatbotIntentEngine.get_response`` keeps them in an in-process
+LRU keyed by (intent, crop, date, model version), plus the stamp of the
+file an answer reads (demand answers: demand_dataset.xlsx). A new model
+version, a new day or an edited dataset is a new key; stale entries age
+out of the LRU.
+
+Concurrent misses for one key are coalesced: the first caller computes,
+the others wait for its result (or its exception, which is not cached),
+so a burst of "tomato price?" makes one model call per process.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+ANSWER_CACHE_SIZE = 1024
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class AnswerCache:
+    def __init__(self, maxsize=ANSWER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        else:
+            with self._lock:
+                self._entries[key] = flight.value
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+answer_cache = AnswerCache()
+
+
+_dataset = (None, None)  # ((path, mtime), DataFrame)
+_dataset_lock = threading.Lock()
+
+
+def demand_dataset_stamp():
+    """(path, mtime) of data/demand_dataset.xlsx."""
+    from ml_api.services import demand_dataset_path
+
+    path = demand_dataset_path()
+    return path, os.path.getmtime(path)
+
+
+def demand_dataset():
+    """data/demand_dataset.xlsx, read again only when the file changes."""
+    global _dataset
+    import pandas as pd
+
+    stamp = demand_dataset_stamp()
+    path = stamp[0]
+    with _dataset_lock:
+        if _dataset[0] != stamp:
+            _dataset = (stamp, pd.read_excel(path))
+        return _dataset[1]
@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand, CommandError
+import random
+import time
+
+from chatbot.views import (
+    CROP_VARIATIONS,
+    KNOWN_CROPS,
+    ChatbotIntentEngine,
+    analyze_message,
+)
+
+FILLER = (
+    "what is the of my for in and to please tell me next week this field today "
+    "kg per acre can you about our village farm sell buy"
+).split()
+
+
+def legacy_analyze(message):
+    """The per-keyword substring scan analyze_message replaced, kept as the reference."""
+    message_lower = message.lower()
+    scores = {}
+    for intent, data in ChatbotIntentEngine.INTENTS.items():
+        scores[intent] = sum(1 for keyword in data['keywords'] if keyword in message_lower)
+
+    best_intent = max(scores, key=scores.get)
+    confidence = min(scores[best_intent] / max(1, len(message.split())), 1.0)
+    if scores[best_intent] == 0:
+        best_intent = 'general'
+        confidence = 0.3
+
+    crop = None
+    for known in KNOWN_CROPS:
+        if known in message_lower:
+            crop = known.title()
+            break
+    else:
+        for variation, name in CROP_VARIATIONS.items():
+            if variation in message_lower:
+                crop = name
+                break
+    return best_intent, confidence, scores, crop
+
+
+def synthetic_messages(count, seed=0):
+    """Filler words with a few keywords, crops and misspelled words mixed in."""
+    rng = random.Random(seed)
+    keywords = [k for data in ChatbotIntentEngine.INTENTS.values() for k in data['keywords']]
+    terms = keywords + KNOWN_CROPS + list(CROP_VARIATIONS)
+    messages = []
+    for _ in range(count):
+        words = rng.choices(FILLER, k=rng.randint(2, 16))
+        for _ in range(rng.randint(0, 4)):
+            term = rng.choice(terms)
+            if rng.random() < 0.2:
+                term += rng.choice("sy") + str(rng.randint(0, 99))
+            words.insert(rng.randint(0, len(words)), term)
+        message = " ".join(words)
+        messages.append(message.upper() if rng.random() < 0.1 else message.capitalize())
+    return messages
+
+
+class Command(BaseCommand):
+    help = (
+        "Time intent and crop matching of synthetic chatbot messages with the compiled "
+        "matcher against the old per-keyword scan, and check both agree."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=100000, help="Synthetic messages to match")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **opts):
+        messages = synthetic_messages(opts["messages"], opts["seed"])
+
+        timings = {}
+        results = {}
+        for name, analyze in (("legacy", legacy_analyze), ("compiled", lambda m: tuple(analyze_message(m)))):
+            started = time.perf_counter()
+            results[name] = [analyze(m) for m in messages]
+            timings[name] = time.perf_counter() - started
+
+        mismatches = sum(a != b for a, b in zip(results["legacy"], results["compiled"]))
+        for name, seconds in timings.items():
+            self.stdout.write(
+                f"{name:>9}: {seconds:.2f}s, {seconds / len(messages) * 1e6:.1f} us/message"
+            )
+        if mismatches:
+            raise CommandError(f"{mismatches} of {len(messages)} messages differ from the legacy scan")
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {len(messages)} messages, identical results, "
+            f"{timings['legacy'] / timings['compiled']:.1f}x faster"
+        ))
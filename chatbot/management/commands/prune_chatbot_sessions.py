@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+import os
+import time
+
+from chatbot.retention import PRUNE_BATCH_SIZE, RETENTION_DAYS, prune_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete chatbot sessions idle for longer than --days, with their messages, "
+        "in batches. Optionally archive them to a gzip-compressed JSONL file first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=RETENTION_DAYS,
+                            help="Keep sessions updated within this many days")
+        parser.add_argument("--batch-size", type=int, default=PRUNE_BATCH_SIZE, help="Sessions per transaction")
+        parser.add_argument("--archive-dir", type=str, default=None,
+                            help="Append deleted sessions to <dir>/chatbot-sessions-<date>.jsonl.gz")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+
+    def handle(self, *args, **opts):
+        if opts["days"] < 1 or opts["batch_size"] < 1:
+            raise CommandError("--days and --batch-size must be positive")
+
+        now = timezone.now()
+        archive_path = None
+        if opts["archive_dir"] and not opts["dry_run"]:
+            os.makedirs(opts["archive_dir"], exist_ok=True)
+            archive_path = os.path.join(opts["archive_dir"], f"chatbot-sessions-{now:%Y%m%d}.jsonl.gz")
+
+        started = time.perf_counter()
+        sessions, messages = prune_sessions(
+            now - timedelta(days=opts["days"]),
+            batch_size=opts["batch_size"],
+            archive_path=archive_path,
+            dry_run=opts["dry_run"],
+        )
+
+        verb = "Would delete" if opts["dry_run"] else "Deleted"
+        line = f"{verb} {sessions} sessions and {messages} messages in {time.perf_counter() - started:.2f}s"
+        if archive_path:
+            line += f", archived to {archive_path}"
+        self.stdout.write(self.style.SUCCESS(f"Done. {line}"))
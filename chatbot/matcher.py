@@ -0,0 +1,90 @@
+"""
+Keyword matching for the chatbot, compiled once at import.
+
+``KeywordMatcher`` reports which keywords occur in a message as substrings
+(the same test as ``keyword in message``), as a bitmask over its keyword
+tuple. Keywords without whitespace always lie inside one whitespace
+separated word, so they are matched per distinct word against a single
+regular expression shaped like a trie, and the result for each word is
+memoized: chat vocabulary is small and repetitive, so most words cost a
+cache lookup. The regex runs inside a lookahead at every position of the
+word so overlapping keywords are all found ("price", "rice"); at a
+position it yields the longest keyword, and the keywords that are
+prefixes of it are added from a table. A multi-word keyword is only
+tested on the whole message when some word ends with its first word.
+"""
+
+import re
+from functools import lru_cache, reduce
+from operator import or_
+
+WORD_CACHE_SIZE = 65536
+
+
+def _trie_pattern(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # greedy: the longest keyword at a position wins
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+def _has_space(keyword):
+    return any(char.isspace() for char in keyword)
+
+
+class KeywordMatcher:
+    def __init__(self, keywords, cache_size=WORD_CACHE_SIZE):
+        # bit i of a mask stands for self.keywords[i]
+        self.keywords = tuple(sorted({k.lower() for k in keywords if k}))
+        bits = {k: 1 << i for i, k in enumerate(self.keywords)}
+
+        words = [k for k in self.keywords if not _has_space(k)]
+        phrases = [k for k in self.keywords if _has_space(k)]
+        self._pattern = re.compile(f"(?=({_trie_pattern(words)}))") if words else None
+        self._prefix_masks = {
+            k: sum(bits[p] for p in words if k.startswith(p)) for k in words
+        }
+        # candidate bits of multi-word keywords sit above the keyword bits
+        self._phrase_shift = len(self.keywords)
+        self._phrases = [(1 << i, bits[k], k) for i, k in enumerate(phrases)]
+        self._phrase_heads = [(1 << i, k.split()[0]) for i, k in enumerate(phrases)]
+        self._keyword_bits = (1 << len(self.keywords)) - 1
+        self._word_mask = lru_cache(maxsize=cache_size)(self._scan_word)
+
+    def _scan_word(self, word):
+        mask = 0
+        if self._pattern is not None:
+            for longest in self._pattern.findall(word):
+                mask |= self._prefix_masks[longest]
+        for candidate, head in self._phrase_heads:
+            if word.endswith(head):
+                mask |= candidate << self._phrase_shift
+        return mask
+
+    def mask(self, text):
+        """Bitmask of the keywords occurring in text (expected lowercase)."""
+        mask = reduce(or_, map(self._word_mask, text.split()), 0)
+        candidates = mask >> self._phrase_shift
+        mask &= self._keyword_bits
+        if candidates:
+            for candidate, bit, phrase in self._phrases:
+                if candidates & candidate and phrase in text:
+                    mask |= bit
+        return mask
+
+    def find(self, text):
+        """The set of keywords occurring in text (expected lowercase)."""
+        mask = self.mask(text)
+        return {k for i, k in enumerate(self.keywords) if mask >> i & 1}
@@ -13,6 +13,10 @@ class ChatSession(models.Model):
 
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            # retention: idle sessions are found by an updated_at range scan
+            models.Index(fields=['updated_at']),
+        ]
 
 
 class ChatMessage(models.Model):
@@ -0,0 +1,81 @@
+"""
+Retention of chatbot sessions.
+
+Anonymous sessions are created per visit, so idle ones are deleted
+in batches: each batch is an ordered range read of the updated_at index
+and one transaction that deletes the sessions and, by session id, their
+messages. Batches keep locks and undo short on MySQL.
+
+With an archive file each batch is first written as gzip-compressed
+JSONL, one session per line with its messages. The batch is written and
+flushed before its transaction commits, so a session is never deleted
+without being archived; if the transaction then rolls back, the next run
+archives those sessions again. Readers of the archive should keep the
+last line per session id.
+"""
+
+import gzip
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import ChatMessage, ChatSession
+
+RETENTION_DAYS = 30
+PRUNE_BATCH_SIZE = 500
+
+SESSION_FIELDS = ("id", "session_id", "context", "created_at", "updated_at")
+MESSAGE_FIELDS = ("id", "role", "message", "intent", "confidence", "metadata", "created_at")
+
+
+def _archive_lines(session_ids):
+    messages = {}
+    for row in (
+        ChatMessage.objects.filter(session_id__in=session_ids).order_by("session_id", "id")
+        .values("session_id", *MESSAGE_FIELDS).iterator()
+    ):
+        messages.setdefault(row.pop("session_id"), []).append(row)
+    for session in ChatSession.objects.filter(id__in=session_ids).order_by("id").values(*SESSION_FIELDS):
+        session["messages"] = messages.get(session["id"], [])
+        yield json.dumps(session, cls=DjangoJSONEncoder) + "\n"
+
+
+def prune_sessions(cutoff, batch_size=PRUNE_BATCH_SIZE, archive_path=None, dry_run=False):
+    """
+    Delete sessions not updated since cutoff, with their messages.
+
+    Args:
+        cutoff: Sessions with updated_at before this are removed
+        batch_size: Sessions per batch (one transaction each)
+        archive_path: Optional .jsonl.gz file the sessions are appended to first
+            (a session may appear twice after a rolled back batch)
+        dry_run: Only count what would be deleted
+
+    Returns:
+        (sessions, messages) deleted, or that would be with dry_run
+    """
+    idle = ChatSession.objects.filter(updated_at__lt=cutoff)
+    if dry_run:
+        return idle.count(), ChatMessage.objects.filter(session__in=idle).count()
+
+    archive = gzip.open(archive_path, "at", encoding="utf-8") if archive_path else None
+    sessions = messages = 0
+    try:
+        while True:
+            with transaction.atomic():
+                # re-checked under the lock, so a session resumed meanwhile is kept
+                ids = list(
+                    idle.select_for_update().order_by("updated_at", "id").values_list("id", flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                if archive is not None:
+                    archive.writelines(_archive_lines(ids))
+                    archive.flush()
+                messages += ChatMessage.objects.filter(session_id__in=ids).delete()[0]
+                sessions += ChatSession.objects.filter(id__in=ids).delete()[0]
+    finally:
+        if archive is not None:
+            archive.close()
+    return sessions, messages
@@ -18,6 +18,15 @@ class ChatSessionSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
+class ChatSessionListSerializer(serializers.ModelSerializer):
+    """Session without its messages, for the paginated list; messages come from history."""
+
+    class Meta:
+        model = ChatSession
+        fields = ['id', 'session_id', 'context', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+
 class ChatMessageCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
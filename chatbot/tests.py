@@ -1,3 +1,247 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import views
+from .answers import AnswerCache, answer_cache
+from .models import ChatMessage, ChatSession
+from .management.commands.benchmark_chatbot_matcher import legacy_analyze, synthetic_messages
+from .matcher import KeywordMatcher
+from .views import ChatbotIntentEngine, analyze_message, extract_crop_from_message
+
+
+class KeywordMatcherTests(SimpleTestCase):
+    def test_finds_overlapping_and_nested_keywords(self):
+        matcher = KeywordMatcher(["price", "rice", "market price", "how much", "how much produce", "ok"])
+        self.assertEqual(
+            matcher.find("the market price? how much produce. look"),
+            {"price", "rice", "market price", "how much", "how much produce", "ok"},
+        )
+        self.assertEqual(matcher.find("show muchness"), {"how much"})
+        self.assertEqual(matcher.find("how  much"), set())
+        self.assertEqual(matcher.find(""), set())
+
+
+class IntentMatchingParityTests(SimpleTestCase):
+    EDGE_CASES = [
+        "", "   ", "Hello", "PRICE OF TOMATO", "what is the price of eggplant", "aubergine harvest",
+        "how much produce from the field", "show muchness", "how\tmuch", "cottonion",
+        "chilli or chili", "red onion and onion", "snake gourd disease", "bitter gourds",
+        "which crop, what to plant?", "forecast", "ok thanks", "sugarcanes rubbery tea-leaves",
+    ]
+
+    def test_same_results_as_keyword_scan(self):
+        for message in self.EDGE_CASES + synthetic_messages(5000, seed=1):
+            with self.subTest(message=message):
+                self.assertEqual(tuple(analyze_message(message)), legacy_analyze(message))
+
+    def test_public_helpers(self):
+        self.assertEqual(ChatbotIntentEngine.match_intent("Tomato price please"), ("price_prediction", 1 / 3))
+        self.assertEqual(extract_crop_from_message("Any aubergine?"), "Brinjal")
+        self.assertIsNone(extract_crop_from_message("nothing here"))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_chatbot_matcher", "--messages", "500", stdout=out)
+        self.assertIn("500 messages, identical results", out.getvalue())
+
+
+class FakePricePredictor:
+    def __init__(self, model_version):
+        self.model_version = model_version
+        self.calls = 0
+
+    def predict(self, features):
+        self.calls += 1
+        return 100.0 + self.calls
+
+
+class FakeDemandPredictor:
+    model_version = "v1"
+
+    def forecast_days(self, product_name, forecast_days, consumption_trend, excel_df):
+        demand = float(excel_df["demand"].iloc[0])
+        return {"data": [{"demand_tonnes": demand}] * forecast_days}
+
+
+class AnswerCacheTests(SimpleTestCase):
+    def setUp(self):
+        answer_cache.clear()
+        self.saved = views._price_predictor, views._demand_predictor
+        views._price_predictor = self.predictor = FakePricePredictor("v1")
+        views._demand_predictor = FakeDemandPredictor()
+
+    def tearDown(self):
+        views._price_predictor, views._demand_predictor = self.saved
+        answer_cache.clear()
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = AnswerCache(maxsize=2)
+        cache.get_or_compute("a", lambda: 1)
+        cache.get_or_compute("b", lambda: 2)
+        cache.get_or_compute("a", lambda: 0)
+        cache.get_or_compute("c", lambda: 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get_or_compute("a", lambda: 0), 1)
+        self.assertEqual(cache.get_or_compute("b", lambda: 0), 0)
+
+    def test_concurrent_misses_make_one_call(self):
+        cache = AnswerCache()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "answer"
+
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+                   for _ in range(8)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual((len(calls), results), (1, ["answer"] * 8))
+
+    def test_errors_are_not_cached(self):
+        cache = AnswerCache()
+
+        def fail():
+            raise ValueError("model down")
+
+        with self.assertRaises(ValueError):
+            cache.get_or_compute("k", fail)
+        self.assertEqual(cache.get_or_compute("k", lambda: "ok"), "ok")
+
+    def test_price_answers_are_cached_per_model_version(self):
+        first = ChatbotIntentEngine.get_response("price_prediction", "tomato price?")
+        self.assertIn("Rs. 101.00", first)
+        self.assertEqual(ChatbotIntentEngine.get_response("price_prediction", "Tomato price today"), first)
+        self.assertIn("Potato", ChatbotIntentEngine.get_response("price_prediction", "potato price"))
+        self.assertEqual(self.predictor.calls, 2)
+
+        self.predictor.model_version = "v2"
+        self.assertIn("Rs. 103.00", ChatbotIntentEngine.get_response("price_prediction", "tomato price?"))
+
+    def test_demand_answers_follow_dataset_edits(self):
+        with tempfile.TemporaryDirectory() as base_dir, self.settings(BASE_DIR=base_dir):
+            os.mkdir(os.path.join(base_dir, "data"))
+            path = os.path.join(base_dir, "data", "demand_dataset.xlsx")
+            pd.DataFrame({"demand": [10.0]}).to_excel(path, index=False)
+            self.assertIn("**10.00 tonnes**", ChatbotIntentEngine.get_response("demand_prediction", "tomato demand"))
+
+            pd.DataFrame({"demand": [20.0]}).to_excel(path, index=False)
+            os.utime(path, (0, os.path.getmtime(path) + 1))
+            self.assertIn("**20.00 tonnes**", ChatbotIntentEngine.get_response("demand_prediction", "tomato demand"))
+
+
+class SendMessageTests(TestCase):
+    def setUp(self):
+        self.session = ChatSession.objects.create(session_id="s1")
+        self.url = f"/api/chatbot/sessions/{self.session.pk}/send_message/"
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username="farmer"))
+
+    def test_turn_is_one_insert_and_one_update(self):
+        # SAVEPOINT, SELECT session, INSERT both messages, UPDATE session, RELEASE
+        with self.assertNumQueries(5):
+            response = self.client.post(self.url, {"message": "hello"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["bot_response"]["intent"], "general")
+
+        messages = list(self.session.messages.values_list("role", "message"))
+        self.assertEqual([role for role, _ in messages], ["user", "bot"])
+        self.assertEqual(messages[0][1], "hello")
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.context, {"last_intent": "general"})
+
+    def test_unchanged_context_is_not_rewritten(self):
+        self.client.post(self.url, {"message": "hello"}, format="json")
+        with self.assertNumQueries(5) as ctx:
+            self.client.post(self.url, {"message": "hi"}, format="json")
+        update = next(q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE"))
+        self.assertNotIn("context", update)
+        self.assertEqual(ChatMessage.objects.filter(session=self.session).count(), 4)
+
+
+class SessionListAndHistoryTests(TestCase):
+    def setUp(self):
+        self.sessions = [ChatSession.objects.create(session_id=f"s{i}") for i in range(3)]
+        ChatMessage.objects.bulk_create(
+            ChatMessage(session=self.sessions[0], role="user" if i % 2 == 0 else "bot", message=str(i))
+            for i in range(5)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username="farmer"))
+
+    def test_session_list_is_cursor_paginated(self):
+        first = self.client.get("/api/chatbot/sessions/?limit=2").data
+        self.assertEqual([s["session_id"] for s in first["results"]], ["s2", "s1"])
+        self.assertNotIn("messages", first["results"][0])
+        second = self.client.get(first["next"]).data
+        self.assertEqual([s["session_id"] for s in second["results"]], ["s0"])
+        self.assertIsNone(second["next"])
+
+    def test_history_pages_back_from_latest(self):
+        url = f"/api/chatbot/sessions/{self.sessions[0].pk}/history/"
+        first = self.client.get(url, {"limit": 2})
+        self.assertEqual([m["message"] for m in first.data], ["3", "4"])
+        second = self.client.get(url, {"limit": 2, "before": first["X-Next-Before"]})
+        third = self.client.get(url, {"limit": 2, "before": second["X-Next-Before"]})
+        self.assertEqual([m["message"] for m in second.data], ["1", "2"])
+        self.assertEqual([m["message"] for m in third.data], ["0"])
+        self.assertFalse(third.has_header("X-Next-Before"))
+        self.assertEqual(self.client.get(url, {"before": "x"}).status_code, 400)
+
+    def test_retrieve_does_not_nest_messages(self):
+        with self.assertNumQueries(1):
+            data = self.client.get(f"/api/chatbot/sessions/{self.sessions[0].pk}/").data
+        self.assertEqual(data["session_id"], "s0")
+        self.assertNotIn("messages", data)
+
+
+class PruneSessionsTests(TestCase):
+    def setUp(self):
+        old = timezone.now() - timedelta(days=40)
+        for i in range(5):
+            session = ChatSession.objects.create(session_id=f"s{i}")
+            ChatMessage.objects.create(session=session, role="user", message=f"hello {i}")
+            if i < 3:
+                ChatSession.objects.filter(pk=session.pk).update(updated_at=old)
+
+    def _prune(self, *args):
+        out = StringIO()
+        call_command("prune_chatbot_sessions", *args, stdout=out)
+        return out.getvalue()
+
+    def test_deletes_idle_sessions_in_batches(self):
+        self.assertIn("Would delete 3 sessions and 3 messages", self._prune("--dry-run"))
+        self.assertEqual(ChatSession.objects.count(), 5)
+
+        self.assertIn("Deleted 3 sessions and 3 messages", self._prune("--batch-size", "2"))
+        self.assertEqual(sorted(ChatSession.objects.values_list("session_id", flat=True)), ["s3", "s4"])
+        self.assertEqual(ChatMessage.objects.count(), 2)
+
+    def test_archives_before_deleting(self):
+        with tempfile.TemporaryDirectory() as archive_dir:
+            self.assertIn("archived to", self._prune("--archive-dir", archive_dir, "--batch-size", "2"))
+            path = f"{archive_dir}/chatbot-sessions-{timezone.now():%Y%m%d}.jsonl.gz"
+            with gzip.open(path, "rt", encoding="utf-8") as archive:
+                sessions = [json.loads(line) for line in archive]
+        self.assertEqual([s["session_id"] for s in sessions], ["s0", "s1", "s2"])
+        self.assertEqual(sessions[0]["messages"][0]["message"], "hello 0")
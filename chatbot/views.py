@@ -1,12 +1,21 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import CursorPagination
+from django.db import transaction
 from .models import ChatSession, ChatMessage
-from .serializers import ChatSessionSerializer, ChatMessageSerializer, ChatMessageCreateSerializer
+from .serializers import (
+    ChatSessionSerializer, ChatSessionListSerializer, ChatMessageSerializer, ChatMessageCreateSerializer,
+)
+from .answers import answer_cache, demand_dataset, demand_dataset_stamp
+from .matcher import KeywordMatcher
 import uuid
 import json
 import re
-from datetime import datetime
+from collections import namedtuple
+from functools import lru_cache
+from operator import itemgetter
+from datetime import date, datetime
 
 # Import ML predictors
 from ml_models.predictors import PricePredictor, YieldPredictor, DemandPredictor
@@ -34,7 +43,7 @@ def get_yield_predictor():
 def get_demand_predictor():
     global _demand_predictor
     if _demand_predictor is None:
-        _demand_predictor = DemandPredictor()
+        _demand_predictor = DemandPredictor().load()
     return _demand_predictor
 
 
@@ -52,30 +61,80 @@ KNOWN_CROPS = [
 ]
 
 
+# Other names users write, checked after KNOWN_CROPS
+CROP_VARIATIONS = {
+    'aubergine': 'Brinjal',
+    'eggplant': 'Brinjal',
+    'chili': 'Green Chilli',
+    'chilli': 'Green Chilli',
+    'onion': 'Big Onion',
+    'gourd': 'Snake gourd',
+}
+
+
 def extract_crop_from_message(message):
     """Extract crop name from user message"""
-    message_lower = message.lower()
-    
-    # Check for known crops
-    for crop in KNOWN_CROPS:
-        if crop in message_lower:
-            return crop.title()
-    
-    # Also check for common variations
-    variations = {
-        'aubergine': 'Brinjal',
-        'eggplant': 'Brinjal',
-        'chili': 'Green Chilli',
-        'chilli': 'Green Chilli',
-        'onion': 'Big Onion',
-        'gourd': 'Snake gourd',
+    return analyze_message(message).crop
+
+
+def _price_answer(predictor, crop):
+    price = predictor.predict({
+        'product': crop,
+        'date': datetime.now()
+    })
+    return f"📊 **Price Prediction for {crop}**\n\nThe predicted wholesale price for {crop} is **Rs. {price:.2f}** per kg.\n\nThis prediction is based on historical market data from Pettah and Dambulla markets."
+
+
+def _yield_answer(predictor, crop):
+    # Default features for yield prediction
+    features = {
+        'crop_type': crop,
+        'area': 1.0,  # 1 hectare
+        'rainfall': 1500,  # mm
+        'temperature': 28,  # Celsius
+        'soil_type': 'loamy',
+        'fertilizer_used': 100,  # kg
     }
-    
-    for variation, crop in variations.items():
-        if variation in message_lower:
-            return crop
-    
-    return None
+    yield_value = predictor.predict(features)
+    return f"🌾 **Yield Prediction for {crop}**\n\nPredicted yield: **{yield_value:.2f} kg/hectare**\n\nThis is based on average conditions (1500mm rainfall, 28°C temperature, loamy soil). For more accurate predictions, provide specific farming conditions."
+
+
+def _demand_answer(predictor, crop):
+    if not hasattr(predictor, 'forecast_days'):
+        return f"Demand forecasting is available for {crop}. Please check back later for detailed predictions."
+    result = predictor.forecast_days(
+        product_name=crop,
+        forecast_days=7,
+        consumption_trend='Stable',
+        excel_df=demand_dataset()
+    )
+    if result and 'data' in result:
+        total_demand = sum([f.get('demand_tonnes', 0) for f in result['data']])
+        avg_demand = total_demand / len(result['data'])
+        return f"📈 **Demand Forecast for {crop}**\n\nAverage daily demand: **{avg_demand:.2f} tonnes**\n7-day total demand: **{total_demand:.2f} tonnes**\n\nTrend: {result.get('consumption_trend', 'Stable')}"
+    return f"📈 **Demand Forecast for {crop}**\n\nDemand prediction model is processing. The market shows stable demand patterns for {crop}."
+
+
+# intent -> (predictor getter, answer builder, what is predicted, reply without a crop,
+# stamp of the input file the builder reads or None); answers are cached per
+# (intent, crop, day, model version, stamp) in chatbot.answers
+PREDICTION_ANSWERS = {
+    'price_prediction': (
+        get_price_predictor, _price_answer, 'price',
+        "I can predict prices. Please specify a crop, for example: 'What is the price of tomato?' or 'Potato price prediction'",
+        None,
+    ),
+    'yield_prediction': (
+        get_yield_predictor, _yield_answer, 'yield',
+        "I can predict crop yields. Please specify a crop, for example: 'What is the yield of rice?' or 'Tomato yield prediction'",
+        None,
+    ),
+    'demand_prediction': (
+        get_demand_predictor, _demand_answer, 'demand',
+        "I can forecast market demand. Please specify a crop, for example: 'What is the demand for cabbage?' or 'Tomato demand forecast'",
+        demand_dataset_stamp,
+    ),
+}
 
 
 class ChatbotIntentEngine:
@@ -119,102 +178,104 @@ class ChatbotIntentEngine:
     @staticmethod
     def match_intent(message):
         """Smart keyword matching for intent"""
-        message_lower = message.lower()
-        scores = {}
-        
-        for intent, data in ChatbotIntentEngine.INTENTS.items():
-            score = sum(1 for keyword in data['keywords'] if keyword in message_lower)
-            scores[intent] = score
-        
-        best_intent = max(scores, key=scores.get)
-        confidence = min(scores[best_intent] / max(1, len(message.split())), 1.0)
-        
-        if scores[best_intent] == 0:
-            best_intent = 'general'
-            confidence = 0.3
-        
-        return best_intent, confidence
+        analysis = analyze_message(message)
+        return analysis.intent, analysis.confidence
 
     @staticmethod
-    def get_response(intent, message, session_context=None):
+    def get_response(intent, message, session_context=None, analysis=None):
         """Generate intelligent response based on intent and extract predictions"""
-        crop = extract_crop_from_message(message)
-        
-        # Price prediction
-        if intent == 'price_prediction':
-            if crop:
-                try:
-                    predictor = get_price_predictor()
-                    price = predictor.predict({
-                        'product': crop,
-                        'date': datetime.now()
-                    })
-                    return f"📊 **Price Prediction for {crop}**\n\nThe predicted wholesale price for {crop} is **Rs. {price:.2f}** per kg.\n\nThis prediction is based on historical market data from Pettah and Dambulla markets."
-                except Exception as e:
-                    return f"Sorry, I couldn't predict the price for {crop}. Error: {str(e)}"
-            else:
-                return "I can predict prices. Please specify a crop, for example: 'What is the price of tomato?' or 'Potato price prediction'"
-        
-        # Yield prediction
-        elif intent == 'yield_prediction':
-            if crop:
-                try:
-                    predictor = get_yield_predictor()
-                    # Default features for yield prediction
-                    features = {
-                        'crop_type': crop,
-                        'area': 1.0,  # 1 hectare
-                        'rainfall': 1500,  # mm
-                        'temperature': 28,  # Celsius
-                        'soil_type': 'loamy',
-                        'fertilizer_used': 100,  # kg
-                    }
-                    yield_value = predictor.predict(features)
-                    return f"🌾 **Yield Prediction for {crop}**\n\nPredicted yield: **{yield_value:.2f} kg/hectare**\n\nThis is based on average conditions (1500mm rainfall, 28°C temperature, loamy soil). For more accurate predictions, provide specific farming conditions."
-                except Exception as e:
-                    return f"Sorry, I couldn't predict the yield for {crop}. Error: {str(e)}"
-            else:
-                return "I can predict crop yields. Please specify a crop, for example: 'What is the yield of rice?' or 'Tomato yield prediction'"
-        
-        # Demand prediction
-        elif intent == 'demand_prediction':
-            if crop:
-                try:
-                    predictor = get_demand_predictor()
-                    if hasattr(predictor, 'forecast_days'):
-                        import os
-                        import pandas as pd
-                        from django.conf import settings
-                        excel_path = os.path.join(settings.BASE_DIR, "data", "demand_dataset.xlsx")
-                        df = pd.read_excel(excel_path)
-                        result = predictor.forecast_days(
-                            product_name=crop,
-                            forecast_days=7,
-                            consumption_trend='Stable',
-                            excel_df=df
-                        )
-                        if result and 'data' in result:
-                            total_demand = sum([f.get('demand_tonnes', 0) for f in result['data']])
-                            avg_demand = total_demand / len(result['data'])
-                            return f"📈 **Demand Forecast for {crop}**\n\nAverage daily demand: **{avg_demand:.2f} tonnes**\n7-day total demand: **{total_demand:.2f} tonnes**\n\nTrend: {result.get('consumption_trend', 'Stable')}"
-                        else:
-                            return f"📈 **Demand Forecast for {crop}**\n\nDemand prediction model is processing. The market shows stable demand patterns for {crop}."
-                    else:
-                        return f"Demand forecasting is available for {crop}. Please check back later for detailed predictions."
-                except Exception as e:
-                    return f"Sorry, I couldn't predict the demand for {crop}. Error: {str(e)}"
-            else:
-                return "I can forecast market demand. Please specify a crop, for example: 'What is the demand for cabbage?' or 'Tomato demand forecast'"
-        
+        crop = (analysis or analyze_message(message)).crop
+        answer = PREDICTION_ANSWERS.get(intent)
+
+        if answer is not None:
+            get_predictor, compute, kind, no_crop_reply, input_stamp = answer
+            if not crop:
+                return no_crop_reply
+            try:
+                predictor = get_predictor()
+                stamp = input_stamp() if input_stamp else None
+                key = (intent, crop, date.today(), predictor.model_version, stamp)
+                return answer_cache.get_or_compute(key, lambda: compute(predictor, crop))
+            except Exception as e:
+                return f"Sorry, I couldn't predict the {kind} for {crop}. Error: {str(e)}"
+
         # Default response for other intents
         return ChatbotIntentEngine.INTENTS.get(intent, {}).get('response', 
             'I\'m here to help! Please tell me more about what you need.')
 
 
+MessageAnalysis = namedtuple('MessageAnalysis', ['intent', 'confidence', 'scores', 'crop'])
+
+# every intent keyword, crop and variation, matched in one pass per message
+_MATCHER = KeywordMatcher(
+    [k for data in ChatbotIntentEngine.INTENTS.values() for k in data['keywords']]
+    + KNOWN_CROPS + list(CROP_VARIATIONS)
+)
+_BITS = {keyword: 1 << i for i, keyword in enumerate(_MATCHER.keywords)}
+# an intent's score is the number of its keywords present
+_INTENT_MASKS = [
+    (intent, sum(_BITS[k] for k in set(data['keywords'])))
+    for intent, data in ChatbotIntentEngine.INTENTS.items()
+]
+# crop priority: KNOWN_CROPS order, then CROP_VARIATIONS order
+_CROP_RANKS = {}
+for _rank, (_keyword, _name) in enumerate(
+    [(crop, crop.title()) for crop in KNOWN_CROPS] + list(CROP_VARIATIONS.items())
+):
+    _CROP_RANKS.setdefault(_BITS[_keyword], (_rank, _name))
+_CROP_MASK = sum(_CROP_RANKS)
+
+
+@lru_cache(maxsize=4096)
+def _summarize(mask):
+    """Intent scores, best intent and crop for a set of matched keywords."""
+    scores = tuple((intent, (mask & intent_mask).bit_count()) for intent, intent_mask in _INTENT_MASKS)
+    best_intent, best_score = max(scores, key=itemgetter(1))
+
+    crops = mask & _CROP_MASK
+    ranks = []
+    while crops:
+        bit = crops & -crops
+        ranks.append(_CROP_RANKS[bit])
+        crops ^= bit
+    return scores, best_intent, best_score, min(ranks)[1] if ranks else None
+
+
+def analyze_message(message):
+    """Intent scores and crop of a message from a single scan."""
+    scores, best_intent, best_score, crop = _summarize(_MATCHER.mask(message.lower()))
+
+    confidence = min(best_score / max(1, len(message.split())), 1.0)
+    if best_score == 0:
+        best_intent = 'general'
+        confidence = 0.3
+
+    return MessageAnalysis(best_intent, confidence, dict(scores), crop)
+
+
+HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 200
+
+
+class SessionCursorPagination(CursorPagination):
+    """Newest sessions first; ?cursor= from the previous page's next link."""
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 200
+
+
 class ChatSessionViewSet(viewsets.ModelViewSet):
     """ViewSet for chat sessions"""
     queryset = ChatSession.objects.all()
     serializer_class = ChatSessionSerializer
+    pagination_class = SessionCursorPagination
+
+    def get_serializer_class(self):
+        # messages are paged through history, never nested
+        if self.action in ('list', 'retrieve'):
+            return ChatSessionListSerializer
+        return super().get_serializer_class()
 
     @action(detail=False, methods=['post'])
     def create_session(self, request):
@@ -233,23 +294,22 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
         if not user_message:
             return Response({'error': 'Message cannot be empty'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Detect intent
-        intent, confidence = ChatbotIntentEngine.match_intent(user_message)
+        # Detect intent and crop
+        analysis = analyze_message(user_message)
+        intent, confidence = analysis.intent, analysis.confidence
         
-        # Save user message
-        user_msg = ChatMessage.objects.create(
+        # Generate bot response with ML predictions (outside the transaction)
+        bot_response_text = ChatbotIntentEngine.get_response(intent, user_message, session.context, analysis)
+
+        user_msg = ChatMessage(
             session=session,
             role='user',
             message=user_message,
             intent=intent,
             confidence=confidence,
-            metadata={'intent_scores': {intent: confidence}}
+            metadata={'intent_scores': {intent: confidence}, 'crop': analysis.crop}
         )
-        
-        # Generate bot response with ML predictions
-        bot_response_text = ChatbotIntentEngine.get_response(intent, user_message, session.context)
-        
-        bot_msg = ChatMessage.objects.create(
+        bot_msg = ChatMessage(
             session=session,
             role='bot',
             message=bot_response_text,
@@ -257,10 +317,15 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
             confidence=confidence,
             metadata={'intent': intent}
         )
-        
-        # Update session context
-        session.context['last_intent'] = intent
-        session.save()
+
+        # One INSERT for both messages, one UPDATE of the session
+        update_fields = ['updated_at']
+        if session.context.get('last_intent') != intent:
+            session.context['last_intent'] = intent
+            update_fields.append('context')
+        with transaction.atomic():
+            ChatMessage.objects.bulk_create([user_msg, bot_msg])
+            session.save(update_fields=update_fields)
         
         return Response({
             'user_message': {
@@ -277,8 +342,31 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def history(self, request, pk=None):
-        """Get conversation history"""
+        """
+        Get conversation history, one page at a time: the latest `limit`
+        messages, oldest first. The body is the list of messages; when
+        there are older ones the X-Next-Before header carries the cursor
+        to pass as ?before=.
+        """
         session = self.get_object()
-        messages = session.messages.all()
-        serializer = ChatMessageSerializer(messages, many=True)
-        return Response(serializer.data)
+        try:
+            before = request.query_params.get('before')
+            before = int(before) if before else None
+            limit = min(int(request.query_params.get('limit', HISTORY_PAGE_SIZE)), MAX_HISTORY_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'before and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'limit must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # keyset read of the session_id index (ids follow created_at)
+        messages = ChatMessage.objects.filter(session=session)
+        if before is not None:
+            messages = messages.filter(id__lt=before)
+        page = list(messages.order_by('-id')[:limit + 1])
+        more = len(page) > limit
+        page = page[:limit][::-1]
+
+        response = Response(ChatMessageSerializer(page, many=True).data)
+        if more:
+            response['X-Next-Before'] = page[0].id
+        return response
@@ -0,0 +1,279 @@
+"""
+Admission control and load shedding for the ML endpoints.
+
+Every ML endpoint is ``AllowAny`` and one request can cost a full recursive
+forecast or an Excel parse, so each view is tagged with a cost class
+(``@admission_control("forecast")``). Before the view runs a request must:
+
+1. take a token from its client's bucket (keyed by IP address),
+2. take a token from the class-wide global bucket, and
+3. get a free slot among the class's in-flight model evaluations.
+
+Failing (1) or (2) returns 429 and failing (3) returns 503, both immediately
+and with ``Retry-After``, so a burst is shed instead of queueing on the CPUs.
+Limits per class come from ``settings.ML_ADMISSION``; counters of admitted
+and shed requests are exposed to staff at ``/api/ml/admission/``.
+
+State is per process: with N workers the effective global limits are N
+times the configured ones.
+"""
+
+import asyncio
+import functools
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.http import JsonResponse
+from rest_framework import status
+
+DEFAULT_CLASSES = {
+    # single model evaluation
+    "light": {"RATE": 10.0, "BURST": 30, "GLOBAL_RATE": 100.0, "GLOBAL_BURST": 200, "MAX_CONCURRENT": 16},
+    # multi-step recursive forecasts and explanations
+    "forecast": {"RATE": 2.0, "BURST": 10, "GLOBAL_RATE": 20.0, "GLOBAL_BURST": 40, "MAX_CONCURRENT": 4},
+    # Excel parsing / batch scoring
+    "heavy": {"RATE": 0.5, "BURST": 5, "GLOBAL_RATE": 5.0, "GLOBAL_BURST": 10, "MAX_CONCURRENT": 2},
+}
+
+DEFAULTS = {
+    "ENABLED": True,
+    "TRUST_X_FORWARDED_FOR": False,
+    "RETRY_AFTER": 1,
+    "MAX_CLIENTS": 10000,
+    "CLASSES": DEFAULT_CLASSES,
+}
+
+
+def get_admission_config():
+    """Return the ML_ADMISSION settings merged with defaults."""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "ML_ADMISSION", {}) or {})
+    classes = {name: dict(limits) for name, limits in DEFAULT_CLASSES.items()}
+    for name, limits in (config.get("CLASSES") or {}).items():
+        classes.setdefault(name, {}).update(limits)
+    config["CLASSES"] = classes
+    return config
+
+
+class TokenBucket:
+    """
+    Thread-safe token buckets, one per key.
+
+    Each key refills at ``rate`` tokens per second up to ``burst``. Idle keys
+    are forgotten once more than ``max_keys`` are tracked.
+    """
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key=None, now=None):
+        """Take one token. Returns 0 when admitted, else seconds until a token is due."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                if len(self._buckets) > self.max_keys:
+                    self._forget_idle(now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def _forget_idle(self, now):
+        if self.rate <= 0:
+            return
+        refill_time = self.burst / self.rate
+        for key, (_, last) in list(self._buckets.items()):
+            if now - last >= refill_time:
+                del self._buckets[key]
+
+
+class CostClass:
+    """Rate limits, concurrency limit and counters of one endpoint cost class."""
+
+    def __init__(self, name, limits, max_clients):
+        self.name = name
+        self.client_bucket = TokenBucket(limits["RATE"], limits["BURST"], max_keys=max_clients)
+        self.global_bucket = TokenBucket(limits["GLOBAL_RATE"], limits["GLOBAL_BURST"], max_keys=1)
+        self.max_concurrent = int(limits["MAX_CONCURRENT"])
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.counters = {"admitted": 0, "shed_client_rate": 0, "shed_global_rate": 0, "shed_concurrency": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def try_admit(self, client):
+        """Return None when admitted (a slot is held), else (status, reason, retry_after)."""
+        wait = self.client_bucket.take(client)
+        if wait:
+            self._count("shed_client_rate")
+            return status.HTTP_429_TOO_MANY_REQUESTS, "rate limit exceeded", wait
+
+        wait = self.global_bucket.take()
+        if wait:
+            self._count("shed_global_rate")
+            return status.HTTP_429_TOO_MANY_REQUESTS, "service busy", wait
+
+        if not self._slots.acquire(blocking=False):
+            self._count("shed_concurrency")
+            return status.HTTP_503_SERVICE_UNAVAILABLE, "too many predictions in progress", None
+
+        with self._lock:
+            self.counters["admitted"] += 1
+            self.in_flight += 1
+        return None
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+            in_flight = self.in_flight
+        shed = counters["shed_client_rate"] + counters["shed_global_rate"] + counters["shed_concurrency"]
+        total = shed + counters["admitted"]
+        return {
+            **counters,
+            "shed": shed,
+            "shed_ratio": round(shed / total, 4) if total else 0.0,
+            "in_flight": in_flight,
+            "max_concurrent": self.max_concurrent,
+        }
+
+
+class AdmissionController:
+    """Admission decisions for all cost classes, built from settings."""
+
+    def __init__(self, config=None):
+        config = config or get_admission_config()
+        self.enabled = bool(config["ENABLED"])
+        self.trust_forwarded = bool(config["TRUST_X_FORWARDED_FOR"])
+        self.retry_after = config["RETRY_AFTER"]
+        self.classes = {
+            name: CostClass(name, limits, config["MAX_CLIENTS"])
+            for name, limits in config["CLASSES"].items()
+        }
+
+    def client_key(self, request):
+        if self.trust_forwarded:
+            forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.META.get("REMOTE_ADDR", "")
+
+    def admit(self, cost_class, request):
+        """Return (CostClass or None, rejection response or None)."""
+        if not self.enabled:
+            return None, None
+        klass = self.classes[cost_class]
+        rejected = klass.try_admit(self.client_key(request))
+        if rejected is None:
+            return klass, None
+
+        code, reason, wait = rejected
+        if wait and math.isfinite(wait):
+            retry_after = max(1, math.ceil(wait))
+        else:
+            retry_after = self.retry_after
+        response = JsonResponse({"error": f"Request rejected: {reason}", "retry_after": retry_after}, status=code)
+        response["Retry-After"] = str(retry_after)
+        return None, response
+
+    def metrics(self):
+        return {
+            "enabled": self.enabled,
+            "classes": {name: klass.snapshot() for name, klass in self.classes.items()},
+        }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController()
+    return _controller
+
+
+def reset_admission():
+    """Drop all buckets and counters (rebuilt from settings on next use)."""
+    global _controller
+    with _controller_lock:
+        _controller = None
+
+
+def configure_admission(**overrides):
+    """Replace the controller with one built from settings plus `overrides` (e.g. ENABLED=False)."""
+    global _controller
+    config = get_admission_config()
+    config.update(overrides)
+    with _controller_lock:
+        _controller = AdmissionController(config)
+    return _controller
+
+
+def _on_setting_changed(setting, **kwargs):
+    if setting == "ML_ADMISSION":
+        reset_admission()
+
+
+setting_changed.connect(_on_setting_changed)
+
+
+def admission_metrics():
+    return get_controller().metrics()
+
+
+def admission_control(cost_class):
+    """
+    Decorate a sync or async view with admission control for `cost_class`.
+
+    Use below ``@api_view`` for DRF function views and through
+    ``method_decorator`` for class-based views.
+    """
+    if cost_class not in get_admission_config()["CLASSES"]:
+        raise ValueError(f"Unknown admission cost class: {cost_class}")
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapped(request, *args, **kwargs):
+                klass, rejection = get_controller().admit(cost_class, request)
+                if rejection is not None:
+                    return rejection
+                try:
+                    return await view(request, *args, **kwargs)
+                finally:
+                    if klass is not None:
+                        klass.release()
+        else:
+            @functools.wraps(view)
+            def wrapped(request, *args, **kwargs):
+                klass, rejection = get_controller().admit(cost_class, request)
+                if rejection is not None:
+                    return rejection
+                try:
+                    return view(request, *args, **kwargs)
+                finally:
+                    if klass is not None:
+                        klass.release()
+        return wrapped
+
+    return decorator
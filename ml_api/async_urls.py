@@ -0,0 +1,18 @@
+"""
+URLs for the async ML API (mounted at /api/ml/async/, see async_views).
+"""
+
+from django.urls import path
+from . import async_views
+
+urlpatterns = [
+    path("predict/yield/", async_views.yield_predict, name="async-yield-predict"),
+    path("yield/forecast/", async_views.yield_forecast, name="async-yield-forecast"),
+    path("predict/price/", async_views.price_predict, name="async-price-predict"),
+    path("price/forecast/", async_views.price_forecast, name="async-price-forecast"),
+    path("demand/forecast/", async_views.demand_forecast, name="async-demand-forecast"),
+    path("predict/demand/", async_views.demand_predict, name="async-demand-predict"),
+    path("explain/", async_views.prediction_explain, name="async-prediction-explain"),
+    path("flood/predict/", async_views.flood_predict, name="async-flood-predict"),
+    path("flood/predict/batch/", async_views.flood_predict_batch, name="async-flood-predict-batch"),
+]
@@ -0,0 +1,75 @@
+"""
+Async variants of the ML API endpoints, mounted under /api/ml/async/.
+
+Served from the ASGI application (smartagri_backend.asgi) these views keep
+the event loop free while a forecast runs: scoring is handed to a bounded
+thread pool and the PredictionHistory row is written with the async ORM.
+One worker process can therefore hold many slow forecasts in flight,
+while the sync endpoints tie up one worker thread each.
+
+The request/response contract is identical to the sync endpoints; both
+delegate to ml_api.services.
+"""
+
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework import status
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import services
+from .admission import admission_control
+
+# Scoring is CPU bound; more threads than cores only adds contention.
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "ML_ASYNC_WORKERS", None) or os.cpu_count() or 4,
+    thread_name_prefix="ml-score",
+)
+
+
+def _parse_body(request):
+    if not request.body:
+        return {}
+    data = json.loads(request.body)
+    if not isinstance(data, dict):
+        raise ValueError("JSON body must be an object")
+    return data
+
+
+def async_endpoint(service_fn, cost_class):
+    """Build an async POST view that runs service_fn off the event loop."""
+
+    @csrf_exempt
+    @require_POST
+    @admission_control(cost_class)
+    async def view(request):
+        try:
+            data = _parse_body(request)
+        except ValueError as e:
+            return JsonResponse({"error": f"Invalid JSON body: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(_executor, service_fn, data)
+        await services.asave_history(result.history)
+        return JsonResponse(result.payload, status=result.status, encoder=JSONEncoder, safe=False)
+
+    view.__name__ = f"async_{service_fn.__name__}"
+    view.__doc__ = service_fn.__doc__
+    return view
+
+
+yield_predict = async_endpoint(services.predict_yield, "light")
+yield_forecast = async_endpoint(services.forecast_yield, "forecast")
+price_predict = async_endpoint(services.predict_price, "light")
+price_forecast = async_endpoint(services.forecast_price, "forecast")
+demand_predict = async_endpoint(services.predict_demand, "heavy")
+demand_forecast = async_endpoint(services.forecast_demand, "heavy")
+prediction_explain = async_endpoint(services.explain_prediction, "forecast")
+flood_predict = async_endpoint(services.predict_flood, "light")
+flood_predict_batch = async_endpoint(services.predict_flood_batch, "heavy")
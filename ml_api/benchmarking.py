@@ -0,0 +1,263 @@
+"""
+Helpers for the ML API benchmark commands.
+
+Requests are driven either in-process straight into Django's WSGI or ASGI
+handler (no running server needed; measures the Django stack plus the
+models, not the network) or over HTTP against a local server.
+"""
+
+import asyncio
+import json
+import math
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import request_finished, request_started
+from django.test import RequestFactory
+
+BENCH_HOST = "localhost"
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (pct in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(math.ceil(pct / 100.0 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(latencies_ms, statuses, wall_seconds, peak_in_flight=None):
+    """Latency / throughput summary for one benchmark run."""
+    errors = sum(1 for code in statuses if code >= 500)
+    summary = {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "wall_s": round(wall_seconds, 3),
+        "rps": round(len(latencies_ms) / wall_seconds, 2) if wall_seconds else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "max_ms": round(max(latencies_ms), 2) if latencies_ms else 0.0,
+    }
+    if peak_in_flight is not None:
+        summary["peak_in_flight"] = peak_in_flight
+    return summary
+
+
+class InFlight:
+    """Counts concurrent requests and remembers the peak."""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def enter(self, **kwargs):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def exit(self, **kwargs):
+        with self._lock:
+            self.current -= 1
+
+
+@contextmanager
+def served_in_flight(handler_class):
+    """
+    Count requests inside Django's handler, from request_started to
+    request_finished, rather than requests the benchmark has sent.
+    """
+    in_flight = InFlight()
+    if handler_class is ASGIHandler:
+        # async receivers, so asend does not queue them on the sync thread
+        async def enter(**kwargs):
+            in_flight.enter()
+
+        async def exit(**kwargs):
+            in_flight.exit()
+    else:
+        enter, exit = in_flight.enter, in_flight.exit
+
+    request_started.connect(enter, sender=handler_class, weak=False)
+    request_finished.connect(exit, sender=handler_class, weak=False)
+    try:
+        yield in_flight
+    finally:
+        request_started.disconnect(enter, sender=handler_class)
+        request_finished.disconnect(exit, sender=handler_class)
+
+
+def run_wsgi(handler, method, path, payload, total, concurrency, server_threads=None):
+    """
+    Fire `total` requests at a WSGI handler from `concurrency` client threads.
+
+    server_threads caps how many requests the handler runs at once (the
+    thread count of the WSGI server being simulated); waiting for a free
+    server thread counts towards the request latency.
+    """
+    factory = RequestFactory(SERVER_NAME=BENCH_HOST)
+    body = json.dumps(payload or {})
+    server_slots = threading.BoundedSemaphore(server_threads or concurrency)
+    latencies, statuses = [], []
+
+    def one(_):
+        if method == "GET":
+            environ = factory.get(path, payload or {}).environ
+        else:
+            environ = factory.generic(method, path, body, content_type="application/json").environ
+        status_holder = {}
+
+        def start_response(status_line, headers, exc_info=None):
+            status_holder["code"] = int(status_line.split(" ", 1)[0])
+
+        started = time.perf_counter()
+        with server_slots:
+            response = handler(environ, start_response)
+            try:
+                for _ in response:
+                    pass
+            finally:
+                if hasattr(response, "close"):
+                    response.close()
+        return (time.perf_counter() - started) * 1000, status_holder.get("code", 0)
+
+    started = time.perf_counter()
+    with served_in_flight(WSGIHandler) as in_flight, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed, code in pool.map(one, range(total)):
+            latencies.append(elapsed)
+            statuses.append(code)
+    return summarize(latencies, statuses, time.perf_counter() - started, in_flight.peak)
+
+
+async def _asgi_request(app, method, path, body):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", BENCH_HOST.encode()),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": (BENCH_HOST, 80),
+    }
+    done = asyncio.Event()
+    sent_body = False
+    status_code = 0
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    await app(scope, receive, send)
+    done.set()
+    return status_code
+
+
+def run_asgi(app, method, path, payload, total, concurrency):
+    """Fire `total` requests at an ASGI app with up to `concurrency` in flight."""
+    body = json.dumps(payload or {}).encode()
+    latencies, statuses = [], []
+
+    async def main():
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with gate:
+                started = time.perf_counter()
+                code = await _asgi_request(app, method, path, body)
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses.append(code)
+
+        await asyncio.gather(*(one() for _ in range(total)))
+
+    started = time.perf_counter()
+    with served_in_flight(ASGIHandler) as in_flight:
+        asyncio.run(main())
+    return summarize(latencies, statuses, time.perf_counter() - started, in_flight.peak)
+
+
+def run_http(base_url, method, path, payload, total, concurrency, timeout=60):
+    """Fire `total` requests at a running server from `concurrency` client threads."""
+    url = base_url.rstrip("/") + path
+    body = json.dumps(payload or {}).encode()
+    in_flight = InFlight()
+    latencies, statuses = [], []
+
+    def one(_):
+        if method == "GET":
+            request = urllib.request.Request(url + "?" + urllib.parse.urlencode(payload or {}))
+        else:
+            request = urllib.request.Request(
+                url, data=body, method=method, headers={"Content-Type": "application/json"}
+            )
+        in_flight.enter()
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+                code = response.status
+        except urllib.error.HTTPError as e:
+            code = e.code
+        except (urllib.error.URLError, OSError):
+            code = 599
+        elapsed = (time.perf_counter() - started) * 1000
+        in_flight.exit()
+        return elapsed, code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed, code in pool.map(one, range(total)):
+            latencies.append(elapsed)
+            statuses.append(code)
+    return summarize(latencies, statuses, time.perf_counter() - started, in_flight.peak)
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Compare scenario results with a stored baseline.
+
+    A scenario regresses when its p95 latency grows, or its throughput
+    drops, by more than `tolerance` (a fraction), or when it starts failing.
+
+    Returns a list of human-readable regression messages.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current["errors"] > previous.get("errors", 0):
+            regressions.append(f"{name}: errors {previous.get('errors', 0)} -> {current['errors']}")
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+        if previous["rps"] and current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+    return regressions
@@ -0,0 +1,80 @@
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+import json
+
+from ml_api.admission import configure_admission
+from ml_api.benchmarking import run_asgi, run_wsgi
+
+# endpoint name -> (sync path, async path, default payload)
+ENDPOINTS = {
+    "price-forecast": ("/api/ml/price/forecast/", "/api/ml/async/price/forecast/",
+                       {"crop_type": "Tomato", "forecast_days": 7}),
+    "price-predict": ("/api/ml/predict/price/", "/api/ml/async/predict/price/",
+                      {"crop_type": "Tomato", "season": "Yala", "supply": 100, "demand": 100, "market_trend": "Stable"}),
+    "demand-forecast": ("/api/ml/demand/forecast/", "/api/ml/async/demand/forecast/",
+                        {"crop_type": "Cabbage", "forecast_days": 20}),
+    "yield-forecast": ("/api/ml/yield/forecast/", "/api/ml/async/yield/forecast/",
+                       {"crop_type": "Tomato", "months": 6}),
+    "flood-predict": ("/api/ml/flood/predict/", "/api/ml/async/flood/predict/", {}),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare how many concurrent forecast requests the sync (WSGI) and "
+        "async (ASGI) ML endpoints can hold in flight, in-process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="price-forecast")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per run")
+        parser.add_argument("--concurrency", type=int, default=50, help="Concurrent clients")
+        parser.add_argument("--wsgi-threads", type=int, default=4,
+                            help="Worker threads of the WSGI server being simulated")
+        parser.add_argument("--payload", type=str, default=None, help="JSON body override")
+        parser.add_argument("--with-admission", action="store_true",
+                            help="Keep ML admission control on (in-process runs disable it by default)")
+
+    def handle(self, *args, **opts):
+        sync_path, async_path, payload = ENDPOINTS[opts["endpoint"]]
+        if opts["payload"]:
+            try:
+                payload = json.loads(opts["payload"])
+            except ValueError as e:
+                raise CommandError(f"--payload is not valid JSON: {e}")
+
+        total = opts["requests"]
+        concurrency = opts["concurrency"]
+        wsgi_threads = opts["wsgi_threads"]
+
+        if not opts["with_admission"]:
+            configure_admission(ENABLED=False)
+
+        wsgi_app = get_wsgi_application()
+        asgi_app = get_asgi_application()
+
+        # Warm up: load/train the models outside the measured runs
+        self.stdout.write("Warming up models...")
+        run_wsgi(wsgi_app, "POST", sync_path, payload, 1, 1)
+        run_asgi(asgi_app, "POST", async_path, payload, 1, 1)
+
+        self.stdout.write(f"WSGI: {total} requests, {concurrency} clients, {wsgi_threads} worker threads")
+        wsgi = run_wsgi(wsgi_app, "POST", sync_path, payload, total, concurrency, server_threads=wsgi_threads)
+
+        self.stdout.write(f"ASGI: {total} requests, {concurrency} clients, one event loop")
+        asgi = run_asgi(asgi_app, "POST", async_path, payload, total, concurrency)
+
+        header = f"{'':6} {'in-flight':>9} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>6}"
+        self.stdout.write(header)
+        for name, row in (("WSGI", wsgi), ("ASGI", asgi)):
+            self.stdout.write(
+                f"{name:6} {row['peak_in_flight']:>9} {row['rps']:>8} {row['p50_ms']:>9} "
+                f"{row['p95_ms']:>9} {row['p99_ms']:>9} {row['errors']:>6}"
+            )
+
+        # in-flight is measured inside Django's handler, not at the client
+        self.stdout.write(self.style.SUCCESS(
+            f"Peak requests inside the handler: ASGI {asgi['peak_in_flight']}, WSGI {wsgi['peak_in_flight']} "
+            f"({concurrency} clients, {wsgi_threads} WSGI threads)."
+        ))
@@ -0,0 +1,160 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+import json
+import os
+import platform
+import time
+
+from ml_api.admission import configure_admission
+from ml_api.benchmarking import compare_to_baseline, run_http, run_wsgi
+
+# scenario name -> (path, payload)
+SCENARIOS = {
+    "yield-predict": ("/api/ml/predict/yield/",
+                      {"crop_type": "Tomato", "rainfall": 150, "temperature": 28, "soil_quality": "good",
+                       "fertilizer": 50, "irrigation": True}),
+    "yield-forecast": ("/api/ml/yield/forecast/", {"crop_type": "Tomato", "months": 6}),
+    "price-predict": ("/api/ml/predict/price/",
+                      {"crop_type": "Tomato", "season": "Yala", "supply": 100, "demand": 100, "market_trend": "Stable"}),
+    "price-forecast": ("/api/ml/price/forecast/", {"crop_type": "Tomato", "forecast_days": 7}),
+    "demand-predict": ("/api/ml/predict/demand/",
+                       {"crop_type": "Cabbage", "season": "Yala", "historical_demand": 1000, "population": 50000,
+                        "consumption_trend": "Stable"}),
+    "demand-forecast": ("/api/ml/demand/forecast/", {"crop_type": "Cabbage", "forecast_days": 20}),
+    "flood-predict": ("/api/ml/flood/predict/", {"district": "Colombo", "rainfall_7d": 120}),
+    "flood-predict-batch": ("/api/ml/flood/predict/batch/",
+                            {"locations": [{"district": "Colombo"}, {"district": "Gampaha"}, {"district": "Kalutara"}]}),
+}
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, "benchmarks", "ml_api_baseline.json")
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the ML prediction, forecast and flood endpoints, report "
+        "p50/p95/p99 latency and requests per second, and fail when a scenario "
+        "regresses against the stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                            help="Scenario to run (repeatable, default: all)")
+        parser.add_argument("--requests", type=int, default=100, help="Requests per scenario")
+        parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+        parser.add_argument("--base-url", type=str, default=None,
+                            help="Benchmark a running server (e.g. http://127.0.0.1:8000) instead of in-process")
+        parser.add_argument("--baseline", type=str, default=DEFAULT_BASELINE, help="Baseline JSON file")
+        parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="Allowed p95 growth / rps drop as a fraction (default 0.25)")
+        parser.add_argument("--update-baseline", action="store_true",
+                            help="Write this run's results as the new baseline")
+        parser.add_argument("--output", type=str, default=None, help="Also write the results to this JSON file")
+        parser.add_argument("--with-admission", action="store_true",
+                            help="Keep ML admission control on (in-process runs disable it by default)")
+
+    def handle(self, *args, **opts):
+        if opts["requests"] < 1 or opts["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be positive")
+
+        names = opts["scenario"] or list(SCENARIOS)
+        total = opts["requests"]
+        concurrency = opts["concurrency"]
+        base_url = opts["base_url"]
+
+        if base_url:
+            def run(path, payload, count, clients):
+                return run_http(base_url, "POST", path, payload, count, clients)
+            target = base_url
+        else:
+            app = get_wsgi_application()
+            if not opts["with_admission"]:
+                configure_admission(ENABLED=False)
+
+            def run(path, payload, count, clients):
+                return run_wsgi(app, "POST", path, payload, count, clients)
+            target = "in-process WSGI"
+
+        self.stdout.write(f"Benchmarking {len(names)} scenarios against {target}: "
+                          f"{total} requests, {concurrency} clients each")
+
+        results, unavailable = {}, []
+        for name in names:
+            path, payload = SCENARIOS[name]
+            # Warm up: load/train the model outside the measured run
+            warmup = run(path, payload, 1, 1)
+            if warmup["errors"]:
+                self.stdout.write(self.style.WARNING(f"{name}: endpoint failing during warm-up, skipped"))
+                unavailable.append(name)
+                continue
+            results[name] = run(path, payload, total, concurrency)
+
+        self._print_table(results)
+
+        report = {
+            "meta": {
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "target": "http" if base_url else "wsgi",
+                "requests": total,
+                "concurrency": concurrency,
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+            },
+            "scenarios": results,
+        }
+        if opts["output"]:
+            self._write(opts["output"], report)
+
+        baseline_path = opts["baseline"]
+        if opts["update_baseline"]:
+            self._write(baseline_path, report)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {baseline_path}"))
+            return
+
+        if not os.path.exists(baseline_path):
+            self.stdout.write(self.style.WARNING(
+                f"No baseline at {baseline_path}; run with --update-baseline to record one."
+            ))
+            return
+
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+        meta = baseline.get("meta", {})
+        if (meta.get("requests"), meta.get("concurrency"), meta.get("target")) != (
+            total, concurrency, report["meta"]["target"]
+        ):
+            self.stdout.write(self.style.WARNING(
+                "Baseline was recorded with different settings "
+                f"({meta.get('target')}, {meta.get('requests')} requests, {meta.get('concurrency')} clients); "
+                "comparison may be misleading."
+            ))
+
+        previous = baseline.get("scenarios", {})
+        regressions = compare_to_baseline(results, previous, opts["tolerance"])
+        regressions += [f"{name}: endpoint failing" for name in unavailable if name in previous]
+
+        if regressions:
+            for line in regressions:
+                self.stderr.write(f"  {line}")
+            raise CommandError(f"{len(regressions)} regression(s) against {baseline_path}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"No regressions against baseline (tolerance {opts['tolerance']:.0%})"
+        ))
+
+    def _print_table(self, results):
+        self.stdout.write(
+            f"{'scenario':22} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>6}"
+        )
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:22} {row['rps']:>8} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+                f"{row['p99_ms']:>9} {row['max_ms']:>9} {row['errors']:>6}"
+            )
+
+    def _write(self, path, report):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
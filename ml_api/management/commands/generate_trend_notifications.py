@@ -1,18 +1,27 @@
 from django.core.management.base import BaseCommand
-from django.contrib.auth import get_user_model
-from datetime import datetime, date, timedelta
+from django.db import connection, transaction
+from django.utils import timezone
+from contextlib import contextmanager
+from datetime import datetime, date, time as dt_time, timedelta
 import pandas as pd
 import os
+import time
 
-from ml_api.models import TrendAlert
+from ml_api.models import TrendAlert, TrendWatermark
+from alerts.bus import publish_alerts
+from alerts.feed import invalidate_feed
+from alerts.inbox import fill_inboxes
 from alerts.models import Alert
+from notifications_app.fanout import fan_out, price_alert_recipients
 
 from ml_models.predictors.price_predictor import PricePredictor
 
-User = get_user_model()
-
 PRICE_THRESHOLD = 15.0   # % change to trigger alert
 
+# TrendAlert's unique constraint (uniq_trend_alert)
+TREND_KEY = ("product", "metric", "forecast_date", "direction")
+TREND_UPDATE_FIELDS = ["predicted_value", "baseline_value", "change_pct", "severity", "reason"]
+
 def severity_from_change(abs_pct: float) -> str:
     if abs_pct >= 30:
         return "HIGH"
@@ -21,122 +30,246 @@ def severity_from_change(abs_pct: float) -> str:
     return "LOW"
 
 class Command(BaseCommand):
-    help = "Generate PRICE trend alerts and notify all farmers."
+    help = "Generate PRICE trend alerts and notify farmers who opted in to price alerts."
 
     def add_arguments(self, parser):
         parser.add_argument("--days", type=int, default=7, help="Forecast days ahead")
         parser.add_argument("--baseline-days", type=int, default=7, help="Baseline window (days)")
         parser.add_argument("--product", type=str, default=None, help="Run for only one product")
+        parser.add_argument("--full", action="store_true",
+                            help="Re-forecast every product, ignoring the per-product watermarks")
+        parser.add_argument("--skip-fanout", action="store_true",
+                            help="Create the alerts without per-user notifications")
 
     def handle(self, *args, **opts):
         days_ahead = opts["days"]
         baseline_days = opts["baseline_days"]
         only_product = opts["product"]
+        full = opts["full"]
+        options = f"days={days_ahead};baseline_days={baseline_days}"
+        self.timings = {}
 
-        # 1) farmers (edit if you have role field)
-        farmers = User.objects.filter(is_staff=False, is_superuser=False)
+        with self._phase("load"):
+            # Load predictor (auto-trains already in __init__)
+            predictor = PricePredictor(auto_train=True)
 
-        # 2) Load predictor (auto-trains already in __init__)
-        predictor = PricePredictor(auto_train=True)
+            # Load dataset once for baselines and forecast history
+            dataset_path = predictor.DEFAULT_DATASET_PATH
+            if not os.path.exists(dataset_path):
+                self.stdout.write(self.style.ERROR(f"Dataset not found: {dataset_path}"))
+                return
 
-        # 3) Load dataset once for baselines
-        dataset_path = predictor.DEFAULT_DATASET_PATH
-        if not os.path.exists(dataset_path):
-            self.stdout.write(self.style.ERROR(f"Dataset not found: {dataset_path}"))
-            return
-
-        df = pd.read_csv(dataset_path)
-        df["Date"] = pd.to_datetime(df["Date"])
-        df["Product_lower"] = df["Product"].str.lower()
+            df = pd.read_csv(dataset_path)
+            df["Date"] = pd.to_datetime(df["Date"])
+            df["Product_lower"] = df["Product"].str.lower()
 
         products = predictor.products
         if only_product:
             products = [only_product]
 
-        alerts_created = 0
+        with self._phase("baselines"):
+            baselines = self._baseline_prices(df, baseline_days)
+            # If no baseline found, skip the product
+            products = [p for p in products if baselines.get(p.lower())]
+
+        start_date = datetime.now()
+        model_version = predictor.model_version or ""
+        with self._phase("watermarks"):
+            source_dates = {
+                product: value.date() for product, value in df.groupby("Product_lower")["Date"].max().items()
+            }
+            skipped = 0
+            if not full:
+                changed = self._changed_products(
+                    products, source_dates, model_version, options, start_date.date()
+                )
+                skipped = len(products) - len(changed)
+                products = changed
+
+        with self._phase("forecast"):
+            history = predictor.recent_prices(start_date, num_days=30, df=df)
+            forecasts = predictor.predict_future_batch(
+                products, days_ahead=days_ahead, start_date=start_date, history=history
+            )
+
+        with self._phase("alerts"):
+            candidates = []
+            for product in products:
+                baseline = baselines[product.lower()]
+                for f in forecasts[product]:
+                    trend = self._trend_alert(product, f, baseline, baseline_days)
+                    if trend is not None:
+                        candidates.append(trend)
+            with transaction.atomic():
+                alerts = self._write_alerts(candidates, baseline_days)
+                self._save_watermarks(
+                    products, source_dates, model_version, options, start_date.date(), days_ahead
+                )
+
         notifications_created = 0
+        if alerts and not opts["skip_fanout"]:
+            with self._phase("fanout"):
+                notifications_created, seconds = fan_out(
+                    price_alert_recipients(),
+                    [(alert.title, alert.message) for alert in alerts],
+                    notification_type="PRICE_ALERT",
+                )
+                inboxed = fill_inboxes([alert.id for alert in alerts], price_alert_recipients())
+            rate = notifications_created / seconds if seconds else 0
+            self.stdout.write(
+                f"Fan-out: {notifications_created} notifications in {seconds:.2f}s ({rate:.0f} rows/s), "
+                f"{inboxed} inbox rows"
+            )
 
-        for product in products:
-            baseline = self._baseline_price(df, product, baseline_days)
-            if baseline is None or baseline == 0:
-                # If no baseline found, skip (or set baseline from last available row)
-                continue
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. Products recomputed: {len(products)}, skipped (unchanged): {skipped}, "
+            f"Flagged days: {len(candidates)}, Alerts: {len(alerts)}, Notifications: {notifications_created}"
+        ))
+        self.stdout.write("Timings: " + ", ".join(
+            f"{name} {seconds:.2f}s" for name, seconds in self.timings.items()
+        ) + f" (total {sum(self.timings.values()):.2f}s)")
 
-            forecasts = predictor.predict_future(product=product, days_ahead=days_ahead)
-            for f in forecasts:
-                f_date = date.fromisoformat(f["date"])
-                pred_val = float(f["predicted_price"])
+    @contextmanager
+    def _phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - started
 
-                change_pct = ((pred_val - baseline) / baseline) * 100.0
-                if abs(change_pct) < PRICE_THRESHOLD:
-                    continue
+    def _baseline_prices(self, df: pd.DataFrame, baseline_days: int):
+        """Mean Pettah_Wholesale of each product's latest baseline_days records, keyed by lower-cased name."""
+        # baseline on Pettah_Wholesale (same as predictor target)
+        if "Pettah_Wholesale" not in df.columns:
+            return {}
+
+        latest = df.sort_values("Date").groupby("Product_lower").tail(baseline_days)
+        means = latest.groupby("Product_lower")["Pettah_Wholesale"].mean()
+        return {product: float(value) for product, value in means.items()}
 
-                direction = "UP" if change_pct > 0 else "DOWN"
-                sev = severity_from_change(abs(change_pct))
-                reason = f"Predicted price {direction} by {change_pct:.1f}% vs last {baseline_days}d avg"
+    def _changed_products(self, products, source_dates, model_version, options, today):
+        """Products whose inputs changed since their watermark, or whose last forecast window ran out."""
+        watermarks = {
+            w.product: w for w in TrendWatermark.objects.filter(metric="PRICE", product__in=products)
+        }
+        changed = []
+        for product in products:
+            w = watermarks.get(product)
+            if (
+                w is None
+                or w.source_date != source_dates.get(product.lower())
+                or w.model_version != model_version
+                or w.options != options
+                or today >= w.forecast_start + timedelta(days=w.forecast_days)
+            ):
+                changed.append(product)
+        return changed
 
-                alert, created = TrendAlert.objects.get_or_create(
+    def _save_watermarks(self, products, source_dates, model_version, options, forecast_start, forecast_days):
+        unique_fields = ("product", "metric") if connection.features.supports_update_conflicts_with_target else None
+        TrendWatermark.objects.bulk_create(
+            [
+                TrendWatermark(
                     product=product,
                     metric="PRICE",
-                    forecast_date=f_date,
-                    direction=direction,
-                    defaults={
-                        "predicted_value": pred_val,
-                        "baseline_value": baseline,
-                        "change_pct": change_pct,
-                        "severity": sev,
-                        "reason": reason,
-                        "status": "NEW",
-                    }
+                    source_date=source_dates[product.lower()],
+                    model_version=model_version,
+                    options=options,
+                    forecast_start=forecast_start,
+                    forecast_days=forecast_days,
                 )
+                for product in products
+            ],
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=["source_date", "model_version", "options", "forecast_start", "forecast_days", "updated_at"],
+            batch_size=500,
+        )
 
-                if not created:
-                    continue
+    def _trend_alert(self, product, forecast, baseline, baseline_days):
+        """Unsaved TrendAlert for a forecast day that moves past PRICE_THRESHOLD, else None."""
+        pred_val = float(forecast["predicted_price"])
 
-                alerts_created += 1
+        change_pct = ((pred_val - baseline) / baseline) * 100.0
+        if abs(change_pct) < PRICE_THRESHOLD:
+            return None
 
-                title = f"PRICE {direction} Alert ({sev})"
-                message = (
-                    f"{product}: Forecast price on {f_date} is Rs {pred_val:.2f}. "
-                    f"Baseline (last {baseline_days} days avg): Rs {baseline:.2f}. "
-                    f"Change: {change_pct:.1f}%. {reason}."
-                )
+        direction = "UP" if change_pct > 0 else "DOWN"
+        return TrendAlert(
+            product=product,
+            metric="PRICE",
+            forecast_date=date.fromisoformat(forecast["date"]),
+            direction=direction,
+            predicted_value=pred_val,
+            baseline_value=baseline,
+            change_pct=change_pct,
+            severity=severity_from_change(abs(change_pct)),
+            reason=f"Predicted price {direction} by {change_pct:.1f}% vs last {baseline_days}d avg",
+            status="NOTIFIED",
+        )
 
-                final_alerts = []
-
-                Alert.objects.create(
-                    crop_name=product,
-                    category="MARKET",
-                    alert_type="PRICE_ALERT",
-                    message=message,
-                    scheduled_for=f_date,
-                    status="SENT",
-                    title=title,
-                    url="",
-                    level=sev,
-                )
+    def _write_alerts(self, candidates, baseline_days):
+        """
+        Upsert the trend alerts and create one Alert per new trend, in one transaction.
 
-                Alert.objects.bulk_create(final_alerts, batch_size=1000)
-                notifications_created += len(final_alerts)
+        Existing trends get their forecast values refreshed but keep their
+        status and are not announced again. Returns the new Alerts.
+        """
+        if not candidates:
+            return []
 
-                alert.status = "NOTIFIED"
-                alert.save(update_fields=["status"])
+        key = lambda obj: tuple(getattr(obj, field) for field in TREND_KEY)
 
-        self.stdout.write(self.style.SUCCESS(
-            f"Done. Alerts: {alerts_created}, Notifications: {notifications_created}"
-        ))
+        with transaction.atomic():
+            existing = set(
+                TrendAlert.objects.filter(
+                    metric="PRICE",
+                    product__in={c.product for c in candidates},
+                    forecast_date__in={c.forecast_date for c in candidates},
+                ).values_list(*TREND_KEY)
+            )
+            new_trends = [c for c in candidates if key(c) not in existing]
 
-    def _baseline_price(self, df: pd.DataFrame, product: str, baseline_days: int):
-        pl = product.lower()
-        p_df = df[df["Product_lower"] == pl].sort_values("Date")
+            # MySQL upserts on any unique key and rejects an explicit conflict target
+            unique_fields = TREND_KEY if connection.features.supports_update_conflicts_with_target else None
+            TrendAlert.objects.bulk_create(
+                candidates,
+                update_conflicts=True,
+                unique_fields=unique_fields,
+                update_fields=TREND_UPDATE_FIELDS,
+                batch_size=500,
+            )
 
-        if p_df.empty:
-            return None
+            last_id = Alert.objects.order_by("-id").values_list("id", flat=True).first() or 0
+            alerts = Alert.objects.bulk_create(
+                [self._market_alert(trend, baseline_days) for trend in new_trends],
+                batch_size=1000,
+            )
+            if alerts and alerts[0].id is None:
+                # MySQL does not return ids from bulk inserts; inboxes and streams need them
+                alerts = list(Alert.objects.filter(id__gt=last_id, alert_type="PRICE_ALERT").order_by("id"))
+            if alerts:
+                # bulk_create bypasses post_save
+                transaction.on_commit(invalidate_feed)
+                transaction.on_commit(lambda: publish_alerts([a.id for a in alerts]))
 
-        # take latest baseline_days records
-        last_rows = p_df.tail(baseline_days)
-        # baseline on Pettah_Wholesale (same as predictor target)
-        if "Pettah_Wholesale" not in last_rows.columns:
-            return None
+        return alerts
 
-        return float(last_rows["Pettah_Wholesale"].mean())
+    def _market_alert(self, trend, baseline_days):
+        title = f"PRICE {trend.direction} Alert ({trend.severity})"
+        message = (
+            f"{trend.product}: Forecast price on {trend.forecast_date} is Rs {trend.predicted_value:.2f}. "
+            f"Baseline (last {baseline_days} days avg): Rs {trend.baseline_value:.2f}. "
+            f"Change: {trend.change_pct:.1f}%. {trend.reason}."
+        )
+        return Alert(
+            crop_name=trend.product,
+            category="MARKET",
+            alert_type="PRICE_ALERT",
+            message=message,
+            scheduled_for=timezone.make_aware(datetime.combine(trend.forecast_date, dt_time.min)),
+            status="SENT",
+            title=title,
+            url="",
+            level=trend.severity,
+        )
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:33
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_trend_alerts(apps, schema_editor):
+    """Keep the oldest row of each key so the unique constraint can be added."""
+    TrendAlert = apps.get_model("ml_api", "TrendAlert")
+    keys = ("product", "metric", "forecast_date", "direction")
+    keep = (
+        TrendAlert.objects.values(*keys)
+        .annotate(keep_id=Min("id"))
+        .values_list("keep_id", flat=True)
+    )
+    TrendAlert.objects.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_trend_alerts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='trendalert',
+            constraint=models.UniqueConstraint(fields=('product', 'metric', 'forecast_date', 'direction'), name='uniq_trend_alert'),
+        ),
+    ]
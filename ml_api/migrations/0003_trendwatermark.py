@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_api', '0002_trendalert_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product', models.CharField(max_length=100)),
+                ('metric', models.CharField(choices=[('PRICE', 'Price'), ('DEMAND', 'Demand'), ('YIELD', 'Yield')], default='PRICE', max_length=10)),
+                ('source_date', models.DateField()),
+                ('model_version', models.CharField(blank=True, default='', max_length=40)),
+                ('options', models.CharField(max_length=100)),
+                ('forecast_start', models.DateField()),
+                ('forecast_days', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'metric'), name='uniq_trend_watermark')],
+            },
+        ),
+    ]
@@ -80,6 +80,38 @@ class TrendAlert(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="NEW")
     created_at = models.DateTimeField(auto_now_add=True)
 
-class Meta:
-    unique_together = (("product", "metric", "forecast_date", "direction"),)
+    class Meta:
+        # One alert per product/metric/day/direction; generate_trend_notifications upserts on it
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "metric", "forecast_date", "direction"],
+                name="uniq_trend_alert",
+            ),
+        ]
+
 
+class TrendWatermark(models.Model):
+    """
+    Inputs of the last trend-alert run for a product.
+
+    generate_trend_notifications skips a product while its latest price
+    date, the model version and the run options are unchanged and the
+    previous forecast window has not run out.
+    """
+
+    product = models.CharField(max_length=100)
+    metric = models.CharField(max_length=10, choices=TrendAlert.METRIC_CHOICES, default="PRICE")
+    source_date = models.DateField()
+    model_version = models.CharField(max_length=40, blank=True, default="")
+    options = models.CharField(max_length=100)
+    forecast_start = models.DateField()
+    forecast_days = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "metric"], name="uniq_trend_watermark"),
+        ]
+
+    def __str__(self):
+        return f"{self.product} {self.metric} @ {self.source_date} ({self.model_version})"
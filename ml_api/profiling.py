@@ -0,0 +1,240 @@
+"""
+On-demand request profiling for the ML API.
+
+``RequestProfilingMiddleware`` runs cProfile around a request when either
+the caller sends the admin profiling header (``X-Profile: <token>``) or the
+request is picked by the configured sampling rate. Every SQL query executed
+while the view runs is timed as well. The profile (``.prof``, readable with
+``pstats``/snakeviz) and a JSON summary are written to
+``REQUEST_PROFILING["OUTPUT_DIR"]`` and can be fetched by staff through
+``/api/ml/profiles/``.
+
+When no token and no sample rate are configured the middleware removes
+itself from the stack at startup, so it costs nothing.
+
+Only one request per process is profiled at a time (since Python 3.12 a
+second active cProfile raises ValueError); a request selected while
+another is being profiled runs unprofiled.
+"""
+
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from ml_models.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+PROFILE_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+_profiling_lock = threading.Lock()
+
+DEFAULTS = {
+    "TOKEN": "",
+    "SAMPLE_RATE": 0.0,
+    "PATH_PREFIXES": ["/api/ml/"],
+    "OUTPUT_DIR": os.path.join(settings.BASE_DIR, "profiles"),
+    "MAX_ARTIFACTS": 200,
+    "TOP_FUNCTIONS": 30,
+    "TOP_QUERIES": 20,
+}
+
+
+def get_profiling_config():
+    """Return the REQUEST_PROFILING settings merged with defaults."""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "REQUEST_PROFILING", {}) or {})
+    return config
+
+
+class QueryRecorder:
+    """``execute_wrapper`` hook that times every SQL statement."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                "sql": sql,
+                "time_ms": round((time.perf_counter() - start) * 1000, 3),
+                "many": many,
+            })
+
+    @property
+    def total_ms(self):
+        return round(sum(q["time_ms"] for q in self.queries), 3)
+
+
+class RequestProfilingMiddleware:
+    """Profile selected requests with cProfile and record their SQL."""
+
+    def __init__(self, get_response):
+        config = get_profiling_config()
+        if not config["TOKEN"] and float(config["SAMPLE_RATE"] or 0) <= 0:
+            raise MiddlewareNotUsed("Request profiling disabled")
+
+        self.get_response = get_response
+        self.token = config["TOKEN"]
+        self.sample_rate = float(config["SAMPLE_RATE"] or 0)
+        self.path_prefixes = tuple(config["PATH_PREFIXES"] or ("/",))
+        self.output_dir = str(config["OUTPUT_DIR"])
+        self.max_artifacts = int(config["MAX_ARTIFACTS"])
+        self.top_functions = int(config["TOP_FUNCTIONS"])
+        self.top_queries = int(config["TOP_QUERIES"])
+
+    def __call__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None or not _profiling_lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self._profile(request, trigger)
+        finally:
+            _profiling_lock.release()
+
+    def _trigger(self, request):
+        if not request.path.startswith(self.path_prefixes):
+            return None
+
+        header = request.META.get(PROFILE_HEADER)
+        if header is not None:
+            if self.token and hmac.compare_digest(header, self.token):
+                return "header"
+            return None
+
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    def _profile(self, request, trigger):
+        recorder = QueryRecorder()
+        profiler = cProfile.Profile()
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(recorder))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration_ms = round((time.perf_counter() - started) * 1000, 3)
+
+        try:
+            profile_id = self._write_artifacts(
+                request, response, trigger, profiler, recorder, duration_ms
+            )
+            response["X-Profile-Id"] = profile_id
+        except Exception as e:
+            logger.error(f"Could not store request profile: {str(e)}", exc_info=True)
+
+        return response
+
+    def _write_artifacts(self, request, response, trigger, profiler, recorder, duration_ms):
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", request.path).strip("-")[:60] or "root"
+        profile_id = "{}-{}-{}-{}".format(
+            time.strftime("%Y%m%d%H%M%S"), request.method.lower(), slug, uuid.uuid4().hex[:8]
+        )
+
+        profiler.dump_stats(os.path.join(self.output_dir, f"{profile_id}.prof"))
+
+        stats_stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stats_stream)
+        stats.sort_stats("cumulative").print_stats(self.top_functions)
+
+        slowest = sorted(recorder.queries, key=lambda q: q["time_ms"], reverse=True)
+        summary = {
+            "id": profile_id,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "trigger": trigger,
+            "method": request.method,
+            "path": request.path,
+            "query_string": request.META.get("QUERY_STRING", ""),
+            "status_code": getattr(response, "status_code", None),
+            "duration_ms": duration_ms,
+            "sql": {
+                "count": len(recorder.queries),
+                "total_ms": recorder.total_ms,
+                "slowest": slowest[:self.top_queries],
+            },
+            "top_functions": stats_stream.getvalue(),
+        }
+        with open(os.path.join(self.output_dir, f"{profile_id}.json"), "w") as f:
+            json.dump(summary, f, indent=2, default=str)
+
+        self._prune()
+        logger.info(
+            f"Profiled {request.method} {request.path} ({trigger}): "
+            f"{duration_ms:.1f} ms, {len(recorder.queries)} queries -> {profile_id}"
+        )
+        return profile_id
+
+    def _prune(self):
+        """Keep only the newest MAX_ARTIFACTS profiles on disk."""
+        summaries = sorted(
+            name for name in os.listdir(self.output_dir) if name.endswith(".json")
+        )
+        for name in summaries[:max(len(summaries) - self.max_artifacts, 0)]:
+            base = name[:-len(".json")]
+            for ext in (".json", ".prof"):
+                try:
+                    os.remove(os.path.join(self.output_dir, base + ext))
+                except FileNotFoundError:
+                    pass
+
+
+def list_profiles(limit=50):
+    """Return stored profile summaries, newest first (without function stats)."""
+    output_dir = str(get_profiling_config()["OUTPUT_DIR"])
+    if not os.path.isdir(output_dir):
+        return []
+
+    names = sorted(
+        (name for name in os.listdir(output_dir) if name.endswith(".json")),
+        reverse=True,
+    )[:limit]
+
+    profiles = []
+    for name in names:
+        summary = load_profile_summary(name[:-len(".json")])
+        if summary is None:
+            continue
+        summary.pop("top_functions", None)
+        summary["sql"].pop("slowest", None)
+        profiles.append(summary)
+    return profiles
+
+
+def profile_path(profile_id, ext):
+    """Absolute path of a stored artifact, or None for an invalid id."""
+    if not PROFILE_ID_RE.match(profile_id or ""):
+        return None
+    return os.path.join(str(get_profiling_config()["OUTPUT_DIR"]), f"{profile_id}{ext}")
+
+
+def load_profile_summary(profile_id):
+    path = profile_path(profile_id, ".json")
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,709 @@
+"""
+Scoring logic shared by the sync (DRF) and async ML API views.
+
+Every function takes the request payload as a plain dict and returns a
+ServiceResult: the response body, the HTTP status and an optional
+PredictionHistory row to store. None of them touch the database, so the
+async views can run them on a worker thread and save the history row with
+the async ORM.
+"""
+
+import os
+from collections import namedtuple
+
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework import status
+
+from .models import PredictionHistory
+from .serializers import (
+    YieldPredictionRequestSerializer,
+    PricePredictionRequestSerializer,
+    DemandPredictionRequestSerializer,
+    FloodPredictionInputSerializer,
+    BatchFloodPredictionInputSerializer,
+)
+
+from ml_models.predictors import YieldPredictor, PricePredictor, DemandPredictor
+from ml_models.utils.logger import setup_logger
+from ml_models.utils.tree_attributions import TreePathExplainer, group_contributions
+
+try:
+    from ml_models.predictors.flood_predictor import get_predictor
+except ImportError:
+    get_predictor = None
+
+logger = setup_logger(__name__)
+
+ServiceResult = namedtuple("ServiceResult", ["payload", "status", "history"])
+
+
+def _ok(payload, history=None):
+    return ServiceResult(payload, status.HTTP_200_OK, history)
+
+
+def _error(message, code):
+    return ServiceResult({"error": message}, code, None)
+
+
+def save_history(history):
+    """Store a PredictionHistory row; history is optional so failures are ignored."""
+    if not history:
+        return
+    try:
+        PredictionHistory.objects.create(**history)
+    except Exception:
+        pass
+
+
+async def asave_history(history):
+    """Async counterpart of save_history()."""
+    if not history:
+        return
+    try:
+        await PredictionHistory.objects.acreate(**history)
+    except Exception:
+        pass
+
+
+# Cache predictors as singletons to avoid reloading on every request
+_price_predictor = None
+_demand_predictor = None
+_yield_predictor = None
+
+
+def get_price_predictor():
+    global _price_predictor
+    if _price_predictor is None:
+        logger.info("Initializing Price Predictor (singleton)...")
+        _price_predictor = PricePredictor()
+    return _price_predictor
+
+
+def get_demand_predictor():
+    global _demand_predictor
+    if _demand_predictor is None:
+        logger.info("Initializing Demand Predictor (singleton)...")
+        _demand_predictor = DemandPredictor()
+        # If your DemandPredictor supports .load() (from the code I gave), load it once
+        if hasattr(_demand_predictor, "load"):
+            _demand_predictor.load()
+    return _demand_predictor
+
+
+def get_yield_predictor():
+    global _yield_predictor
+    if _yield_predictor is None:
+        logger.info("Initializing Yield Predictor (singleton)...")
+        _yield_predictor = YieldPredictor()
+    return _yield_predictor
+
+
+def demand_dataset_path():
+    return os.path.join(settings.BASE_DIR, "data", "demand_dataset.xlsx")
+
+
+def predict_yield(data):
+    """Predict crop yield."""
+    serializer = YieldPredictionRequestSerializer(data=data)
+    if not serializer.is_valid():
+        logger.error(f"Yield prediction validation error: {serializer.errors}")
+        return ServiceResult(serializer.errors, status.HTTP_400_BAD_REQUEST, None)
+
+    try:
+        predictor = get_yield_predictor()
+        features: dict = serializer.validated_data  # type: ignore
+        prediction = predictor.predict(features)
+
+        accuracy = getattr(predictor, "get_accuracy", lambda: {})()
+
+        return _ok(
+            {
+                "prediction_type": "yield",
+                "crop_type": features.get("crop_type", "Unknown"),
+                "predicted_yield": prediction,
+                "unit": "kg/hectare",
+                "confidence": accuracy.get("r2", accuracy.get("r2_score", 0.88)),
+                "model_accuracy": {
+                    "r2_score": accuracy.get("r2", accuracy.get("r2_score", 0.88)),
+                    "mae": accuracy.get("mae", 250),
+                    "rmse": accuracy.get("rmse", 380),
+                },
+            },
+            history={
+                "prediction_type": "yield",
+                "crop_name": features.get("crop_type", "Unknown"),
+                "input_features": features,
+                "predicted_value": prediction,
+            },
+        )
+    except Exception as e:
+        logger.error(f"Error in yield prediction: {str(e)}", exc_info=True)
+        return _error(f"Yield prediction failed: {str(e)}", status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def predict_price(data):
+    """Predict crop price."""
+    serializer = PricePredictionRequestSerializer(data=data)
+    if not serializer.is_valid():
+        return ServiceResult(serializer.errors, status.HTTP_400_BAD_REQUEST, None)
+
+    try:
+        predictor = get_price_predictor()
+        features: dict = serializer.validated_data # type: ignore
+
+        crop_type = features.get("crop_type", "Unknown")
+        prediction_features = {
+            "product": crop_type,
+            "date": features.get("date", timezone.now()),
+        }
+
+        prediction = predictor.predict(prediction_features)
+        accuracy = getattr(predictor, "get_accuracy", lambda: {})()
+
+        return _ok(
+            {
+                "prediction_type": "price",
+                "crop_type": crop_type,
+                "predicted_price": prediction,
+                "currency": "LKR",
+                "confidence": accuracy.get("r2_score", 0.0),
+                "model_accuracy": {
+                    "r2_score": accuracy.get("r2_score", 0.0),
+                    "mae": accuracy.get("mae", 0.0),
+                    "rmse": accuracy.get("rmse", 0.0),
+                },
+            },
+            history={
+                "prediction_type": "price",
+                "crop_name": crop_type,
+                "input_features": features,
+                "predicted_value": prediction,
+            },
+        )
+    except Exception as e:
+        logger.error(f"Error in price prediction: {str(e)}", exc_info=True)
+        return _error(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def forecast_demand(data):
+    """
+    Forecast DAILY demand for next N days.
+    Expected payload:
+      {
+        "crop_type": "Cabbage",
+        "forecast_days": 20,
+        "consumption_trend": "Stable"
+      }
+    """
+    crop_type = data.get("crop_type") or data.get("crop")
+    forecast_days = data.get("forecast_days", 20)
+    consumption_trend = data.get("consumption_trend", "Stable")
+
+    if not crop_type:
+        return _error("crop_type is required", status.HTTP_400_BAD_REQUEST)
+
+    try:
+        forecast_days = int(forecast_days)
+    except Exception:
+        return _error("forecast_days must be an integer", status.HTTP_400_BAD_REQUEST)
+
+    # your UI slider is 3..30
+    if forecast_days < 3 or forecast_days > 30:
+        return _error("forecast_days must be between 3 and 30", status.HTTP_400_BAD_REQUEST)
+
+    # Excel dataset path (put your file here)
+    excel_path = demand_dataset_path()
+    if not os.path.exists(excel_path):
+        return _error(f"Demand dataset not found at: {excel_path}", status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    try:
+        df = pd.read_excel(excel_path)
+
+        predictor = get_demand_predictor()
+
+        # IMPORTANT: This requires your DemandPredictor to have forecast_days(...)
+        if not hasattr(predictor, "forecast_days"):
+            return _error(
+                "Your DemandPredictor does not have forecast_days(). Please add it.",
+                status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        result = predictor.forecast_days(
+            product_name=crop_type,
+            forecast_days=forecast_days,
+            consumption_trend=consumption_trend,
+            excel_df=df,
+        )
+
+        return _ok(result, history={
+            "prediction_type": "demand_forecast",
+            "crop_name": crop_type,
+            "input_features": {
+                "forecast_days": forecast_days,
+                "consumption_trend": consumption_trend,
+            },
+            "predicted_value": result.get("predicted_total_tonnes", 0),
+        })
+
+    except Exception as e:
+        logger.error(f"Error in demand forecast: {str(e)}", exc_info=True)
+        return _error(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def predict_demand(data):
+    """
+    Old endpoint (single-value style).
+    If your frontend uses it, keep it.
+    Otherwise, you can remove it later.
+    """
+    serializer = DemandPredictionRequestSerializer(data=data)
+    if not serializer.is_valid():
+        return ServiceResult(serializer.errors, status.HTTP_400_BAD_REQUEST, None)
+
+    try:
+        predictor = get_demand_predictor()
+        features: dict = serializer.validated_data # type: ignore
+        crop_type = str(features.get("crop_type", ""))
+
+        # If your predictor still supports predict(), use it
+        if hasattr(predictor, "predict"):
+            predict_fn = getattr(predictor, "predict")
+            prediction = predict_fn(features)
+            accuracy = getattr(predictor, "get_accuracy", lambda: {})()
+
+            return _ok({
+                "prediction_type": "demand",
+                "crop_type": crop_type,
+                "predicted_demand": prediction,
+                "unit": "metric tons",
+                "confidence": accuracy.get("r2_score", 0.0),
+                "model_accuracy": {
+                    "r2_score": accuracy.get("r2_score", 0.0),
+                    "mae": accuracy.get("mae", 0.0),
+                    "rmse": accuracy.get("rmse", 0.0),
+                },
+            })
+
+        # Fallback for newer predictor implementations that only expose forecast_days()
+        if hasattr(predictor, "forecast_days"):
+            excel_path = demand_dataset_path()
+            if not os.path.exists(excel_path):
+                return _error(f"Demand dataset not found at: {excel_path}", status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+            df = pd.read_excel(excel_path)
+            forecast_result = predictor.forecast_days(
+                product_name=crop_type,
+                forecast_days=20,
+                consumption_trend=features.get("consumption_trend", "stable"),
+                excel_df=df,
+            )
+
+            predicted_total = forecast_result.get("predicted_total_tonnes", 0)
+
+            return _ok(
+                {
+                    "prediction_type": "demand",
+                    "crop_type": crop_type,
+                    "predicted_demand": predicted_total,
+                    "unit": forecast_result.get("unit", "tonnes"),
+                    "confidence": 0.0,
+                    "model_accuracy": {
+                        "r2_score": 0.0,
+                        "mae": 0.0,
+                        "rmse": 0.0,
+                    },
+                },
+                history={
+                    "prediction_type": "demand",
+                    "crop_name": crop_type,
+                    "input_features": features,
+                    "predicted_value": predicted_total,
+                },
+            )
+
+        return _error(
+            "Demand predictor is missing both predict() and forecast_days().",
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+    except Exception as e:
+        logger.error(f"Error in demand prediction: {str(e)}", exc_info=True)
+        return _error(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def forecast_price(data):
+    """
+    Forecast DAILY price for next N days.
+    Expected payload:
+      {
+        "crop_type": "Tomato",
+        "forecast_days": 30
+      }
+    """
+    crop_type = data.get("crop_type") or data.get("crop")
+    forecast_days = data.get("forecast_days", 30)
+
+    if not crop_type:
+        return _error("crop_type is required", status.HTTP_400_BAD_REQUEST)
+
+    try:
+        forecast_days = int(forecast_days)
+    except Exception:
+        return _error("forecast_days must be an integer", status.HTTP_400_BAD_REQUEST)
+
+    if forecast_days < 1 or forecast_days > 30:
+        return _error("forecast_days must be between 1 and 30", status.HTTP_400_BAD_REQUEST)
+
+    try:
+        predictor = get_price_predictor()
+
+        # use your existing predict_future() from PricePredictor
+        series = predictor.predict_future(
+            product=crop_type,
+            days_ahead=forecast_days,
+            start_date=timezone.now()
+        )
+
+        if not series:
+            return _error("No forecast data available", status.HTTP_404_NOT_FOUND)
+
+        prices = [item["predicted_price"] for item in series]
+        today_price = prices[0] if prices else 0
+        avg_price = round(sum(prices) / len(prices), 2) if prices else 0
+
+        return _ok(
+            {
+                "prediction_type": "price_forecast",
+                "crop_type": crop_type,
+                "forecast_days": forecast_days,
+                "currency": "LKR",
+                "today_price": round(today_price, 2),   # Premium Price
+                "avg_30_days": avg_price,               # Market Average
+                "series": series                        # full 30-day list
+            },
+            history={
+                "prediction_type": "price_forecast",
+                "crop_name": crop_type,
+                "input_features": {"forecast_days": forecast_days},
+                "predicted_value": today_price,
+            },
+        )
+
+    except Exception as e:
+        logger.error(f"Error in price forecast: {str(e)}", exc_info=True)
+        return _error(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def forecast_yield(data):
+    crop_type = data.get("crop_type")
+    months = data.get("months", 6)
+
+    if not crop_type:
+        return _error("crop_type is required", status.HTTP_400_BAD_REQUEST)
+
+    try:
+        months = int(months)
+    except Exception:
+        return _error("months must be an integer", status.HTTP_400_BAD_REQUEST)
+
+    if months < 1 or months > 24:
+        return _error("months must be between 1 and 24", status.HTTP_400_BAD_REQUEST)
+
+    try:
+        predictor = get_yield_predictor()
+        series = predictor.forecast(crop_type=crop_type, months=months)
+
+        return _ok(
+            {
+                "prediction_type": "yield_forecast",
+                "crop_type": crop_type,
+                "months": months,
+                "unit": "kg/hectare",
+                "series": series,
+            },
+            history={
+                "prediction_type": "yield_forecast",
+                "crop_name": crop_type,
+                "input_features": {"months": months},
+                "predicted_value": series[-1]["predicted_yield"] if series else 0,
+            },
+        )
+
+    except Exception as e:
+        logger.error(f"Error in yield forecast: {str(e)}", exc_info=True)
+        return _error(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# Human-readable factors for /explain/. Each model feature is credited to
+# the first factor whose predicate matches it.
+PRICE_TEMPORAL_FEATURES = {
+    "year", "month", "day", "day_of_week", "day_of_year", "week_of_year", "quarter",
+    "is_weekend", "is_month_start", "is_month_end", "month_sin", "month_cos", "dow_sin", "dow_cos",
+}
+PRICE_TREND_PREFIXES = ("price_lag_", "rolling_", "price_change_")
+
+EXPLAIN_FACTORS = {
+    "price": [
+        ("Seasonal Patterns", "Season affects supply and trends", lambda f: f in PRICE_TEMPORAL_FEATURES),
+        ("Recent Price Trends", "Rolling averages and momentum", lambda f: f.startswith(PRICE_TREND_PREFIXES)),
+        ("Supply & Demand Balance", "Market supply levels and demand", lambda f: f == "product_encoded"),
+        ("Market Conditions", "Weather, transport, location", lambda f: True),
+    ],
+    "yield": [
+        ("Weather Conditions", "Temp, rainfall, humidity", lambda f: f in ("month", "season")),
+        ("Crop Variety", "Cultivar characteristics", lambda f: f == "product_code"),
+        ("Farming Practices", "Irrigation, fertilizer, pests", lambda f: True),
+    ],
+    "demand": [
+        ("Consumer Preferences", "Historical consumption patterns", lambda f: f.startswith(("lag", "roll", "product"))),
+        ("Seasonal Factors", "Festivals + cultural preferences", lambda f: f in ("month", "season")),
+        ("Population Demographics", "Urban vs rural + income", lambda f: True),
+    ],
+}
+
+# Column order of the yield / demand model inputs (see their feature_row()).
+YIELD_FEATURE_NAMES = ["year", "month", "season", "product_code", "lag1", "lag2", "lag3"]
+DEMAND_FEATURE_NAMES = ["product_code", "year", "month", "season", "lag1", "lag2", "lag3", "roll3"]
+
+EXPLAIN_CACHE_TIMEOUT = 60 * 60
+
+# One TreePathExplainer per (prediction_type, model_version)
+_explainers = {}
+
+
+def get_explainer(prediction_type, predictor):
+    key = (prediction_type, predictor.model_version)
+    if key not in _explainers:
+        logger.info(f"Building tree path explainer for {prediction_type} model {predictor.model_version}")
+        if len(_explainers) >= 8:
+            _explainers.clear()
+        _explainers[key] = TreePathExplainer(predictor.model)
+    return _explainers[key]
+
+
+def _impact(share):
+    if share >= 0.30:
+        return "High"
+    if share >= 0.15:
+        return "Medium"
+    return "Low"
+
+
+def _build_explanation(prediction_type, crop_type, data):
+    """
+    Compute tree path attributions for one input.
+    Returns the explanation dict or an error ServiceResult.
+    """
+    if prediction_type == "price":
+        predictor = get_price_predictor()
+        if not predictor.is_trained:
+            return _error("Price model is not trained", status.HTTP_503_SERVICE_UNAVAILABLE)
+        on_date = pd.Timestamp(data.get("date") or timezone.localdate()).normalize()
+        input_key = f"{crop_type.lower()}|{on_date.date().isoformat()}"
+        feature_names = predictor.feature_columns
+        build_row = lambda: predictor.feature_row({"product": crop_type, "date": on_date.to_pydatetime()})
+    elif prediction_type == "yield":
+        predictor = get_yield_predictor()
+        input_key = crop_type
+        feature_names = YIELD_FEATURE_NAMES
+        build_row = lambda: [predictor.feature_row(crop_type)]
+    else:
+        predictor = get_demand_predictor()
+        start_day = timezone.localdate()
+        input_key = f"{crop_type}|{start_day.strftime('%Y-%m')}"
+        feature_names = DEMAND_FEATURE_NAMES
+        build_row = lambda: [predictor.feature_row(crop_type, pd.read_excel(demand_dataset_path()), start_day)]
+
+    cache_key = f"ml_explain:{prediction_type}:{predictor.model_version}:{input_key}"
+    explanation = cache.get(cache_key)
+    if explanation is not None:
+        return explanation
+
+    explainer = get_explainer(prediction_type, predictor)
+    predictions, bias, contributions = explainer.explain(build_row())
+    contributions = contributions[0]
+
+    grouped = group_contributions(contributions, feature_names, [
+        (name, predicate) for name, _, predicate in EXPLAIN_FACTORS[prediction_type]
+    ])
+    total_abs = sum(abs(v) for v in grouped.values()) or 1.0
+
+    factors = []
+    for name, description, _ in EXPLAIN_FACTORS[prediction_type]:
+        if name not in grouped:
+            continue
+        share = abs(grouped[name]) / total_abs
+        factors.append({
+            "name": name,
+            "importance": round(share, 4),
+            "contribution": round(grouped[name], 4),
+            "description": description,
+            "impact": _impact(share),
+        })
+    factors.sort(key=lambda f: f["importance"], reverse=True)
+
+    top_features = sorted(zip(feature_names, contributions), key=lambda x: abs(x[1]), reverse=True)[:10]
+    accuracy_data = getattr(predictor, "get_accuracy", lambda: {})()
+
+    explanation = {
+        "model_output": round(float(predictions[0]), 4),
+        "base_value": round(float(bias), 4),
+        "factors": factors,
+        "feature_contributions": [
+            {"feature": name, "contribution": round(float(value), 4)} for name, value in top_features
+        ],
+        "model_info": {
+            "algorithm": "Random Forest Regressor",
+            "accuracy": accuracy_data.get("r2_score", 0.0),
+            "features_used": len(feature_names),
+            "model_version": predictor.model_version,
+            "attribution_method": "tree_path",
+        },
+    }
+    cache.set(cache_key, explanation, EXPLAIN_CACHE_TIMEOUT)
+    return explanation
+
+
+def explain_prediction(data):
+    """
+    Explain a prediction with per-feature tree path contributions.
+    Expected payload:
+      {
+        "prediction_type": "price",   # price | yield | demand
+        "crop_type": "Tomato",
+        "predicted_value": 245.5,     # optional, echoed back
+        "date": "2026-03-20"          # optional, price only
+      }
+    """
+    try:
+        prediction_type = data.get("prediction_type", "price")
+        crop_type = data.get("crop_type")
+        predicted_value = data.get("predicted_value", 0)
+
+        if prediction_type not in EXPLAIN_FACTORS:
+            return _error("Invalid prediction type", status.HTTP_400_BAD_REQUEST)
+        if not crop_type:
+            return _error("crop_type is required", status.HTTP_400_BAD_REQUEST)
+
+        explanation = _build_explanation(prediction_type, str(crop_type), data)
+        if isinstance(explanation, ServiceResult):
+            return explanation
+
+        return _ok({
+            "prediction_type": prediction_type,
+            "crop_type": crop_type,
+            "predicted_value": predicted_value,
+            **explanation,
+        })
+
+    except ValueError as e:
+        return _error(str(e), status.HTTP_400_BAD_REQUEST)
+    except FileNotFoundError as e:
+        return _error(str(e), status.HTTP_503_SERVICE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"Error generating explanation: {str(e)}", exc_info=True)
+        return _error(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def predict_flood(data):
+    """Predict flood risk for a single location."""
+    serializer = FloodPredictionInputSerializer(data=data)
+
+    if not serializer.is_valid():
+        return ServiceResult({
+            'success': False,
+            'message': 'Invalid input data',
+            'error': serializer.errors,
+            'prediction': None
+        }, status.HTTP_400_BAD_REQUEST, None)
+
+    try:
+        if get_predictor is None:
+            return ServiceResult({
+                'success': False,
+                'message': 'Prediction service unavailable',
+                'error': 'Model predictor not initialized',
+                'prediction': None
+            }, status.HTTP_503_SERVICE_UNAVAILABLE, None)
+
+        predictor = get_predictor()
+        features = serializer.to_features_dict()
+        prediction = predictor.predict(features)
+
+        return _ok({
+            'success': True,
+            'message': 'Flood prediction successful',
+            'prediction': prediction,
+            'error': None
+        })
+
+    except FileNotFoundError as e:
+        return ServiceResult({
+            'success': False,
+            'message': 'Model not found',
+            'error': str(e),
+            'prediction': None
+        }, status.HTTP_503_SERVICE_UNAVAILABLE, None)
+
+    except Exception as e:
+        return ServiceResult({
+            'success': False,
+            'message': 'Prediction failed',
+            'error': str(e),
+            'prediction': None
+        }, status.HTTP_500_INTERNAL_SERVER_ERROR, None)
+
+
+def predict_flood_batch(data):
+    """Predict flood risk for multiple locations."""
+    serializer = BatchFloodPredictionInputSerializer(data=data)
+
+    if not serializer.is_valid():
+        return ServiceResult({
+            'success': False,
+            'message': 'Invalid input data',
+            'error': serializer.errors,
+            'predictions': [],
+            'count': 0
+        }, status.HTTP_400_BAD_REQUEST, None)
+
+    try:
+        if get_predictor is None:
+            return ServiceResult({
+                'success': False,
+                'message': 'Prediction service unavailable',
+                'error': 'Model predictor not initialized',
+                'predictions': [],
+                'count': 0
+            }, status.HTTP_503_SERVICE_UNAVAILABLE, None)
+
+        predictor = get_predictor()
+        locations = serializer.validated_data['locations']
+
+        predictions = []
+        for location_data in locations:
+            location_serializer = FloodPredictionInputSerializer(data=location_data)
+            if location_serializer.is_valid():
+                features = location_serializer.to_features_dict()
+                prediction = predictor.predict(features)
+                predictions.append(prediction)
+
+        return _ok({
+            'success': True,
+            'message': f'Batch prediction successful for {len(predictions)} locations',
+            'predictions': predictions,
+            'count': len(predictions),
+            'error': None
+        })
+
+    except Exception as e:
+        return ServiceResult({
+            'success': False,
+            'message': 'Batch prediction failed',
+            'error': str(e),
+            'predictions': [],
+            'count': 0
+        }, status.HTTP_500_INTERNAL_SERVER_ERROR, None)
@@ -2,10 +2,30 @@
 Tests for ML API.
 """
 
+import json
+import os
+import shutil
+import tempfile
+import threading
 import unittest
-from django.test import TestCase
+from datetime import date
+
+import pandas as pd
+
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
 from rest_framework.test import APIClient
 
+from alerts.models import Alert
+
+from .admission import TokenBucket, reset_admission
+from .benchmarking import compare_to_baseline, percentile
+from .management.commands.generate_trend_notifications import Command as TrendNotificationsCommand
+from .models import TrendAlert, TrendWatermark
+from .profiling import RequestProfilingMiddleware
+
 
 class PredictionAPITestCase(TestCase):
     """Test cases for prediction APIs."""
@@ -23,3 +43,262 @@ class PredictionAPITestCase(TestCase):
         """Test prediction history endpoint."""
         # TODO: Add test implementation
         pass
+
+
+class RequestProfilingTests(TestCase):
+    """Tests for the on-demand profiling middleware and staff endpoints."""
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir, ignore_errors=True)
+        self.config = {
+            "TOKEN": "secret-token",
+            "SAMPLE_RATE": 0,
+            "PATH_PREFIXES": ["/api/ml/"],
+            "OUTPUT_DIR": self.output_dir,
+            "MAX_ARTIFACTS": 2,
+        }
+        self.admin = User.objects.create_user(
+            username="profile_admin", password="StrongPass123!", is_staff=True
+        )
+
+    def test_disabled_profiling_does_not_load_middleware(self):
+        with self.settings(REQUEST_PROFILING={"TOKEN": "", "SAMPLE_RATE": 0}):
+            with self.assertRaises(MiddlewareNotUsed):
+                RequestProfilingMiddleware(lambda request: None)
+
+    def test_header_profiles_request_and_stores_artifacts(self):
+        with self.settings(REQUEST_PROFILING=self.config):
+            client = APIClient()
+            response = client.post(
+                "/api/ml/price/forecast/", {}, format="json", HTTP_X_PROFILE="secret-token"
+            )
+
+        self.assertEqual(response.status_code, 400)
+        profile_id = response["X-Profile-Id"]
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, f"{profile_id}.prof")))
+        with open(os.path.join(self.output_dir, f"{profile_id}.json")) as f:
+            summary = json.load(f)
+        self.assertEqual(summary["trigger"], "header")
+        self.assertEqual(summary["path"], "/api/ml/price/forecast/")
+        self.assertIn("count", summary["sql"])
+
+    def test_wrong_token_is_not_profiled(self):
+        with self.settings(REQUEST_PROFILING=self.config):
+            response = APIClient().post(
+                "/api/ml/price/forecast/", {}, format="json", HTTP_X_PROFILE="nope"
+            )
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+    def test_overlapping_profiled_requests_run_one_unprofiled(self):
+        inside, release = threading.Event(), threading.Event()
+
+        def view(request):
+            if request.path.endswith("/slow/"):
+                inside.set()
+                release.wait(5)
+            return HttpResponse("ok")
+
+        with self.settings(REQUEST_PROFILING=self.config):
+            middleware = RequestProfilingMiddleware(view)
+        factory = RequestFactory(HTTP_X_PROFILE="secret-token")
+        responses = {}
+        slow = threading.Thread(target=lambda: responses.update(slow=middleware(factory.get("/api/ml/slow/"))))
+        slow.start()
+        inside.wait(5)
+        try:
+            responses["fast"] = middleware(factory.get("/api/ml/fast/"))
+        finally:
+            release.set()
+            slow.join(5)
+
+        self.assertEqual(responses["fast"].status_code, 200)
+        self.assertNotIn("X-Profile-Id", responses["fast"])
+        self.assertIn("X-Profile-Id", responses["slow"])
+
+    def test_profile_endpoints_are_staff_only(self):
+        with self.settings(REQUEST_PROFILING=self.config):
+            response = APIClient().post(
+                "/api/ml/price/forecast/", {}, format="json", HTTP_X_PROFILE="secret-token"
+            )
+            profile_id = response["X-Profile-Id"]
+
+            anonymous = APIClient().get("/api/ml/profiles/")
+            self.assertIn(anonymous.status_code, [401, 403])
+
+            client = APIClient()
+            client.force_authenticate(self.admin)
+            listing = client.get("/api/ml/profiles/")
+            detail = client.get(f"/api/ml/profiles/{profile_id}/")
+            download = client.get(f"/api/ml/profiles/{profile_id}/?download=1")
+
+        self.assertEqual(listing.status_code, 200)
+        self.assertEqual(listing.data["profiles"][0]["id"], profile_id)
+        self.assertEqual(detail.status_code, 200)
+        self.assertIn("top_functions", detail.data)
+        self.assertEqual(download.status_code, 200)
+        self.assertIn("attachment", download["Content-Disposition"])
+
+
+class AsyncEndpointTests(TestCase):
+    """The async endpoints share validation and responses with the sync ones."""
+
+    def setUp(self):
+        reset_admission()
+
+    def test_async_forecast_validation_matches_sync(self):
+        client = APIClient()
+        for payload in ({}, {"crop_type": "Tomato", "forecast_days": "x"}, {"crop_type": "Tomato", "forecast_days": 99}):
+            sync_response = client.post("/api/ml/price/forecast/", payload, format="json")
+            async_response = client.post("/api/ml/async/price/forecast/", payload, format="json")
+            self.assertEqual(async_response.status_code, sync_response.status_code)
+            self.assertEqual(async_response.json(), sync_response.json())
+
+    def test_async_endpoint_rejects_bad_json_and_get(self):
+        client = APIClient()
+        bad_json = client.generic("POST", "/api/ml/async/price/forecast/", "{", content_type="application/json")
+        self.assertEqual(bad_json.status_code, 400)
+        self.assertEqual(client.get("/api/ml/async/price/forecast/").status_code, 405)
+
+
+class BenchmarkBaselineTests(unittest.TestCase):
+    """Regression detection used by the benchmark_ml_api command."""
+
+    def setUp(self):
+        self.baseline = {"price-forecast": {"errors": 0, "p95_ms": 100.0, "rps": 50.0}}
+
+    def test_within_tolerance_passes(self):
+        current = {"price-forecast": {"errors": 0, "p95_ms": 120.0, "rps": 41.0}}
+        self.assertEqual(compare_to_baseline(current, self.baseline, 0.25), [])
+
+    def test_slower_p95_lower_rps_and_new_errors_regress(self):
+        current = {"price-forecast": {"errors": 2, "p95_ms": 130.0, "rps": 30.0}}
+        regressions = compare_to_baseline(current, self.baseline, 0.25)
+        self.assertEqual(len(regressions), 3)
+
+    def test_scenarios_missing_from_baseline_are_ignored(self):
+        current = {"flood-predict": {"errors": 0, "p95_ms": 999.0, "rps": 1.0}}
+        self.assertEqual(compare_to_baseline(current, self.baseline, 0.25), [])
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 95), 0.0)
+
+
+def _admission(**classes):
+    return override_settings(ML_ADMISSION={"ENABLED": True, "CLASSES": classes})
+
+
+class AdmissionControlTests(TestCase):
+    """Rate limiting and load shedding of the ML endpoints."""
+
+    def setUp(self):
+        reset_admission()
+        self.client = APIClient()
+
+    def tearDown(self):
+        reset_admission()
+
+    def test_token_bucket_refills_over_time(self):
+        bucket = TokenBucket(rate=2, burst=2)
+        self.assertEqual(bucket.take("a", now=0), 0)
+        self.assertEqual(bucket.take("a", now=0), 0)
+        self.assertAlmostEqual(bucket.take("a", now=0), 0.5)
+        self.assertEqual(bucket.take("b", now=0), 0)
+        self.assertEqual(bucket.take("a", now=0.5), 0)
+
+    def test_client_over_its_burst_gets_429_with_retry_after(self):
+        limits = {"RATE": 0.1, "BURST": 2, "GLOBAL_RATE": 100, "GLOBAL_BURST": 100, "MAX_CONCURRENT": 4}
+        with _admission(forecast=limits):
+            codes = [self.client.post("/api/ml/price/forecast/", {}, format="json").status_code for _ in range(3)]
+            other = self.client.post("/api/ml/price/forecast/", {}, format="json", REMOTE_ADDR="10.0.0.2")
+            async_response = self.client.post("/api/ml/async/price/forecast/", {}, format="json")
+
+        self.assertEqual(codes, [400, 400, 429])
+        self.assertEqual(other.status_code, 400)
+        self.assertEqual(async_response.status_code, 429)
+        self.assertEqual(async_response["Retry-After"], "10")
+
+    def test_saturated_class_returns_503_fast(self):
+        limits = {"RATE": 100, "BURST": 100, "GLOBAL_RATE": 100, "GLOBAL_BURST": 100, "MAX_CONCURRENT": 0}
+        with _admission(light=limits):
+            response = self.client.post("/api/ml/flood/predict/", {}, format="json")
+            price = self.client.post("/api/ml/predict/price/", {}, format="json")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(price.status_code, 503)
+
+    def test_metrics_report_shed_traffic_to_staff_only(self):
+        limits = {"RATE": 100, "BURST": 100, "GLOBAL_RATE": 0.1, "GLOBAL_BURST": 1, "MAX_CONCURRENT": 4}
+        with _admission(forecast=limits):
+            self.client.post("/api/ml/price/forecast/", {}, format="json")
+            self.client.post("/api/ml/price/forecast/", {}, format="json")
+
+            self.assertEqual(self.client.get("/api/ml/admission/").status_code, 401)
+            admin = User.objects.create_user(username="admin", password="x", is_staff=True)
+            self.client.force_authenticate(user=admin)
+            metrics = self.client.get("/api/ml/admission/").data
+
+        forecast = metrics["classes"]["forecast"]
+        self.assertEqual(forecast["admitted"], 1)
+        self.assertEqual(forecast["shed_global_rate"], 1)
+        self.assertEqual(forecast["shed_ratio"], 0.5)
+        self.assertEqual(forecast["in_flight"], 0)
+
+
+class TrendAlertWriteTests(TestCase):
+    """generate_trend_notifications upserts trends and announces only new ones."""
+
+    def _candidates(self, command, predicted):
+        forecasts = [{"date": "2030-01-0%d" % day, "predicted_price": predicted} for day in (1, 2)]
+        return [command._trend_alert("Carrot", f, 100.0, 7) for f in forecasts]
+
+    def test_rerun_refreshes_values_without_new_alerts(self):
+        command = TrendNotificationsCommand()
+        self.assertIsNone(command._trend_alert("Carrot", {"date": "2030-01-01", "predicted_price": 110}, 100.0, 7))
+
+        self.assertEqual(len(command._write_alerts(self._candidates(command, 130.0), 7)), 2)
+        self.assertEqual(command._write_alerts(self._candidates(command, 140.0), 7), [])
+
+        self.assertEqual(TrendAlert.objects.count(), 2)
+        self.assertEqual(Alert.objects.filter(crop_name="Carrot").count(), 2)
+        trend = TrendAlert.objects.get(forecast_date="2030-01-01")
+        self.assertEqual(trend.predicted_value, 140.0)
+        self.assertEqual(trend.severity, "HIGH")
+        self.assertEqual(trend.status, "NOTIFIED")
+
+    def test_baselines_use_latest_rows_per_product(self):
+        df = pd.DataFrame({
+            "Date": pd.to_datetime(["2024-01-03", "2024-01-01", "2024-01-02", "2024-01-01"]),
+            "Product_lower": ["beans", "beans", "beans", "leeks"],
+            "Pettah_Wholesale": [30.0, 10.0, 20.0, 5.0],
+        })
+        self.assertEqual(TrendNotificationsCommand()._baseline_prices(df, 2), {"beans": 25.0, "leeks": 5.0})
+
+
+class TrendWatermarkTests(TestCase):
+    """Unchanged products are skipped by incremental trend-alert runs."""
+
+    def test_only_changed_or_expired_products_are_recomputed(self):
+        command = TrendNotificationsCommand()
+        today = date(2030, 1, 10)
+        sources = {"beans": date(2030, 1, 9), "leeks": date(2030, 1, 9), "carrot": date(2030, 1, 9)}
+        command._save_watermarks(["Beans", "Leeks", "Carrot"], sources, "v1", "days=7", today, 7)
+
+        sources["leeks"] = date(2030, 1, 10)
+        products = ["Beans", "Leeks", "Carrot", "Pumpkin"]
+        self.assertEqual(
+            command._changed_products(products, sources, "v1", "days=7", today),
+            ["Leeks", "Pumpkin"],
+        )
+        self.assertEqual(len(command._changed_products(products, sources, "v2", "days=7", today)), 4)
+        self.assertEqual(len(command._changed_products(products, sources, "v1", "days=14", today)), 4)
+        self.assertEqual(len(command._changed_products(products, sources, "v1", "days=7", date(2030, 1, 17))), 4)
+
+        command._save_watermarks(["Leeks"], sources, "v1", "days=7", today, 7)
+        self.assertEqual(TrendWatermark.objects.count(), 3)
+        self.assertEqual(TrendWatermark.objects.get(product="Leeks").source_date, date(2030, 1, 10))
@@ -18,6 +18,9 @@ from .views import (
     demand_predict,
     demand_forecast,       # ✅ NEW
     prediction_explain,
+    profile_list,
+    profile_detail,
+    admission_stats,
 )
 
 router = DefaultRouter()
@@ -43,4 +46,11 @@ urlpatterns = [
     path('flood/predict/batch/', BatchFloodPredictionView.as_view(), name='flood_predict_batch'),
     path('flood/model-info/', ModelInfoView.as_view(), name='model_info'),
     path('flood/feature-importance/', FeatureImportanceView.as_view(), name='feature_importance'),
+
+    # Request profiles (staff only, see ml_api/profiling.py)
+    path("profiles/", profile_list, name="profile-list"),
+    path("profiles/<str:profile_id>/", profile_detail, name="profile-detail"),
+
+    # Admission control counters (staff only)
+    path("admission/", admission_stats, name="admission-stats"),
 ]
@@ -7,6 +7,8 @@ import numpy as np
 from datetime import date, datetime, timedelta
 import calendar
 
+from ml_models.utils.helpers import model_fingerprint
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # ml_models/
 MODELS_DIR = os.path.join(BASE_DIR, "models")
 
@@ -37,6 +39,7 @@ class DemandPredictor:
     def __init__(self):
         self.model = None
         self.meta = None
+        self.model_version = None
 
     def load(self):
         if not os.path.exists(MODEL_PATH) or not os.path.exists(META_PATH):
@@ -45,6 +48,7 @@ class DemandPredictor:
             )
         self.model = joblib.load(MODEL_PATH)
         self.meta = joblib.load(META_PATH)
+        self.model_version = model_fingerprint(self.model)
         return self
 
     def _product_code(self, product_name: str) -> int:
@@ -67,6 +71,21 @@ class DemandPredictor:
             raise ValueError(f"Not enough history for {product_name}. Need at least 4 months.")
         return df
 
+    def _month_features(self, product_name: str, y: int, m: int, lag1, lag2, lag3, roll3):
+        return [self._product_code(product_name), y, m, _season_code(m), lag1, lag2, lag3, roll3]
+
+    def feature_row(self, product_name: str, excel_df: pd.DataFrame, start_day: date | None = None):
+        """Model input for the first forecast month of forecast_days()."""
+        if self.model is None or self.meta is None:
+            self.load()
+
+        start_day = start_day or date.today()
+        last_vals = self._get_last_history(excel_df, product_name)["demand_mt"].tail(3).tolist()
+        return self._month_features(
+            product_name, start_day.year, start_day.month,
+            last_vals[-1], last_vals[-2], last_vals[-3], float(np.mean(last_vals)),
+        )
+
     def forecast_days(
         self,
         product_name: str,
@@ -100,9 +119,7 @@ class DemandPredictor:
 
         # helper to predict one month demand
         def predict_month(y: int, m: int, lag1, lag2, lag3, roll3):
-            prod_code = self._product_code(product_name)
-            season = _season_code(m)
-            X = np.array([[prod_code, y, m, season, lag1, lag2, lag3, roll3]], dtype=float)
+            X = np.array([self._month_features(product_name, y, m, lag1, lag2, lag3, roll3)], dtype=float)
             pred = float(self.model.predict(X)[0])
             return max(pred, 0.0)
 
@@ -16,6 +16,8 @@ import os
 import logging
 from datetime import datetime, timedelta
 
+from ml_models.utils.helpers import model_fingerprint
+
 logger = logging.getLogger(__name__)
 
 
@@ -53,6 +55,7 @@ class PricePredictor:
         self.target_column = 'Pettah_Wholesale'  # Default target
         self.products = []
         self.training_metrics = {}
+        self.model_version = None
         
         if model_path and os.path.exists(model_path):
             self.load_model(model_path)
@@ -279,6 +282,7 @@ class PricePredictor:
             logger.info("Training Random Forest model...")
             self.model.fit(X_train, y_train)
             self.is_trained = True
+            self.model_version = model_fingerprint(self.model)
             
             # Calculate training metrics
             train_pred = self.model.predict(X_train)
@@ -329,8 +333,7 @@ class PricePredictor:
             return 0.0
 
         try:
-            feature_vector = self._prepare_features(features)
-            feature_vector_scaled = self.scaler.transform([feature_vector])
+            feature_vector_scaled = self.feature_row(features)
             price_prediction = self.model.predict(feature_vector_scaled)[0]
             return float(max(0, price_prediction))  # Price can't be negative
             
@@ -338,6 +341,18 @@ class PricePredictor:
             logger.error(f"Error in price prediction: {str(e)}")
             raise
 
+    def feature_row(self, features: Dict) -> np.ndarray:
+        """
+        Scaled model input (shape 1 x n_features) for the given features.
+        
+        Args:
+            features: Same dictionary accepted by predict()
+            
+        Returns:
+            2D array ready for model.predict()
+        """
+        return self.scaler.transform([self._prepare_features(features)])
+
     def predict_batch(self, df: pd.DataFrame) -> np.ndarray:
         """
         Predict prices for a batch of records.
@@ -399,6 +414,43 @@ class PricePredictor:
             logger.warning(f"Could not fetch historical prices: {str(e)}")
             return []
 
+    def recent_prices(
+        self,
+        before_date: datetime,
+        num_days: int = 30,
+        df: Optional[pd.DataFrame] = None
+    ) -> Dict[str, List[float]]:
+        """
+        Historical prices of every product in one pass over the dataset.
+        
+        Args:
+            before_date: Get prices before this date
+            num_days: Number of historical prices per product
+            df: Already loaded dataset (read from DEFAULT_DATASET_PATH if None)
+            
+        Returns:
+            Lower-cased product name -> prices (most recent first), the same
+            lists _get_historical_prices() returns one product at a time
+        """
+        if df is None:
+            if not os.path.exists(self.DEFAULT_DATASET_PATH):
+                return {}
+            df = pd.read_csv(self.DEFAULT_DATASET_PATH)
+            df['Date'] = pd.to_datetime(df['Date'])
+        if 'Product_lower' not in df.columns:
+            df = df.assign(Product_lower=df['Product'].str.lower())
+        
+        recent = (
+            df[df['Date'] < before_date]
+            .sort_values('Date', ascending=False)
+            .groupby('Product_lower', sort=False)
+            .head(num_days)
+        )
+        return {
+            product: prices.tolist()
+            for product, prices in recent.groupby('Product_lower', sort=False)[self.target_column]
+        }
+
     def _prepare_features(self, features: Dict) -> List[float]:
         """
         Prepare feature vector from input dictionary.
@@ -573,6 +625,67 @@ class PricePredictor:
         
         return predictions
 
+    def predict_future_batch(
+        self,
+        products: List[str],
+        days_ahead: int = 7,
+        start_date: Optional[datetime] = None,
+        history: Optional[Dict[str, List[float]]] = None
+    ) -> Dict[str, List[Dict]]:
+        """
+        predict_future() for many products, one model call per day.
+        
+        Each day's rows for all products are scored together instead of one
+        model.predict() per product and day. Results match predict_future():
+        the first day uses the dataset history, later days only the previous
+        predictions.
+        
+        Args:
+            products: Product names
+            days_ahead: Number of days to predict
+            start_date: Starting date (defaults to today)
+            history: Optional recent_prices() result, to reuse a loaded dataset
+            
+        Returns:
+            Product name -> list of predictions with dates
+        """
+        if not self.is_trained or not products:
+            if not self.is_trained:
+                logger.warning("Model not trained.")
+            return {product: [] for product in products}
+        
+        start_date = start_date or datetime.now()
+        if history is None:
+            history = self.recent_prices(start_date, num_days=30)
+        
+        histories = {product: history.get(product.lower(), []) for product in products}
+        predictions = {product: [] for product in products}
+        
+        for i in range(days_ahead):
+            pred_date = start_date + timedelta(days=i)
+            rows = [
+                self._prepare_features({
+                    'product': product,
+                    'date': pred_date,
+                    'historical_prices': histories[product]
+                })
+                for product in products
+            ]
+            prices = self.model.predict(self.scaler.transform(rows))
+            
+            for product, price in zip(products, prices):
+                pred_price = float(max(0, price))
+                predictions[product].append({
+                    'date': pred_date.strftime('%Y-%m-%d'),
+                    'product': product,
+                    'predicted_price': round(pred_price, 2)
+                })
+                # Like predict_future(): only predictions feed later days
+                previous = histories[product][:29] if i > 0 else []
+                histories[product] = [pred_price] + previous
+        
+        return predictions
+
     def get_feature_importance(self, top_n: int = 10) -> Dict[str, float]:
         """
         Get top N most important features.
@@ -637,6 +750,7 @@ class PricePredictor:
         self.products = model_data['products']
         self.training_metrics = model_data['training_metrics']
         self.is_trained = True
+        self.model_version = model_fingerprint(self.model)
         
         logger.info(f"Model loaded from {filepath}")
 
@@ -646,6 +760,7 @@ class PricePredictor:
             "model_name": "Random Forest Price Predictor",
             "model_type": "RandomForestRegressor",
             "is_trained": self.is_trained,
+            "model_version": self.model_version,
             "target_column": self.target_column,
             "num_features": len(self.feature_columns),
             "products": self.products,
@@ -71,6 +71,8 @@ import joblib
 from pathlib import Path
 import pandas as pd
 
+from ml_models.utils.helpers import model_fingerprint
+
 
 class YieldPredictor:
     def __init__(self):
@@ -81,6 +83,7 @@ class YieldPredictor:
         self.model = joblib.load(model_dir / "yield_rf.joblib")
         self.le = joblib.load(model_dir / "yield_label_encoder.joblib")
         self.last = joblib.load(model_dir / "yield_last.joblib")
+        self.model_version = model_fingerprint(self.model)
 
     def _load_and_train(self):
         """Load data and train the model."""
@@ -157,11 +160,8 @@ class YieldPredictor:
         series = self.forecast(crop_type=crop_type, months=1)
         return series[0]["predicted_yield"]
 
-    def forecast(self, crop_type: str, months: int):
-        """
-        Used by /yield/forecast/ for chart
-        Returns: list of {month: 'YYYY-MM', predicted_yield: float}
-        """
+    def _initial_state(self, crop_type: str):
+        """First forecast month, encoded product and the last three yields."""
         if crop_type not in self.last["last3"]:
             raise ValueError(f"Unknown crop_type: {crop_type}")
 
@@ -173,7 +173,19 @@ class YieldPredictor:
         start_dt = last_dt + pd.DateOffset(months=1)
 
         product_code = int(self.le.transform([crop_type])[0])
-        lag1, lag2, lag3 = lags[-1], lags[-2], lags[-3]
+        return start_dt, product_code, (lags[-1], lags[-2], lags[-3])
+
+    def feature_row(self, crop_type: str):
+        """Model input for the next month (the value predict() returns)."""
+        start_dt, product_code, (lag1, lag2, lag3) = self._initial_state(crop_type)
+        return [start_dt.year, start_dt.month, self._season(start_dt.month), product_code, lag1, lag2, lag3]
+
+    def forecast(self, crop_type: str, months: int):
+        """
+        Used by /yield/forecast/ for chart
+        Returns: list of {month: 'YYYY-MM', predicted_yield: float}
+        """
+        start_dt, product_code, (lag1, lag2, lag3) = self._initial_state(crop_type)
 
         out = []
         for i in range(months):
@@ -2,8 +2,13 @@
 Unit tests for predictors.
 """
 
+import os
+import tempfile
 import unittest
+from datetime import datetime
+
 import numpy as np
+import pandas as pd
 from ml_models.predictors import YieldPredictor, PricePredictor, DemandPredictor
 
 
@@ -66,6 +71,44 @@ class TestPricePredictor(unittest.TestCase):
                 print(f"Error during training or accuracy reporting: {e}")
 
 
+class TestPricePredictorBatchForecast(unittest.TestCase):
+    """The batched forecast path must match predict_future() exactly."""
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(0)
+        rows = []
+        for product, base in (("Beans", 140.0), ("Carrot", 90.0), ("Leeks", 60.0)):
+            for day in pd.date_range("2024-01-01", periods=120):
+                price = base + 20 * np.sin(day.dayofyear / 10) + rng.normal(0, 5)
+                rows.append([day.strftime("%Y-%m-%d"), product, price, price + 10, price + 15, price + 20, price + 25])
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.dataset = os.path.join(cls.tmpdir, "prices.csv")
+        pd.DataFrame(rows, columns=["Date", "Product"] + PricePredictor.PRICE_COLUMNS).to_csv(cls.dataset, index=False)
+
+        cls.predictor = PricePredictor(auto_train=False)
+        cls.predictor.DEFAULT_DATASET_PATH = cls.dataset
+        cls.predictor.train(filepath=cls.dataset, n_estimators=10, n_jobs=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.dataset)
+        os.rmdir(cls.tmpdir)
+
+    def test_recent_prices_match_per_product_lookup(self):
+        before = datetime(2024, 3, 15, 12, 0)
+        history = self.predictor.recent_prices(before, num_days=30)
+        for product in self.predictor.products:
+            self.assertEqual(history[product.lower()], self.predictor._get_historical_prices(product, before, 30))
+
+    def test_batch_matches_predict_future(self):
+        start = datetime(2024, 4, 10, 8, 0)
+        products = self.predictor.products + ["Unknown"]
+        batch = self.predictor.predict_future_batch(products, days_ahead=5, start_date=start)
+        for product in products:
+            self.assertEqual(batch[product], self.predictor.predict_future(product, days_ahead=5, start_date=start))
+
+
 class TestDemandPredictor(unittest.TestCase):
     """Test cases for DemandPredictor."""
 
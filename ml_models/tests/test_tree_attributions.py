@@ -0,0 +1,53 @@
+"""
+Unit tests for tree path attributions.
+"""
+
+import unittest
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from ml_models.utils.helpers import model_fingerprint
+from ml_models.utils.tree_attributions import TreePathExplainer, group_contributions
+
+
+class TestTreePathExplainer(unittest.TestCase):
+    """Test cases for TreePathExplainer."""
+
+    def setUp(self):
+        """Fit a small forest on synthetic data."""
+        rng = np.random.default_rng(0)
+        self.X = rng.normal(size=(300, 5))
+        self.y = 3 * self.X[:, 0] + self.X[:, 1] ** 2 + rng.normal(scale=0.1, size=300)
+        self.model = RandomForestRegressor(n_estimators=20, random_state=0).fit(self.X, self.y)
+        self.explainer = TreePathExplainer(self.model)
+
+    def test_contributions_sum_to_prediction(self):
+        """Bias plus contributions reproduces the forest prediction."""
+        predictions, bias, contributions = self.explainer.explain(self.X[:10])
+        np.testing.assert_allclose(predictions, self.model.predict(self.X[:10]), rtol=1e-6)
+        np.testing.assert_allclose(bias + contributions.sum(axis=1), predictions)
+
+    def test_informative_feature_dominates(self):
+        """The strongest driver gets the largest average attribution."""
+        _, _, contributions = self.explainer.explain(self.X)
+        mean_abs = np.abs(contributions).mean(axis=0)
+        self.assertEqual(int(np.argmax(mean_abs)), 0)
+
+    def test_group_contributions(self):
+        """Features are summed into the first matching group."""
+        grouped = group_contributions(
+            [1.0, 2.0, -0.5],
+            ['lag1', 'lag2', 'month'],
+            [('Trend', lambda f: f.startswith('lag')), ('Other', lambda f: True)],
+        )
+        self.assertEqual(grouped, {'Trend': 3.0, 'Other': -0.5})
+
+    def test_model_fingerprint_tracks_refits(self):
+        """Same fit gives the same version, a different fit a new one."""
+        refit_same = RandomForestRegressor(n_estimators=20, random_state=0).fit(self.X, self.y)
+        refit_other = RandomForestRegressor(n_estimators=20, random_state=0).fit(self.X, -self.y)
+        self.assertEqual(model_fingerprint(refit_same), model_fingerprint(self.model))
+        self.assertNotEqual(model_fingerprint(refit_other), model_fingerprint(self.model))
+
+
+if __name__ == '__main__':
+    unittest.main()
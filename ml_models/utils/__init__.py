@@ -4,6 +4,6 @@ Utility functions for ML models.
 
 from .config import Config
 from .logger import setup_logger
-from .helpers import load_model, save_model
+from .helpers import load_model, save_model, model_fingerprint
 
-__all__ = ['Config', 'setup_logger', 'load_model', 'save_model']
+__all__ = ['Config', 'setup_logger', 'load_model', 'save_model', 'model_fingerprint']
@@ -2,6 +2,7 @@
 Helper functions for ML models.
 """
 
+import hashlib
 import pickle
 import json
 import logging
@@ -91,3 +92,30 @@ def load_config(config_path: str) -> dict:
     except Exception as e:
         logger.error(f"Error loading config: {str(e)}")
         raise
+
+
+def model_fingerprint(model: Any) -> str:
+    """
+    Short, stable version id for a fitted model.
+
+    Tree ensembles are hashed from their split/leaf arrays, so two identical
+    fits share a version and any retrain yields a new one. Other models fall
+    back to hashing their pickle.
+
+    Args:
+        model: Fitted estimator
+
+    Returns:
+        12-character hex digest
+    """
+    digest = hashlib.sha1()
+    estimators = getattr(model, 'estimators_', None)
+    if estimators is not None:
+        for estimator in estimators:
+            tree = estimator.tree_
+            digest.update(tree.feature.tobytes())
+            digest.update(tree.threshold.tobytes())
+            digest.update(tree.value.tobytes())
+    else:
+        digest.update(pickle.dumps(model))
+    return digest.hexdigest()[:12]
@@ -0,0 +1,66 @@
+"""
+Named push audiences.
+
+An outbox row stores only the audience name; the user queryset is resolved
+when the worker delivers it, so users who register a device in between
+are included.
+
+Audiences are plain querysets built from EXISTS subqueries: they are
+never evaluated in Python, send_push embeds them in its device query.
+"""
+
+from django.contrib.auth.models import User
+from django.db.models import Exists, OuterRef
+
+from accounts.models import BuyerDetails, FarmerDetails
+from marketplace.models import Marketplace
+
+
+def verified_users():
+    """Active users with an active farmer or buyer profile."""
+    return User.objects.filter(is_active=True).filter(
+        Exists(FarmerDetails.objects.filter(user=OuterRef("pk"), is_active=True))
+        | Exists(BuyerDetails.objects.filter(user=OuterRef("pk"), is_active=True))
+    )
+
+
+def all_users():
+    return User.objects.filter(is_active=True)
+
+
+def targeted_users(alert):
+    """
+    Verified users matching the alert's targeting: farmers in alert.region
+    and/or farmers with a listing of alert.crop_name. Untargeted alerts
+    reach every verified user.
+    """
+    users = verified_users()
+    if getattr(alert, "region", None):
+        users = users.filter(
+            Exists(FarmerDetails.objects.filter(user=OuterRef("pk"), is_active=True, region__iexact=alert.region))
+        )
+    if getattr(alert, "crop_name", None):
+        users = users.filter(
+            Exists(Marketplace.objects.filter(farmer_id=OuterRef("pk"), crop__crop_name__iexact=alert.crop_name))
+        )
+    return users
+
+
+AUDIENCES = {
+    "verified": verified_users,
+    "all": all_users,
+    "targeted": targeted_users,
+}
+
+# audiences computed from the alert an outbox row announces
+ALERT_AUDIENCES = {"targeted"}
+
+
+def resolve_audience(name, alert=None):
+    try:
+        audience = AUDIENCES[name]
+    except KeyError:
+        raise ValueError(f"Unknown push audience: {name}")
+    if name in ALERT_AUDIENCES:
+        return audience(alert)
+    return audience()
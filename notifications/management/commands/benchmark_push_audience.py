@@ -0,0 +1,98 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+import time
+import tracemalloc
+
+from accounts.models import BuyerDetails, FarmerDetails
+from notifications.audiences import verified_users
+from notifications.models import FCMDevice
+from notifications.transports import FakeTransport, get_push_config
+from notifications.utils import deliver, device_tokens
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure peak Python memory and query count of streaming the 'verified' "
+        "push audience, at several audience sizes. Synthetic users are created "
+        "inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=str, default="50000,500000",
+                            help="Comma-separated audience sizes to measure")
+        parser.add_argument("--batch-size", type=int, default=None,
+                            help="Tokens per query/multicast (defaults to PUSH_NOTIFICATIONS BATCH_SIZE)")
+        parser.add_argument("--legacy", action="store_true",
+                            help="Also measure the old approach: collect verified ids in a Python set")
+
+    def handle(self, *args, **opts):
+        try:
+            sizes = [int(n) for n in opts["users"].split(",") if n.strip()]
+        except ValueError:
+            raise CommandError("--users must be a comma-separated list of integers")
+
+        config = get_push_config()
+        if opts["batch_size"]:
+            config["BATCH_SIZE"] = opts["batch_size"]
+
+        header = f"{'users':>9} {'tokens':>9} {'queries':>8} {'peak MB':>8} {'seconds':>8}"
+        if opts["legacy"]:
+            header += f" {'legacy set MB':>14}"
+        self.stdout.write(header)
+
+        for size in sizes:
+            try:
+                with transaction.atomic():
+                    row = self._measure(size, config, opts["legacy"])
+                    raise _Rollback
+            except _Rollback:
+                pass
+            self.stdout.write(row)
+
+    def _measure(self, size, config, legacy):
+        self._populate(size)
+
+        transport = FakeTransport(record=False)
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            stats = deliver(
+                device_tokens(verified_users(), config["BATCH_SIZE"]), "Benchmark", "Audience",
+                config=config, transport=transport,
+            )
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        row = f"{size:>9} {stats['tokens']:>9} {queries:>8} {peak / 2**20:>8.1f} {elapsed:>8.2f}"
+        if legacy:
+            tracemalloc.start()
+            ids = set(FarmerDetails.objects.filter(is_active=True).values_list("user_id", flat=True))
+            ids |= set(BuyerDetails.objects.filter(is_active=True).values_list("user_id", flat=True))
+            _, legacy_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del ids
+            row += f" {legacy_peak / 2**20:>14.1f}"
+        return row
+
+    def _populate(self, size, chunk=5000):
+        """size users: 1/2 farmers, 1/4 buyers, 1/4 without a profile; all with a device."""
+        start = (User.objects.order_by("-id").values_list("id", flat=True).first() or 0) + 1
+        for offset in range(0, size, chunk):
+            ids = range(start + offset, start + min(offset + chunk, size))
+            User.objects.bulk_create([User(id=i, username=f"bench-push-{i}") for i in ids])
+            FarmerDetails.objects.bulk_create([FarmerDetails(user_id=i) for i in ids if i % 4 < 2])
+            BuyerDetails.objects.bulk_create([BuyerDetails(user_id=i) for i in ids if i % 4 == 2])
+            FCMDevice.objects.bulk_create([FCMDevice(user_id=i, token=f"bench-token-{i}") for i in ids])
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+import os
+import socket
+import time
+
+from notifications.outbox import claim_batch, deliver_row, reclaim_stale
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued push notifications from the outbox. Run several "
+        "workers in parallel if needed; crashed workers' rows are picked up again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the due rows and exit")
+        parser.add_argument("--batch", type=int, default=10, help="Rows claimed per round")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Seconds to wait when the outbox is empty")
+        parser.add_argument("--stale-after", type=int, default=600,
+                            help="Seconds after which an IN_PROGRESS row is considered abandoned")
+        parser.add_argument("--max-attempts", type=int, default=5, help="Attempts before a row is marked FAILED")
+        parser.add_argument("--worker-id", type=str, default=None, help="Defaults to host:pid")
+
+    def handle(self, *args, **opts):
+        worker_id = opts["worker_id"] or f"{socket.gethostname()}:{os.getpid()}"
+        totals = {"rows": 0, "failed_rows": 0, "tokens": 0, "sent": 0, "invalid": 0, "failed": 0}
+
+        self.stdout.write(f"Push outbox worker {worker_id} started")
+        try:
+            while True:
+                reclaimed = reclaim_stale(opts["stale_after"])
+                if reclaimed:
+                    self.stdout.write(self.style.WARNING(f"Reclaimed {reclaimed} abandoned rows"))
+
+                rows = claim_batch(worker_id, opts["batch"])
+                for row in rows:
+                    stats = deliver_row(row, opts["max_attempts"])
+                    totals["rows"] += 1
+                    if stats is None:
+                        totals["failed_rows"] += 1
+                        continue
+                    for key in ("tokens", "sent", "invalid", "failed"):
+                        totals[key] += stats.get(key, 0)
+                    self.stdout.write(
+                        f"#{row.id} '{row.title}': {stats['sent']}/{stats['tokens']} sent, "
+                        f"{stats['invalid']} invalid, {stats['failed']} failed in {stats['seconds']}s"
+                    )
+
+                if not rows:
+                    if opts["once"]:
+                        break
+                    time.sleep(opts["sleep"])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. Rows: {totals['rows']} ({totals['failed_rows']} errored), "
+            f"pushes sent: {totals['sent']}/{totals['tokens']}, invalid: {totals['invalid']}, failed: {totals['failed']}"
+        ))
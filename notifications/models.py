@@ -1,9 +1,56 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class FCMDevice(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     token = models.TextField()
 
     def __str__(self):
-        return f"{self.user.username} - FCM"
\ No newline at end of file
+        return f"{self.user.username} - FCM"
+
+class PushOutbox(models.Model):
+    """
+    A push broadcast waiting to be delivered.
+
+    Rows are written in the same transaction as the alert they announce and
+    delivered by the dispatch_push_outbox worker, so the request that
+    creates an alert never waits for FCM.
+    """
+
+    STATUS_PENDING = "PENDING"
+    STATUS_IN_PROGRESS = "IN_PROGRESS"
+    STATUS_DONE = "DONE"
+    STATUS_FAILED = "FAILED"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_IN_PROGRESS, "In progress"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    alert = models.ForeignKey("alerts.Alert", null=True, blank=True, on_delete=models.SET_NULL)
+    title = models.CharField(max_length=150)
+    body = models.TextField()
+    url = models.CharField(max_length=255, blank=True, default="")
+    # key of notifications.audiences.AUDIENCES
+    audience = models.CharField(max_length=30, default="verified")
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default="")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    stats = models.JSONField(default=dict, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.title} [{self.status}]"
@@ -0,0 +1,101 @@
+"""
+Durable push outbox.
+
+``enqueue_push`` is called inside the transaction that creates an alert;
+``dispatch_push_outbox`` workers claim due rows, deliver them with
+``send_push`` and record the delivery stats. Several workers can run at
+once: rows are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+database supports it, and a conditional UPDATE makes the claim exclusive
+everywhere else. Rows left IN_PROGRESS by a crashed worker are handed back
+after ``stale_after`` seconds.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from alerts.inbox import fill_inboxes
+from .audiences import AUDIENCES, resolve_audience
+from .models import PushOutbox
+from .utils import send_push
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_SECONDS = 30
+
+
+def enqueue_push(title, body, url="", audience="verified", alert=None):
+    """Queue a push broadcast; call inside the transaction that creates the alert."""
+    if audience not in AUDIENCES:
+        raise ValueError(f"Unknown push audience: {audience}")
+    return PushOutbox.objects.create(alert=alert, title=title, body=body, url=url or "", audience=audience)
+
+
+def reclaim_stale(stale_after):
+    """Return rows stuck IN_PROGRESS (crashed worker) to PENDING."""
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    return PushOutbox.objects.filter(
+        status=PushOutbox.STATUS_IN_PROGRESS, locked_at__lt=cutoff
+    ).update(status=PushOutbox.STATUS_PENDING, locked_by="", locked_at=None)
+
+
+def claim_batch(worker_id, batch_size):
+    """Claim up to batch_size due rows for this worker."""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            PushOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=PushOutbox.STATUS_PENDING, available_at__lte=now)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        PushOutbox.objects.filter(id__in=ids, status=PushOutbox.STATUS_PENDING).update(
+            status=PushOutbox.STATUS_IN_PROGRESS,
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F("attempts") + 1,
+        )
+    # Only rows our UPDATE actually flipped (another worker may have won some)
+    return list(
+        PushOutbox.objects.filter(
+            id__in=ids, status=PushOutbox.STATUS_IN_PROGRESS, locked_by=worker_id, locked_at=now
+        ).select_related("alert").order_by("id")
+    )
+
+
+def deliver_row(row, max_attempts):
+    """
+    Fill the announced alert's inboxes, send the push and record the
+    outcome. Returns the send_push stats or None.
+    """
+    try:
+        users = resolve_audience(row.audience, alert=row.alert)
+        inboxed = fill_inboxes([row.alert_id], users.values_list("id", flat=True)) if row.alert_id else 0
+        stats = send_push(row.title, row.body, users=users, url=row.url or None)
+        stats["inbox"] = inboxed
+    except Exception as e:
+        logger.error(f"Push outbox {row.id} failed (attempt {row.attempts}): {e}", exc_info=True)
+        failed = row.attempts >= max_attempts
+        PushOutbox.objects.filter(id=row.id).update(
+            status=PushOutbox.STATUS_FAILED if failed else PushOutbox.STATUS_PENDING,
+            available_at=timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (row.attempts - 1)),
+            locked_by="",
+            locked_at=None,
+            last_error=str(e),
+        )
+        return None
+
+    PushOutbox.objects.filter(id=row.id).update(
+        status=PushOutbox.STATUS_DONE,
+        stats=stats,
+        sent_at=timezone.now(),
+        locked_by="",
+        locked_at=None,
+        last_error="",
+    )
+    return stats
@@ -1,3 +1,175 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import BuyerDetails, FarmerDetails
+from .audiences import verified_users
+from .models import FCMDevice, PushOutbox
+from .outbox import claim_batch, deliver_row, enqueue_push, reclaim_stale
+from .transports import FakeTransport, get_transport
+from .utils import deliver, device_tokens, send_push
+
+
+def fake_push(**options):
+    return override_settings(PUSH_NOTIFICATIONS={
+        "TRANSPORT": "notifications.transports.FakeTransport",
+        "OPTIONS": options,
+        "BATCH_SIZE": 500,
+        "MAX_WORKERS": 4,
+        "MAX_RETRIES": 3,
+        "BACKOFF": 0,
+    })
+
+
+class SendPushTests(TestCase):
+    def setUp(self):
+        self.users = User.objects.bulk_create([User(username=f"user{i}") for i in range(1200)])
+        self.users = list(User.objects.order_by("id"))
+        FCMDevice.objects.bulk_create([FCMDevice(user=u, token=f"token-{u.id}") for u in self.users])
+
+    def test_sends_in_multicast_chunks_of_500(self):
+        with fake_push():
+            stats = send_push("Price alert", "Carrot up", url="/alerts")
+            transport = get_transport()
+
+        self.assertEqual(sorted(len(call["tokens"]) for call in transport.calls), [200, 500, 500])
+        self.assertEqual(len(set(transport.sent_tokens)), 1200)
+        self.assertEqual(transport.calls[0]["data"], {"url": "/alerts"})
+        self.assertEqual((stats["sent"], stats["batches"], stats["failed"]), (1200, 3, 0))
+
+    def test_targets_only_given_users(self):
+        with fake_push():
+            stats = send_push("t", "b", users=User.objects.filter(id__in=[u.id for u in self.users[:3]]))
+        self.assertEqual(stats["tokens"], 3)
+
+    def test_accepts_a_list_of_users(self):
+        with fake_push():
+            stats = send_push("t", "b", users=self.users[:2])
+            transport = get_transport()
+        self.assertEqual(stats["tokens"], 2)
+        self.assertEqual(sorted(transport.sent_tokens), sorted(f"token-{u.id}" for u in self.users[:2]))
+
+    def test_invalid_tokens_are_pruned(self):
+        bad = {f"token-{self.users[0].id}", f"token-{self.users[1].id}"}
+        with fake_push(invalid_tokens=bad):
+            stats = send_push("t", "b")
+
+        self.assertEqual((stats["invalid"], stats["pruned"]), (2, 2))
+        self.assertFalse(FCMDevice.objects.filter(token__in=bad).exists())
+        self.assertEqual(FCMDevice.objects.count(), 1198)
+
+    def test_transient_failures_are_retried(self):
+        with fake_push(transient_failures=2):
+            stats = send_push("t", "b")
+        self.assertEqual(stats["sent"], 1200)
+        self.assertEqual(stats["retries"], 2)
+
+    def test_gives_up_after_max_retries(self):
+        with fake_push(transient_failures=100):
+            stats = send_push("t", "b")
+        self.assertEqual((stats["sent"], stats["failed"]), (0, 1200))
+        self.assertEqual(stats["retries"], 9)
+
+
+class AudienceQueryTests(TestCase):
+    def setUp(self):
+        users = User.objects.bulk_create([User(username=f"user{i}") for i in range(12)])
+        users = list(User.objects.order_by("id"))
+        FarmerDetails.objects.bulk_create([FarmerDetails(user=u) for u in users[:4]])
+        FarmerDetails.objects.create(user=users[4], is_active=False)
+        BuyerDetails.objects.bulk_create([BuyerDetails(user=u) for u in users[3:7]])
+        users[5].is_active = False
+        users[5].save()
+        FCMDevice.objects.bulk_create([FCMDevice(user=u, token=f"token-{u.id}") for u in users])
+        self.users = users
+
+    def test_verified_users(self):
+        # farmers 0-3, buyers 3-6; 4's farmer profile is inactive but it is a buyer; 5 is inactive
+        expected = [u.id for u in self.users[:7] if u != self.users[5]]
+        self.assertEqual(list(verified_users().order_by("id").values_list("id", flat=True)), expected)
+
+    def test_device_tokens_are_paged_in_sql(self):
+        with self.assertNumQueries(4):  # 3 pages of 2, then an empty one
+            tokens = list(device_tokens(verified_users(), chunk_size=2))
+        self.assertEqual(tokens, [f"token-{u.id}" for u in self.users[:7] if u != self.users[5]])
+
+        with CaptureQueriesContext(connection) as queries:
+            list(device_tokens(verified_users(), chunk_size=100))
+        self.assertIn("EXISTS", queries[0]["sql"])
+
+
+class DeliverConcurrencyTests(TestCase):
+    def test_chunks_are_sent_concurrently(self):
+        transport = FakeTransport(latency=0.2)
+        config = {"BATCH_SIZE": 10, "MAX_WORKERS": 4, "MAX_RETRIES": 0, "BACKOFF": 0}
+
+        started = time.perf_counter()
+        stats = deliver((f"t{i}" for i in range(40)), "t", "b", config=config, transport=transport)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(stats["sent"], 40)
+        self.assertLess(elapsed, 0.6)  # 4 chunks at 0.2s each, in parallel
+
+
+@override_settings(PUSH_NOTIFICATIONS={"TRANSPORT": "notifications.transports.FakeTransport", "BACKOFF": 0})
+class PushOutboxTests(TestCase):
+    def setUp(self):
+        for i in range(3):
+            user = User.objects.create_user(username=f"farmer{i}")
+            FarmerDetails.objects.create(user=user, is_active=True)
+            FCMDevice.objects.create(user=user, token=f"token-{i}")
+        # registered device but no verified profile
+        FCMDevice.objects.create(user=User.objects.create_user(username="guest"), token="token-guest")
+
+    def test_worker_delivers_to_audience_and_records_stats(self):
+        row = enqueue_push("Heavy rain", "Flood risk", url="/alerts")
+
+        call_command("dispatch_push_outbox", "--once", stdout=StringIO())
+
+        row.refresh_from_db()
+        self.assertEqual(row.status, PushOutbox.STATUS_DONE)
+        self.assertEqual(row.attempts, 1)
+        self.assertEqual((row.stats["tokens"], row.stats["sent"]), (3, 3))
+        self.assertIsNotNone(row.sent_at)
+        self.assertEqual(sorted(get_transport().sent_tokens), ["token-0", "token-1", "token-2"])
+
+    def test_claimed_rows_are_not_claimed_twice(self):
+        rows = [enqueue_push(f"alert {i}", "body") for i in range(3)]
+
+        first = claim_batch("worker-a", 2)
+        second = claim_batch("worker-b", 5)
+
+        self.assertEqual([r.id for r in first], [rows[0].id, rows[1].id])
+        self.assertEqual([r.id for r in second], [rows[2].id])
+        self.assertEqual(claim_batch("worker-c", 5), [])
+
+    def test_abandoned_rows_are_reclaimed(self):
+        row = enqueue_push("t", "b")
+        claim_batch("crashed-worker", 1)
+        PushOutbox.objects.filter(id=row.id).update(locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(reclaim_stale(600), 1)
+        self.assertEqual([r.id for r in claim_batch("worker-b", 1)], [row.id])
+
+    def test_failed_delivery_is_retried_later_then_marked_failed(self):
+        row = enqueue_push("t", "b", audience="verified")
+        PushOutbox.objects.filter(id=row.id).update(audience="nobody")
+
+        claimed = claim_batch("worker", 1)[0]
+        self.assertIsNone(deliver_row(claimed, max_attempts=2))
+        row.refresh_from_db()
+        self.assertEqual(row.status, PushOutbox.STATUS_PENDING)
+        self.assertGreater(row.available_at, timezone.now())
+        self.assertIn("Unknown push audience", row.last_error)
+
+        PushOutbox.objects.filter(id=row.id).update(available_at=timezone.now())
+        self.assertIsNone(deliver_row(claim_batch("worker", 1)[0], max_attempts=2))
+        row.refresh_from_db()
+        self.assertEqual(row.status, PushOutbox.STATUS_FAILED)
@@ -0,0 +1,147 @@
+"""
+Push transports used by notifications.utils.send_push.
+
+A transport sends one multicast chunk (up to 500 tokens) and reports an
+outcome per token. The transport is chosen by
+``settings.PUSH_NOTIFICATIONS["TRANSPORT"]`` so tests and local runs can use
+``FakeTransport`` instead of Firebase.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+
+SENT = "sent"
+INVALID = "invalid"      # token is gone for good, prune it
+TRANSIENT = "transient"  # worth retrying later
+FAILED = "failed"        # permanent error for this message, keep the token
+
+PUSH_DEFAULTS = {
+    "TRANSPORT": "notifications.transports.FirebaseTransport",
+    "OPTIONS": {},
+    "BATCH_SIZE": 500,      # FCM multicast limit
+    "MAX_WORKERS": 8,
+    "MAX_RETRIES": 3,
+    "BACKOFF": 0.5,         # seconds, doubled per retry
+}
+
+
+class TransientPushError(Exception):
+    """The whole chunk failed in a way worth retrying (network, quota, 5xx)."""
+
+
+class FirebaseTransport:
+    """Send through FCM with send_each_for_multicast."""
+
+    def __init__(self, **options):
+        self.options = options
+
+    def send_multicast(self, tokens, title, body, data):
+        from firebase_admin import exceptions, messaging
+        from .firebase import init_firebase
+
+        init_firebase()
+        message = messaging.MulticastMessage(
+            tokens=list(tokens),
+            notification=messaging.Notification(title=title, body=body),
+            data=data,
+        )
+        try:
+            batch = messaging.send_each_for_multicast(message)
+        except (exceptions.UnavailableError, exceptions.InternalError,
+                exceptions.DeadlineExceededError, exceptions.ResourceExhaustedError) as e:
+            raise TransientPushError(str(e)) from e
+
+        return [self._outcome(response) for response in batch.responses]
+
+    @staticmethod
+    def _outcome(response):
+        from firebase_admin import exceptions, messaging
+
+        if response.success:
+            return SENT
+        error = response.exception
+        if isinstance(error, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+            return INVALID
+        if isinstance(error, (exceptions.UnavailableError, exceptions.InternalError,
+                              exceptions.DeadlineExceededError, exceptions.ResourceExhaustedError)):
+            return TRANSIENT
+        return FAILED
+
+
+class FakeTransport:
+    """
+    Local stand-in for FCM that records every call.
+
+    Options:
+        latency: seconds each call sleeps, to simulate the network
+        invalid_tokens: tokens reported as unregistered
+        transient_failures: number of first calls that fail as a whole
+        record: keep the tokens of every call (off for benchmarks; only
+            call_count is kept)
+    """
+
+    def __init__(self, latency=0.0, invalid_tokens=(), transient_failures=0, record=True):
+        self.latency = latency
+        self.invalid_tokens = set(invalid_tokens)
+        self.transient_failures = transient_failures
+        self.record = record
+        self.calls = []
+        self.call_count = 0
+        self._lock = threading.Lock()
+
+    def send_multicast(self, tokens, title, body, data):
+        with self._lock:
+            self.call_count += 1
+            if self.record:
+                self.calls.append({"tokens": list(tokens), "title": title, "body": body, "data": data})
+            fail = self.call_count <= self.transient_failures
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise TransientPushError("simulated FCM outage")
+        return [INVALID if token in self.invalid_tokens else SENT for token in tokens]
+
+    @property
+    def sent_tokens(self):
+        with self._lock:
+            return [token for call in self.calls for token in call["tokens"]]
+
+
+def get_push_config():
+    """Return the PUSH_NOTIFICATIONS settings merged with defaults."""
+    config = dict(PUSH_DEFAULTS)
+    config.update(getattr(settings, "PUSH_NOTIFICATIONS", {}) or {})
+    return config
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """The configured transport (one shared instance per process)."""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                config = get_push_config()
+                _transport = import_string(config["TRANSPORT"])(**config["OPTIONS"])
+    return _transport
+
+
+def reset_transport():
+    global _transport
+    with _transport_lock:
+        _transport = None
+
+
+def _on_setting_changed(setting, **kwargs):
+    if setting == "PUSH_NOTIFICATIONS":
+        reset_transport()
+
+
+setting_changed.connect(_on_setting_changed)
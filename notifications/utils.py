@@ -1,7 +1,18 @@
-from firebase_admin import messaging
-from .firebase import init_firebase
+import logging
+import random
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef, QuerySet
+
 from .models import FCMDevice
-from django.contrib.auth.models import User
+from .transports import INVALID, SENT, TRANSIENT, TransientPushError, get_push_config, get_transport
+
+logger = logging.getLogger(__name__)
+
 
 def send_push(title: str, body: str, users=None, url: str | None = None):
     """
@@ -9,29 +20,138 @@ def send_push(title: str, body: str, users=None, url: str | None = None):
     - title: Notification title
     - body: Notification body
     - users: Optional list/queryset of User objects to target specific users
+    - url: Optional link opened when the notification is clicked
+
+    Tokens are sent in multicast chunks (up to 500) across a bounded thread
+    pool; transient failures are retried with backoff and tokens reported as
+    unregistered are deleted. Returns delivery stats.
+    """
+    config = get_push_config()
+    data = {"url": url} if url else {}
+    return deliver(device_tokens(users, config["BATCH_SIZE"]), title, body, data, config=config)
+
+
+def device_tokens(users=None, chunk_size=500):
+    """
+    Yield the push tokens of users' devices, chunk_size rows per query.
+
+    A users queryset stays a correlated EXISTS subquery and rows are paged
+    by primary key, so each page only touches its own rows and neither the
+    SQL nor the memory grows with the audience, whatever the driver does
+    with cursors. Any other iterable of users is turned into a pk__in
+    queryset first.
     """
-    init_firebase()
-    
-    qs = FCMDevice.objects.all()
+    qs = FCMDevice.objects.exclude(token__isnull=True).exclude(token="")
     if users is not None:
-        qs = qs.filter(user__in=users)
+        if not isinstance(users, QuerySet):
+            users = get_user_model().objects.filter(pk__in=[user.pk for user in users])
+        qs = qs.filter(Exists(users.filter(pk=OuterRef("user_id"))))
 
-    tokens = qs.values_list("token", flat=True)
+    last_id = 0
+    while True:
+        page = list(qs.filter(id__gt=last_id).order_by("id").values_list("id", "token")[:chunk_size])
+        if not page:
+            return
+        last_id = page[-1][0]
+        for _, token in page:
+            yield token
 
-    for token in tokens:
-        if not token:
-            continue
 
-        data = {}
-        if url:
-            data["url"] = url 
-            
-        msg = messaging.Message(
-            notification=messaging.Notification(title=title, body=body),
-            token=token,
-            data=data
-        )
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def deliver(tokens, title, body, data=None, config=None, transport=None):
+    """
+    Push one message to an iterable of tokens and prune invalid ones.
+
+    At most 2 x MAX_WORKERS chunks are queued at a time, so tokens are
+    consumed lazily and memory does not grow with the audience.
+    """
+    config = config or get_push_config()
+    transport = transport or get_transport()
+    data = data or {}
+    workers = max(1, int(config["MAX_WORKERS"]))
+
+    stats = Counter()
+    invalid = []
+    started = time.perf_counter()
+
+    def collect(future):
+        chunk_stats, chunk_invalid = future.result()
+        stats.update(chunk_stats)
+        invalid.extend(chunk_invalid)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="push") as pool:
+        in_flight = set()
+        for chunk in chunked(tokens, int(config["BATCH_SIZE"])):
+            if len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+            in_flight.add(pool.submit(
+                _send_chunk, transport, chunk, title, body, data,
+                int(config["MAX_RETRIES"]), float(config["BACKOFF"]),
+            ))
+        for future in in_flight:
+            collect(future)
+
+    stats["pruned"] = prune_tokens(invalid)
+    result = {
+        key: stats[key]
+        for key in ("tokens", "batches", "sent", "invalid", "failed", "retries", "pruned")
+    }
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"Push '{title}': {result}")
+    return result
+
+
+def _send_chunk(transport, tokens, title, body, data, max_retries, backoff):
+    """Send one chunk, retrying transient failures. Returns (stats, invalid tokens)."""
+    stats = Counter(tokens=len(tokens), batches=1)
+    invalid = []
+    pending = tokens
+
+    for attempt in range(max_retries + 1):
+        if attempt:
+            stats["retries"] += 1
+            time.sleep(backoff * 2 ** (attempt - 1) + random.uniform(0, backoff))
         try:
-            messaging.send(msg)
+            outcomes = transport.send_multicast(pending, title, body, data)
+        except TransientPushError as e:
+            logger.warning(f"FCM transient error ({len(pending)} tokens, attempt {attempt + 1}): {e}")
+            continue
         except Exception as e:
-            print("FCM error:", e)
\ No newline at end of file
+            logger.error(f"FCM error: {e}")
+            break
+
+        retry = []
+        for token, outcome in zip(pending, outcomes):
+            if outcome == SENT:
+                stats["sent"] += 1
+            elif outcome == INVALID:
+                stats["invalid"] += 1
+                invalid.append(token)
+            elif outcome == TRANSIENT:
+                retry.append(token)
+            else:
+                stats["failed"] += 1
+        pending = retry
+        if not pending:
+            break
+
+    stats["failed"] += len(pending)
+    return stats, invalid
+
+
+def prune_tokens(tokens, batch_size=500):
+    """Delete devices whose tokens FCM no longer accepts."""
+    pruned = 0
+    for chunk in chunked(tokens, batch_size):
+        pruned += FCMDevice.objects.filter(token__in=chunk).delete()[0]
+    return pruned
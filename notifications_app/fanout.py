@@ -0,0 +1,68 @@
+"""
+Per-user fan-out of alerts into the notifications table.
+
+Recipients are streamed as plain ids with ``.iterator()`` and rows are
+written with chunked ``bulk_create``, so memory stays flat however many
+users opted in.
+"""
+
+import time
+
+from django.contrib.auth.models import User
+
+from .models import Notification
+
+FANOUT_BATCH_SIZE = 1000
+
+
+def price_alert_recipients():
+    """Ids of active users whose farmer profile opted in to price alerts (one indexed query)."""
+    return (
+        User.objects.filter(
+            is_active=True,
+            farmerdetails__price_alert=True,
+            farmerdetails__is_active=True,
+        )
+        .order_by()
+        .values_list("id", flat=True)
+    )
+
+
+def fan_out(recipient_ids, messages, notification_type, batch_size=FANOUT_BATCH_SIZE):
+    """
+    Write one Notification per recipient and message.
+
+    Args:
+        recipient_ids: Queryset of user ids (see price_alert_recipients())
+        messages: List of (title, message) pairs
+        notification_type: Value of Notification.type
+        batch_size: Rows per INSERT
+
+    Returns:
+        (rows written, seconds taken)
+    """
+    started = time.perf_counter()
+    if not messages:
+        return 0, 0.0
+
+    written = 0
+    batch = []
+    for user_id in recipient_ids.iterator(chunk_size=batch_size):
+        for title, message in messages:
+            batch.append(Notification(
+                user_id=user_id,
+                type=notification_type,
+                title=title,
+                message=message,
+                status="SENT",
+            ))
+        while len(batch) >= batch_size:
+            Notification.objects.bulk_create(batch[:batch_size])
+            written += batch_size
+            batch = batch[batch_size:]
+
+    if batch:
+        Notification.objects.bulk_create(batch)
+        written += len(batch)
+
+    return written, time.perf_counter() - started
@@ -1,3 +1,62 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from accounts.models import FarmerDetails
+from .fanout import fan_out, price_alert_recipients
+from .models import Notification
+
+
+def make_farmer(username, price_alert=True, profile_active=True, user_active=True):
+    user = User.objects.create_user(username=username, password="x", is_active=user_active)
+    FarmerDetails.objects.create(user=user, price_alert=price_alert, is_active=profile_active)
+    return user
+
+
+class PriceAlertRecipientsTests(TestCase):
+    def test_selects_opted_in_active_farmers_in_one_query(self):
+        wanted = make_farmer("opted_in")
+        make_farmer("opted_out", price_alert=False)
+        make_farmer("deactivated_profile", profile_active=False)
+        make_farmer("inactive_user", user_active=False)
+        User.objects.create_user(username="buyer", password="x")
+
+        with self.assertNumQueries(1):
+            ids = list(price_alert_recipients())
+
+        self.assertEqual(ids, [wanted.id])
+
+
+class FanOutTests(TransactionTestCase):
+    """Notification is unmanaged, so the table is created for these tests."""
+
+    def setUp(self):
+        with connection.schema_editor() as editor:
+            editor.create_model(Notification)
+
+    def tearDown(self):
+        with connection.schema_editor() as editor:
+            editor.delete_model(Notification)
+
+    def test_writes_one_row_per_recipient_and_message_in_batches(self):
+        users = [make_farmer(f"farmer{i}") for i in range(5)]
+        make_farmer("opted_out", price_alert=False)
+        messages = [("PRICE UP Alert (HIGH)", "Carrot up"), ("PRICE DOWN Alert (LOW)", "Leeks down")]
+
+        with CaptureQueriesContext(connection) as queries:
+            written, _ = fan_out(price_alert_recipients(), messages, "PRICE_ALERT", batch_size=3)
+
+        statements = [q["sql"].split(" ", 1)[0] for q in queries.captured_queries]
+        self.assertEqual(statements.count("SELECT"), 1)
+        self.assertEqual(statements.count("INSERT"), 4)  # 10 rows, 3 per INSERT
+        self.assertEqual(written, 10)
+        self.assertEqual(Notification.objects.count(), 10)
+        self.assertEqual(
+            set(Notification.objects.values_list("user_id", flat=True)), {u.id for u in users}
+        )
+        self.assertEqual(Notification.objects.filter(type="PRICE_ALERT", status="SENT", is_read=False).count(), 10)
+
+    def test_no_messages_writes_nothing(self):
+        make_farmer("farmer")
+        self.assertEqual(fan_out(price_alert_recipients(), [], "PRICE_ALERT")[0], 0)
@@ -3,6 +3,18 @@ ASGI config for smartagri_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server to get the async ML endpoints under
+/api/ml/async/, the alert stream at /api/alerts/stream/ and the chat
+WebSocket at /ws/chat/, e.g.:
+
+    uvicorn smartagri_backend.asgi:application
+
+Run a single worker process, and serve the REST API from it too, while
+CHAT_CHANNEL_LAYER is the default chat.layers.InMemoryChannelLayer: chat
+events only reach sockets in the process that sent them, so a message
+POSTed to another worker (or to a separate WSGI server) would never
+reach an open socket. More workers need a cross-process layer.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +25,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smartagri_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from chat.consumers import ChatConsumer  # noqa: E402  (needs the app registry)
+
+chat_consumer = ChatConsumer()
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        if scope["path"].rstrip("/") == "/ws/chat":
+            return await chat_consumer(scope, receive, send)
+        await receive()  # websocket.connect
+        return await send({"type": "websocket.close"})
+    return await django_application(scope, receive, send)
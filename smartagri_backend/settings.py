@@ -70,8 +70,48 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'ml_api.profiling.RequestProfilingMiddleware',
 ]
 
+# On-demand request profiling (ml_api/profiling.py).
+# Send "X-Profile: <PROFILING_TOKEN>" to profile one request, or set a
+# sample rate (0..1). With neither set the middleware is not loaded.
+REQUEST_PROFILING = {
+    "TOKEN": os.getenv("PROFILING_TOKEN", ""),
+    "SAMPLE_RATE": float(os.getenv("PROFILING_SAMPLE_RATE", "0")),
+    "PATH_PREFIXES": ["/api/ml/"],
+    "OUTPUT_DIR": os.path.join(BASE_DIR, "profiles"),
+    "MAX_ARTIFACTS": 200,
+}
+
+# Push delivery (notifications.utils.send_push). TRANSPORT is a dotted path;
+# use notifications.transports.FakeTransport for local runs without FCM.
+PUSH_NOTIFICATIONS = {
+    "TRANSPORT": os.getenv("PUSH_TRANSPORT", "notifications.transports.FirebaseTransport"),
+    "OPTIONS": {},
+    "BATCH_SIZE": 500,
+    "MAX_WORKERS": int(os.getenv("PUSH_MAX_WORKERS", "8")),
+    "MAX_RETRIES": 3,
+    "BACKOFF": 0.5,
+}
+
+# Alert SSE stream (alerts.bus): pub/sub backend between alert writes and open streams
+ALERT_BUS = {
+    "BACKEND": os.getenv("ALERT_BUS_BACKEND", "alerts.bus.InProcessBus"),
+    "OPTIONS": {},
+}
+
+CHAT_CHANNEL_LAYER = {
+    "BACKEND": os.getenv("CHAT_CHANNEL_LAYER_BACKEND", "chat.layers.InMemoryChannelLayer"),
+    "OPTIONS": {},
+}
+
+CHAT_SEARCH = {
+    # unset: MySQL FULLTEXT on MySQL, the token index table elsewhere (chat.search)
+    "BACKEND": os.getenv("CHAT_SEARCH_BACKEND") or None,
+    "OPTIONS": {},
+}
+
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_PORT = 587
@@ -98,6 +138,25 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'smartagri_backend.wsgi.application'
+ASGI_APPLICATION = 'smartagri_backend.asgi.application'
+
+# Threads used by the async ML views (/api/ml/async/) to run model scoring.
+# Defaults to the CPU count.
+ML_ASYNC_WORKERS = int(os.getenv('ML_ASYNC_WORKERS', '0')) or None
+
+# Admission control for the (AllowAny) ML endpoints, see ml_api/admission.py.
+# Per cost class: per-client RATE (req/s) and BURST, process-wide GLOBAL_RATE
+# and GLOBAL_BURST, and MAX_CONCURRENT in-flight model evaluations.
+ML_ADMISSION = {
+    "ENABLED": os.getenv("ML_ADMISSION_ENABLED", "True") == "True",
+    # Only enable behind a proxy that sets X-Forwarded-For
+    "TRUST_X_FORWARDED_FOR": os.getenv("ML_ADMISSION_TRUST_XFF", "False") == "True",
+    "CLASSES": {
+        "light": {"RATE": 10, "BURST": 30, "GLOBAL_RATE": 100, "GLOBAL_BURST": 200, "MAX_CONCURRENT": 16},
+        "forecast": {"RATE": 2, "BURST": 10, "GLOBAL_RATE": 20, "GLOBAL_BURST": 40, "MAX_CONCURRENT": 4},
+        "heavy": {"RATE": 0.5, "BURST": 5, "GLOBAL_RATE": 5, "GLOBAL_BURST": 10, "MAX_CONCURRENT": 2},
+    },
+}
 
 
 # Database
@@ -185,6 +244,8 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  # React frontend
     "http://localhost:5173",
 ]
+# page cursors of the message history endpoints
+CORS_EXPOSE_HEADERS = ["X-Next-Before", "X-Next-After"]
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -28,6 +28,7 @@ urlpatterns = [
     path("api/notifications/", include("notifications.urls")),
     path("api/crops/", include("crops.urls")),
     path("api/prices/", include("prices.urls")),
+    path('api/ml/async/', include('ml_api.async_urls')),
     path('api/ml/', include('ml_api.urls')),
     path('api/chatbot/', include('chatbot.urls')),
     path('api/dashboard/', include('dashboard.urls')),